@@ -4,6 +4,8 @@ from jose import jwt
 import os
 
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
+# Embed memberships and roles in access tokens (see dependencies.get_token_claims)
+AUTH_ROLE_CLAIMS = os.getenv("AUTH_ROLE_CLAIMS", "1") != "0"
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
@@ -24,3 +26,14 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+def create_user_token(user, memberships) -> str:
+    """
+    Access token for the user. With AUTH_ROLE_CLAIMS it also carries the
+    user id, token_version and [org_id, role] per membership, in membership
+    order (the first is the default org).
+    """
+    data = {"sub": user.email}
+    if AUTH_ROLE_CLAIMS:
+        data.update(uid=user.id, ver=user.token_version, orgs=[[m.org_id, m.role.value] for m in memberships])
+    return create_access_token(data)
@@ -0,0 +1,230 @@
+"""
+Benchmark suite for the curves package and the main API hot paths.
+
+    python -m backend.benchmarks.run                      # full run
+    python -m backend.benchmarks.run --quick              # small sizes only
+    python -m backend.benchmarks.run --output results.json
+    python -m backend.benchmarks.run --baseline other.json
+
+Results are JSON: one entry per benchmark with the median and best time of
+a single call. Each run is compared with a baseline, by default
+backend/benchmarks/baseline.json: any benchmark whose median is slower than
+the baseline by more than --threshold is reported and the exit status is 1.
+No baseline is committed, since timings from different hardware are not
+comparable: record one on the machine you compare on with
+--output backend/benchmarks/baseline.json. Without one, the run says so and
+skips the comparison.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from backend.models import SeriesType
+from backend.curves.validation import validate_points
+from backend.curves.fitting import fit_curve, fit_curves, moment_stats
+from backend.curves.evaluation import evaluate_curve_at_point
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+POINT_COUNTS = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+QUICK_POINT_COUNTS = [10, 100, 1_000, 10_000]
+BATCH_SERIES_COUNTS = [1_000, 100_000]
+QUICK_BATCH_SERIES_COUNTS = [1_000]
+
+def measure(fn: Callable[[], object], min_time: float = 0.2, max_runs: int = 200, min_runs: int = 3) -> Dict[str, float]:
+    """
+    Calls fn repeatedly until min_time has elapsed (at least min_runs, at most
+    max_runs) and returns per-call statistics in seconds.
+    """
+    fn() # Warm-up
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < max_runs and (len(timings) < min_runs or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(timings), "min_s": min(timings), "runs": len(timings)}
+
+def head_points(n: int, seed: int = 0) -> List[Dict[str, float]]:
+    rng = np.random.default_rng(seed)
+    flows = np.linspace(0.0, 1000.0, n)
+    values = 120.0 - 0.00006 * flows ** 2 + rng.normal(0.0, 0.3, n)
+    return [{"flow": float(q), "value": float(v)} for q, v in zip(flows, values)]
+
+def bench_curves(point_counts: List[int]) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for n in point_counts:
+        points = head_points(n)
+        validated = validate_points(SeriesType.head, points).normalized_points
+        _, params, _, data_range = fit_curve(SeriesType.head, validated)
+
+        # Large inputs are slow enough that a single timed run is representative
+        runs = {"min_runs": 1, "min_time": 0.0} if n >= 100_000 else {}
+        results[f"validate_points[n={n}]"] = measure(lambda: validate_points(SeriesType.head, points), **runs)
+        results[f"fit_curve[n={n}]"] = measure(lambda: fit_curve(SeriesType.head, validated), **runs)
+        results[f"evaluate_fit[n={n}]"] = measure(lambda: evaluate_curve_at_point("polynomial_2", params, data_range, 500.0, validated), **runs)
+        results[f"evaluate_interp[n={n}]"] = measure(lambda: evaluate_curve_at_point(None, None, data_range, 500.0, validated), **runs)
+    return results
+
+def bench_batch_fit(series_counts: List[int]) -> Dict[str, Dict[str, float]]:
+    """
+    Catalog-style refits (many short series of all three types): the
+    per-series fit_curve + moment_stats loop against one fit_curves call.
+    """
+    rng = np.random.default_rng(0)
+    types = [SeriesType.head, SeriesType.efficiency, SeriesType.power]
+    results = {}
+    for count in series_counts:
+        items = []
+        for i in range(count):
+            flows = np.sort(rng.uniform(0.0, 1000.0, int(rng.integers(8, 25))))
+            items.append((types[i % 3], flows.tolist(), (120.0 - 0.00006 * flows ** 2 + rng.normal(0.0, 0.3, flows.size)).tolist()))
+
+        def loop():
+            for series_type, flows, values in items:
+                points = [{"flow": q, "value": v} for q, v in zip(flows, values)]
+                fit_curve(series_type, points), moment_stats(series_type, points)
+
+        runs = {"min_runs": 1, "min_time": 0.0} if count >= 100_000 else {}
+        results[f"fit_loop[series={count}]"] = measure(loop, **runs)
+        results[f"fit_curves[series={count}]"] = measure(lambda: fit_curves(items), **runs)
+    return results
+
+def _populate(engine, pumps: int, points_per_series: int) -> Dict[str, Any]:
+    """
+    Builds one org with `pumps` pumps (two curve sets each, all three series
+    types) using the deterministic catalog generator.
+    """
+    from sqlmodel import SQLModel
+    from backend.generate_catalog import CatalogConfig, generate
+
+    SQLModel.metadata.create_all(engine)
+    summary = generate(engine, CatalogConfig(pumps_per_org=pumps, curve_sets_per_pump=2, points_per_series=points_per_series))
+    return {"email": summary["user_emails"][0], "curve_set_id": summary["counts"]["curve_sets"] // 2}
+
+def bench_api(pumps: int, points_per_series: int) -> Dict[str, Dict[str, float]]:
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session, create_engine, select
+    from backend.main import app
+    from backend.database import get_session
+    from backend.auth_utils import create_access_token
+    from backend.models import CurveSeries
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", connect_args={"check_same_thread": False})
+        ids = _populate(engine, pumps, points_per_series)
+
+        def override_get_session():
+            with Session(engine) as session:
+                yield session
+
+        previous_overrides = dict(app.dependency_overrides)
+        app.dependency_overrides.clear()
+        app.dependency_overrides[get_session] = override_get_session
+        try:
+            client = TestClient(app)
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': ids['email']})}"}
+            cs_id = ids["curve_set_id"]
+            with Session(engine) as session:
+                head_id = session.exec(
+                    select(CurveSeries.id).where(CurveSeries.curve_set_id == cs_id, CurveSeries.type == SeriesType.head)
+                ).first()
+            new_points = head_points(points_per_series, seed=1)
+
+            def create_series():
+                nonlocal head_id
+                r = client.post(f"/curve-sets/{cs_id}/series", headers=headers,
+                                json={"curve_set_id": cs_id, "type": "head", "points": new_points})
+                head_id = r.json()["id"]
+
+            label = f"[pumps={pumps},pts={points_per_series}]"
+            results = {
+                f"api_list_pumps{label}": measure(lambda: client.get("/pumps/?limit=100", headers=headers)),
+                f"api_read_curve_set{label}": measure(lambda: client.get(f"/curve-sets/{cs_id}", headers=headers)),
+                f"api_evaluate{label}": measure(lambda: client.post(f"/curve-sets/series/{head_id}/evaluate", headers=headers, json={"flow": 500.0})),
+                f"api_create_series{label}": measure(create_series),
+            }
+        finally:
+            app.dependency_overrides.clear()
+            app.dependency_overrides.update(previous_overrides)
+            engine.dispose()
+    return results
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    regressions = []
+    for name, current in sorted(results.items()):
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = current["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{name:<55} {base['median_s'] * 1e6:>12.1f} us -> {current['median_s'] * 1e6:>12.1f} us  x{ratio:5.2f} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help=f"Point counts {QUICK_POINT_COUNTS} and a small DB")
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--pumps", type=int, default=None, help="Pumps in the API benchmark DB (default 500, quick 50)")
+    parser.add_argument("--points-per-series", type=int, default=50)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help=f"Compare against this results JSON (default {DEFAULT_BASELINE}, if present)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error(f"Baseline {args.baseline} not found")
+
+    results = bench_curves(QUICK_POINT_COUNTS if args.quick else POINT_COUNTS)
+    results.update(bench_batch_fit(QUICK_BATCH_SERIES_COUNTS if args.quick else BATCH_SERIES_COUNTS))
+    if not args.skip_api:
+        pumps = args.pumps or (50 if args.quick else 500)
+        results.update(bench_api(pumps, args.points_per_series))
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": f"{platform.machine()} {platform.processor() or 'unknown cpu'}, {os.cpu_count()} cpus",
+        },
+        "results": results,
+    }
+    for name, r in results.items():
+        print(f"{name:<55} median {r['median_s'] * 1e6:>12.1f} us  (min {r['min_s'] * 1e6:.1f} us, {r['runs']} runs)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if args.output and os.path.abspath(args.output) == os.path.abspath(baseline_path):
+        print(f"\nRecorded baseline {baseline_path}.")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"\nNo baseline found at {baseline_path}; nothing to compare against. "
+              f"Record one on this machine with --output {baseline_path}.")
+        return 0
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nBaseline {baseline_path} ({baseline['meta'].get('machine') or baseline['meta'].get('platform')}, "
+          f"{baseline['meta']['created_at']})")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Serialization benchmark for large curve-set responses.
+
+Compares FastAPI's default JSONResponse (stdlib json) with FastJSONResponse
+(orjson) and reports bytes on the wire for identity, gzip and brotli.
+
+    python -m backend.benchmarks.serialization --points 1000 10000 100000
+"""
+import argparse
+import time
+from datetime import datetime
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from backend.models import CurveSetReadWithSeries
+from backend.responses import FastJSONResponse
+from backend.compression import compress, brotli
+
+def build_curve_set(points_per_series: int) -> CurveSetReadWithSeries:
+    now = datetime.utcnow()
+    series = []
+    point_id = 1
+    for series_id, series_type in enumerate(["head", "efficiency", "power"], start=1):
+        points = []
+        for i in range(points_per_series):
+            flow = 600.0 * i / max(points_per_series - 1, 1)
+            points.append({
+                "id": point_id,
+                "series_id": series_id,
+                "flow": flow,
+                "value": 100.0 - 0.000125 * flow * flow + 0.01 * (i % 7),
+                "sequence": i,
+            })
+            point_id += 1
+        series.append({
+            "id": series_id,
+            "curve_set_id": 1,
+            "type": series_type,
+            "points": points,
+            "fit_model_type": "polynomial_3",
+            "fit_params": {"coeffs": [1e-7, -0.000125, 0.0, 100.0]},
+            "fit_quality": {"rmse": 0.01, "r2": 0.999},
+            "data_range": {"min_q": 0.0, "max_q": 600.0},
+        })
+    return CurveSetReadWithSeries.model_validate({
+        "id": 1,
+        "name": "Benchmark Set",
+        "pump_id": 1,
+        "units": {"flow": "gpm", "head": "ft", "efficiency": "%", "power": "hp"},
+        "meta_data": {},
+        "created_at": now,
+        "updated_at": now,
+        "series": series,
+    })
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(points_per_series: int, repeat: int = 5) -> dict:
+    model = build_curve_set(points_per_series)
+    adapter = TypeAdapter(CurveSetReadWithSeries)
+    # Same step FastAPI runs before handing content to the response class
+    content = adapter.dump_python(model, mode="json")
+
+    stdlib_s = best_of(lambda: JSONResponse(content).body, repeat)
+    orjson_s = best_of(lambda: FastJSONResponse(content).body, repeat)
+    body = FastJSONResponse(content).body
+
+    result = {
+        "points": points_per_series * 3,
+        "encode_stdlib_ms": stdlib_s * 1000,
+        "encode_orjson_ms": orjson_s * 1000,
+        "bytes_identity": len(body),
+    }
+    result["gzip_ms"] = best_of(lambda: compress(body, "gzip"), repeat) * 1000
+    result["bytes_gzip"] = len(compress(body, "gzip"))
+    if brotli is not None:
+        result["br_ms"] = best_of(lambda: compress(body, "br"), repeat) * 1000
+        result["bytes_br"] = len(compress(body, "br"))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, nargs="+", default=[1000, 10000, 100000], help="Points per series")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for n in args.points:
+        r = run(n, args.repeat)
+        line = (
+            f"{r['points']:>8} pts | stdlib {r['encode_stdlib_ms']:8.2f} ms | orjson {r['encode_orjson_ms']:8.2f} ms "
+            f"({r['encode_stdlib_ms'] / r['encode_orjson_ms']:.1f}x) | {r['bytes_identity']:>10} B raw, "
+            f"{r['bytes_gzip']:>9} B gzip ({r['gzip_ms']:.1f} ms)"
+        )
+        if "bytes_br" in r:
+            line += f", {r['bytes_br']:>9} B br ({r['br_ms']:.1f} ms)"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Cold-start benchmark: time to import the app and to run its startup
+(lifespan) against a fresh and an already-initialized database.
+
+    python -m backend.benchmarks.startup
+    python -m backend.benchmarks.startup --runs 10 --import-budget 1.5 --startup-budget 0.25
+
+Each measurement runs in a fresh interpreter, as an autoscaled worker
+would. Exits with status 1 if a median exceeds its budget or if the app
+import pulls in modules that should load lazily (numpy, scipy).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+IMPORT_BUDGET_S = float(os.getenv("STARTUP_IMPORT_BUDGET_S", "1.5"))
+STARTUP_BUDGET_S = float(os.getenv("STARTUP_BUDGET_S", "0.25"))
+LAZY_MODULES = ["numpy", "scipy", "pyarrow"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import backend.main
+import_s = time.perf_counter() - start
+from fastapi.testclient import TestClient
+client = TestClient(backend.main.app)
+start = time.perf_counter()
+with client:
+    startup_s = time.perf_counter() - start
+print(json.dumps({
+    "import_s": import_s,
+    "startup_s": startup_s,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+def probe(db_path: str) -> Dict:
+    env = dict(os.environ, SQLITE_DB_PATH=db_path)
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE % (LAZY_MODULES,)],
+        env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def run(runs: int) -> Dict[str, Dict[str, float]]:
+    cold: List[Dict] = []
+    warm: List[Dict] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(runs):
+            db_path = os.path.join(tmp, f"startup-{i}.db")
+            cold.append(probe(db_path)) # Creates the schema and bootstraps
+            warm.append(probe(db_path)) # Schema already current
+    loaded = sorted({m for r in cold + warm for m in r["loaded"]})
+    return {
+        "import": {"median_s": statistics.median(r["import_s"] for r in warm), "min_s": min(r["import_s"] for r in warm)},
+        "startup_fresh_db": {"median_s": statistics.median(r["startup_s"] for r in cold), "min_s": min(r["startup_s"] for r in cold)},
+        "startup_current_db": {"median_s": statistics.median(r["startup_s"] for r in warm), "min_s": min(r["startup_s"] for r in warm)},
+        "eagerly_loaded": loaded,
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_S, help="Seconds (median)")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET_S, help="Seconds (median, current schema)")
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    results = run(args.runs)
+    failures = []
+    for name, budget in (("import", args.import_budget), ("startup_current_db", args.startup_budget)):
+        median = results[name]["median_s"]
+        over = median > budget
+        if over:
+            failures.append(name)
+        print(f"{name:<22} median {median * 1000:8.1f} ms  budget {budget * 1000:8.1f} ms {'OVER BUDGET' if over else ''}")
+    print(f"{'startup_fresh_db':<22} median {results['startup_fresh_db']['median_s'] * 1000:8.1f} ms")
+    if results["eagerly_loaded"]:
+        failures.append("eagerly_loaded")
+        print(f"Imported at startup but expected to load lazily: {', '.join(results['eagerly_loaded'])}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
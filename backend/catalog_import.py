@@ -0,0 +1,293 @@
+"""
+Bulk catalog import.
+
+Each NDJSON line is a PumpCreateNested document. Lines are validated and
+fitted in a process pool (CPU bound, no DB access; each chunk's series are
+fitted in one batch), then written with bulk inserts, one transaction per batch. Results are reported per line.
+"""
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session
+
+from backend.models import Pump, CurveSet, CurveSeries, CurvePoint, CurveSetCharacteristics, PumpCreateNested, SeriesType
+from backend.curves.validation import validate_points
+from backend.curves.fitting import fit_curves
+from backend.curves.characteristics import compute_characteristics, rpm_from_meta
+from backend import curve_store
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(os.cpu_count() or 1)))
+
+_pool: Optional[Executor] = None
+
+def get_pool() -> Optional[Executor]:
+    """
+    Shared worker pool, created on first use. None means fit inline.
+    """
+    global _pool
+    if IMPORT_WORKERS <= 1:
+        return None
+    if _pool is None:
+        # spawn: forking a process that runs the server's threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=IMPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown_pool(wait: bool = True) -> None:
+    """
+    Stops the worker pool (app shutdown, or after a worker died). The next
+    import starts a new one.
+    """
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+class SeriesValidationError(Exception):
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__("Validation failed")
+        self.errors = errors
+
+def prepare_series(series_type: SeriesType, raw_points: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Validates one series. Raises SeriesValidationError on blocking errors.
+    The fit is added by fit_prepared.
+    """
+    validation_res = validate_points(series_type, raw_points)
+    if validation_res.blocking_errors:
+        raise SeriesValidationError(validation_res.blocking_errors)
+
+    return {
+        "type": series_type,
+        "validation_warnings": validation_res.warnings,
+        "points": [(pt["flow"], pt["value"]) for pt in validation_res.normalized_points],
+    }
+
+def prepare_pump(document: PumpCreateNested, fit: bool = True) -> Dict[str, Any]:
+    """
+    Validates (and unless fit=False, fits) every series of a nested pump
+    document. Returns a plain (picklable) structure ready for insert_prepared.
+    """
+    curve_sets = []
+    for set_index, cs in enumerate(document.curve_sets):
+        seen_types = set()
+        series = []
+        for s in cs.series:
+            if s.type in seen_types:
+                raise SeriesValidationError([{
+                    "code": "DUPLICATE_SERIES",
+                    "message": f"Curve set {set_index} has more than one {s.type.value} series.",
+                    "severity": "error"
+                }])
+            seen_types.add(s.type)
+            try:
+                series.append(prepare_series(s.type, [p.model_dump() for p in s.points]))
+            except SeriesValidationError as e:
+                for err in e.errors:
+                    err.setdefault("curve_set", set_index)
+                    err.setdefault("series", s.type.value)
+                raise
+        curve_sets.append({"name": cs.name, "units": cs.units, "meta_data": cs.meta_data, "series": series})
+
+    pump = {
+        "manufacturer": document.manufacturer,
+        "model": document.model,
+        "meta_data": document.meta_data,
+        "curve_sets": curve_sets,
+    }
+    if fit:
+        fit_prepared([pump])
+    return pump
+
+def fit_prepared(pumps: List[Dict[str, Any]]) -> None:
+    """
+    Fits every series of the prepared pumps in one batched call (see
+    curves.fitting.fit_curves), then computes each curve set's characteristics.
+    """
+    series = [s for pump in pumps for cs in pump["curve_sets"] for s in cs["series"]]
+    fits = fit_curves([(s["type"], [q for q, _ in s["points"]], [v for _, v in s["points"]]) for s in series])
+    for s, (model, params, quality, data_range, stats) in zip(series, fits):
+        s.update(fit_model_type=model, fit_params=params, fit_quality=quality, data_range=data_range, fit_stats=stats)
+
+    for pump in pumps:
+        for cs in pump["curve_sets"]:
+            cs["characteristics"] = compute_characteristics(
+                {s["type"]: s for s in cs["series"]}, cs["units"], rpm_from_meta(cs["meta_data"], pump["meta_data"])
+            )
+
+def prepare_lines(lines: List[Tuple[int, bytes]]) -> List[Dict[str, Any]]:
+    """
+    Worker entry point: parse, validate and fit a chunk of NDJSON lines.
+    """
+    results = []
+    for line_no, line in lines:
+        try:
+            document = PumpCreateNested.model_validate_json(line)
+            results.append({"line": line_no, "pump": prepare_pump(document, fit=False)})
+        except ValidationError as e:
+            results.append({"line": line_no, "error": {"message": "Invalid record", "errors": json.loads(e.json(include_url=False))}})
+        except SeriesValidationError as e:
+            results.append({"line": line_no, "error": {"message": "Validation failed", "errors": e.errors}})
+    # The whole chunk's series are fitted together
+    fit_prepared([r["pump"] for r in results if "pump" in r])
+    return results
+
+def insert_prepared(session: Session, org_id: int, pumps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Bulk-inserts prepared pumps with their curve sets, series and points.
+    Does not commit; the caller owns the transaction.
+    Returns {"pump_id", "curve_set_ids"} per pump, in order.
+    """
+    if not pumps:
+        return []
+    now = datetime.utcnow()
+
+    pump_ids = session.scalars(
+        insert(Pump).returning(Pump.id, sort_by_parameter_order=True),
+        [{"org_id": org_id, "manufacturer": p["manufacturer"], "model": p["model"], "meta_data": p["meta_data"],
+          "created_at": now, "updated_at": now} for p in pumps]
+    ).all()
+
+    set_rows, set_owner = [], []
+    for pump_index, (p, pump_id) in enumerate(zip(pumps, pump_ids)):
+        for cs in p["curve_sets"]:
+            set_rows.append({"pump_id": pump_id, "org_id": org_id, "name": cs["name"], "units": cs["units"], "meta_data": cs["meta_data"],
+                             "created_at": now, "updated_at": now})
+            set_owner.append((pump_index, cs))
+    set_ids = session.scalars(insert(CurveSet).returning(CurveSet.id, sort_by_parameter_order=True), set_rows).all() if set_rows else []
+
+    if set_ids:
+        session.execute(insert(CurveSetCharacteristics), [
+            {"curve_set_id": set_id, "pump_id": pump_ids[pump_index], "computed_at": now, **cs["characteristics"]}
+            for set_id, (pump_index, cs) in zip(set_ids, set_owner)
+        ])
+
+    series_rows, series_points = [], []
+    for set_id, (_, cs) in zip(set_ids, set_owner):
+        for s in cs["series"]:
+            series_rows.append({
+                "curve_set_id": set_id, "org_id": org_id, "type": s["type"], "validation_warnings": s["validation_warnings"],
+                "fit_model_type": s["fit_model_type"], "fit_params": s["fit_params"],
+                "fit_quality": s["fit_quality"], "data_range": s["data_range"], "fit_stats": s["fit_stats"],
+            })
+            series_points.append(s["points"])
+    series_ids = session.scalars(insert(CurveSeries).returning(CurveSeries.id, sort_by_parameter_order=True), series_rows).all() if series_rows else []
+
+    point_rows = [
+        {"series_id": series_id, "flow": flow, "value": value, "sequence": i}
+        for series_id, points in zip(series_ids, series_points)
+        for i, (flow, value) in enumerate(points)
+    ]
+    if point_rows:
+        session.execute(insert(CurvePoint), point_rows)
+
+    results = [{"pump_id": pump_id, "curve_set_ids": []} for pump_id in pump_ids]
+    for set_id, (pump_index, _) in zip(set_ids, set_owner):
+        results[pump_index]["curve_set_ids"].append(set_id)
+    return results
+
+def _read_batches(stream: IO[bytes], batch_size: int) -> Iterator[List[Tuple[int, bytes]]]:
+    batch = []
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        batch.append((line_no, line))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _submit(batch: List[Tuple[int, bytes]]) -> List[Tuple[List[Tuple[int, bytes]], Optional[Future]]]:
+    """
+    Starts preparing a batch: (chunk, future) pairs, or a single (batch, None)
+    to prepare inline when there is no pool.
+    """
+    pool = get_pool()
+    if pool is None:
+        return [(batch, None)]
+    # One task per worker keeps pickling overhead low
+    step = max(1, -(-len(batch) // IMPORT_WORKERS))
+    chunks = [batch[i:i + step] for i in range(0, len(batch), step)]
+    try:
+        return [(chunk, pool.submit(prepare_lines, chunk)) for chunk in chunks]
+    except BrokenProcessPool:
+        # A worker died during an earlier import; start over with a new pool
+        shutdown_pool(wait=False)
+        pool = get_pool()
+        return [(chunk, pool.submit(prepare_lines, chunk)) for chunk in chunks]
+
+def _collect(pending) -> List[Dict[str, Any]]:
+    """
+    Results of the submitted chunks. A chunk whose worker failed (a fit error,
+    a crashed process) reports each of its lines as failed rather than ending
+    the import.
+    """
+    results = []
+    for chunk, future in pending:
+        try:
+            results.extend(prepare_lines(chunk) if future is None else future.result())
+        except Exception as e:
+            logger.exception("Catalog import failed to prepare lines %s-%s", chunk[0][0], chunk[-1][0])
+            if isinstance(e, BrokenProcessPool):
+                shutdown_pool(wait=False)
+            results.extend({"line": line_no, "error": {"message": "Processing failed; the record was not imported."}}
+                           for line_no, _ in chunk)
+    return results
+
+def import_catalog(bind: Engine, org_id: int, stream: IO[bytes], batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Imports an NDJSON catalog and yields one NDJSON result line per record,
+    followed by a summary line. Fitting of the next batch overlaps with the
+    insert of the current one.
+    """
+    imported = failed = 0
+    batches = _read_batches(stream, batch_size)
+    next_batch = next(batches, None)
+    pending = _submit(next_batch) if next_batch else None
+
+    while pending is not None:
+        prepared = _collect(pending)
+        next_batch = next(batches, None)
+        pending = _submit(next_batch) if next_batch else None
+
+        valid = [r for r in prepared if "pump" in r]
+        output = {r["line"]: {"line": r["line"], "ok": False, "error": r["error"]} for r in prepared if "error" in r}
+        try:
+            with Session(bind) as session:
+                inserted = insert_prepared(session, org_id, [r["pump"] for r in valid])
+                curve_store.mark_changed(session, org_id)
+                session.commit()
+            for r, ids in zip(valid, inserted):
+                output[r["line"]] = {"line": r["line"], "ok": True, **ids}
+        except SQLAlchemyError:
+            # Details stay in the server log: driver messages can expose schema and values
+            logger.exception("Catalog import batch insert failed (lines %s-%s)", valid[0]["line"] if valid else None,
+                             valid[-1]["line"] if valid else None)
+            for r in valid:
+                output[r["line"]] = {"line": r["line"], "ok": False,
+                                     "error": {"message": "Batch insert failed; no records of this batch were imported."}}
+
+        for line_no in sorted(output):
+            result = output[line_no]
+            if result["ok"]:
+                imported += 1
+            else:
+                failed += 1
+            yield orjson.dumps(result) + b"\n"
+
+    yield orjson.dumps({"summary": {"imported": imported, "failed": failed}}) + b"\n"
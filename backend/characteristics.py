@@ -0,0 +1,173 @@
+"""
+Keeps values derived from a curve set's fits in step with them: the
+CurveSetCharacteristics side table, derived power series and prediction bands.
+"""
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import or_
+from sqlmodel import Session, select
+
+from backend.models import CurveSet, CurveSeries, CurvePoint, CurveSetCharacteristics, SeriesType
+from backend.curves.characteristics import compute_characteristics, rpm_from_meta, sort_field
+from backend.curves.units import CHARACTERISTIC_QUANTITIES
+from backend.curves.derived import derive_power, specific_gravity_from_meta
+from backend.curves.uncertainty import bootstrap_bands, polynomial_degree
+from backend.curves.decimation import DecimationCache
+from backend.conditional import touch
+from backend import curve_store
+
+BANDS_CACHE_SIZE = int(os.getenv("BANDS_CACHE_SIZE", "4096"))
+
+def refresh_derived(session: Session, curve_set: CurveSet) -> None:
+    """
+    Single hook for series writes: updates a derived power series whose
+    sources changed, then the characteristics (which use it for max power),
+    and invalidates the org's curve store snapshot on commit. Does not commit.
+    """
+    refresh_derived_power(session, curve_set)
+    refresh_characteristics(session, curve_set)
+    curve_store.mark_changed(session, curve_set.org_id)
+
+def _power_sources(session: Session, curve_set: CurveSet) -> Dict[str, Any]:
+    sources = {}
+    for series in session.exec(
+        select(CurveSeries).where(CurveSeries.curve_set_id == curve_set.id, CurveSeries.type.in_([SeriesType.head, SeriesType.efficiency]))
+    ):
+        sources[series.type] = series
+    return sources
+
+def _power_cache_key(sources: Dict[str, Any], curve_set: CurveSet) -> Dict[str, Any]:
+    # fit_token, not id and revision: a replaced series can get its id back at revision 1
+    return {
+        "head": sources[SeriesType.head].fit_token,
+        "efficiency": sources[SeriesType.efficiency].fit_token,
+        "units": curve_set.units or {},
+        "specific_gravity": specific_gravity_from_meta(curve_set.meta_data),
+    }
+
+def update_derived_power(session: Session, curve_set: CurveSet, series: CurveSeries, force: bool = False) -> bool:
+    """
+    Recomputes a derived power series from the curve set's head and
+    efficiency fits, unless it was already computed from the same fits.
+    Raises ValueError if power cannot be derived. Returns True if the
+    series changed.
+    """
+    sources = _power_sources(session, curve_set)
+    if SeriesType.head not in sources or SeriesType.efficiency not in sources:
+        raise ValueError("Deriving power needs head and efficiency series.")
+
+    key = _power_cache_key(sources, curve_set)
+    if not force and series.derived_from == key:
+        return False
+
+    head, efficiency = sources[SeriesType.head], sources[SeriesType.efficiency]
+    series.derived_from = key
+    series.fit_model_type, series.fit_params, series.fit_quality, series.data_range = derive_power(
+        {"fit_params": head.fit_params, "data_range": head.data_range},
+        {"fit_params": efficiency.fit_params, "data_range": efficiency.data_range},
+        curve_set.units,
+        key["specific_gravity"]
+    )
+    series.fit_stats = None
+    touch(series)
+    session.add(series)
+    return True
+
+def refresh_derived_power(session: Session, curve_set: CurveSet) -> None:
+    session.flush()
+    series = session.exec(
+        select(CurveSeries).where(CurveSeries.curve_set_id == curve_set.id, CurveSeries.type == SeriesType.power)
+    ).first()
+    if series is None or not series.is_derived:
+        return
+    try:
+        update_derived_power(session, curve_set, series)
+    except ValueError as e:
+        sources = _power_sources(session, curve_set)
+        if SeriesType.head not in sources or SeriesType.efficiency not in sources:
+            session.delete(series) # A source series was removed
+            return
+        series.derived_from = _power_cache_key(sources, curve_set)
+        series.fit_model_type, series.fit_params, series.fit_quality = "failed", {}, {"error": str(e)}
+        touch(series)
+        session.add(series)
+
+def refresh_characteristics(session: Session, curve_set: CurveSet) -> Optional[CurveSetCharacteristics]:
+    """
+    Recomputes the curve set's characteristics from its stored fits and
+    stages the upsert. Does not commit; call after the series changes are
+    flushed and before the commit that makes them visible.
+    """
+    session.flush()
+    fits = {
+        series_type: {"fit_model_type": model, "fit_params": params, "data_range": data_range}
+        for series_type, model, params, data_range in session.exec(
+            select(CurveSeries.type, CurveSeries.fit_model_type, CurveSeries.fit_params, CurveSeries.data_range)
+            .where(CurveSeries.curve_set_id == curve_set.id)
+        )
+    }
+    values = compute_characteristics(fits, curve_set.units, rpm_from_meta(curve_set.meta_data, curve_set.pump.meta_data))
+
+    row = session.get(CurveSetCharacteristics, curve_set.id)
+    if row is None:
+        row = CurveSetCharacteristics(curve_set_id=curve_set.id, pump_id=curve_set.pump_id)
+    for key, value in values.items():
+        setattr(row, key, value)
+    row.computed_at = datetime.utcnow()
+    session.add(row)
+    return row
+
+# Bands computed on reads, by fit_token: reads never write
+_bands_cache = DecimationCache(BANDS_CACHE_SIZE)
+
+def fit_bands(session: Session, series: CurveSeries) -> Optional[Dict[str, Any]]:
+    """
+    Prediction bands for the series' current fit, computed on first use after
+    each refit and kept in a per-process cache. None for derived series (no
+    points to resample) and series without a polynomial fit.
+    """
+    degree = polynomial_degree(series.fit_model_type)
+    if series.is_derived or degree is None:
+        return None
+
+    key = (series.id, series.fit_token)
+    cached = _bands_cache.get(key)
+    if cached is None:
+        rows = session.exec(select(CurvePoint.flow, CurvePoint.value).where(CurvePoint.series_id == series.id)).all()
+        cached = bootstrap_bands([r[0] for r in rows], [r[1] for r in rows], degree, seed=series.id) or {}
+        _bands_cache.put(key, cached)
+    return cached or None
+
+def backfill(bind, progress=print) -> int:
+    """
+    Computes characteristics for curve sets that have none yet (databases
+    created before the table existed) or lack the SI sort copies (rows written
+    before those columns existed). Returns the number of curve sets done.
+    """
+    unnormalized = select(CurveSetCharacteristics.curve_set_id).where(or_(*(
+        getattr(CurveSetCharacteristics, field).is_not(None) & getattr(CurveSetCharacteristics, sort_field(field)).is_(None)
+        for field in CHARACTERISTIC_QUANTITIES
+    )))
+    done = 0
+    with Session(bind) as session:
+        missing = session.exec(
+            select(CurveSet).where(CurveSet.deleted_at.is_(None), or_(
+                ~CurveSet.id.in_(select(CurveSetCharacteristics.curve_set_id)), CurveSet.id.in_(unnormalized)
+            ))
+        ).all()
+        for curve_set in missing:
+            refresh_characteristics(session, curve_set)
+            done += 1
+            if done % 1000 == 0:
+                session.commit()
+                progress(f"{done}/{len(missing)} curve sets")
+        session.commit()
+    return done
+
+if __name__ == "__main__":
+    from backend.database import engine, create_db_and_tables
+
+    create_db_and_tables()
+    print(f"Computed characteristics for {backfill(engine)} curve sets.")
@@ -0,0 +1,83 @@
+from typing import Optional
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from backend.models import new_fit_token
+
+# Responses carry auth-scoped data, so shared caches must not store them and
+# browsers must revalidate before reuse.
+CACHE_CONTROL = "private, no-cache"
+
+def touch(*objects) -> None:
+    """
+    Marks objects as modified: bumps their revision and updated_at (and
+    replaces a series' fit_token). Every write that changes what a GET
+    returns must go through here, otherwise clients keep getting 304 for
+    stale data.
+    """
+    now = datetime.utcnow()
+    for obj in objects:
+        if obj is None:
+            continue
+        obj.revision = (obj.revision or 0) + 1
+        if hasattr(obj, "fit_token"):
+            obj.fit_token = new_fit_token()
+        if hasattr(obj, "updated_at"):
+            obj.updated_at = now
+
+class CacheValidators:
+    """
+    ETag / Last-Modified pair for a single resource representation.
+    """
+    def __init__(self, kind: str, object_id: int, revision: Optional[int], updated_at: Optional[datetime], variant: str = ""):
+        tag = f"{kind}-{object_id}-r{revision or 0}"
+        if variant:
+            tag = f"{tag}-{variant}"
+        # Weak: the body may be re-encoded (compression) without changing meaning
+        self.etag = f'W/"{tag}"'
+        self.last_modified = updated_at.replace(tzinfo=timezone.utc, microsecond=0) if updated_at else None
+
+    @classmethod
+    def for_object(cls, kind: str, obj, variant: str = "") -> "CacheValidators":
+        return cls(kind, obj.id, obj.revision, getattr(obj, "updated_at", None), variant)
+
+    def matches(self, request: Request) -> bool:
+        """
+        True if the client's cached copy is still current (RFC 9110 13.2.2:
+        If-None-Match takes precedence over If-Modified-Since).
+        """
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            candidates = [t.strip() for t in if_none_match.split(",")]
+            if "*" in candidates:
+                return True
+            ours = _opaque(self.etag)
+            return any(_opaque(t) == ours for t in candidates)
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return self.last_modified <= since
+
+        return False
+
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag, "Cache-Control": CACHE_CONTROL}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def apply(self, response: Response) -> None:
+        response.headers.update(self.headers())
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers())
+
+def _opaque(etag: str) -> str:
+    # Weak comparison: ignore the W/ prefix
+    return etag[2:] if etag.startswith("W/") else etag
@@ -0,0 +1,446 @@
+"""
+Read-optimized columnar snapshot of each org's curve library, shared by all
+worker processes through memory-mapped NumPy files.
+
+    CURVE_STORE_DIR/org_<id>/
+        CURRENT      name of the live generation, replaced atomically
+        DIRTY        token rewritten after every commit that changes the library
+        g<uuid>/     one generation: one .npy per column plus meta.json
+
+Series are rows sorted by id; their points live in flat flow/value columns
+sliced by offsets, and their fits in a (series x 4) coefficient matrix
+(zero-padded on the left, so np.polyval works for every degree). Readers
+map the files and take views, so N workers share one copy in the page cache.
+
+A generation records the DIRTY token it was built from. When the token has
+moved on, the snapshot is rebuilt in a background thread, started by the
+commit that moved it (and by any reader that finds it stale), never inside
+a request; readers fall back to the ORM until it is published. Series whose
+fit_token is unchanged are copied from the previous generation and only
+changed ones are read from the database. The new generation is written to
+a temporary directory, renamed, and then published by replacing CURRENT,
+so readers see either the old or the new snapshot, never a partial one.
+Only one process rebuilds at a time.
+
+Disabled unless CURVE_STORE_DIR is set.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session as _ORMSession
+from sqlmodel import Session, select
+
+from backend.models import CurveSeries, CurveSet, CurvePoint, SeriesType
+
+logger = logging.getLogger(__name__)
+
+CURVE_STORE_DIR = os.getenv("CURVE_STORE_DIR", "")
+
+MAX_DEGREE = 3
+SERIES_TYPES = list(SeriesType) # Stored as the index into this list
+COLUMNS = ("series_id", "curve_set_id", "pump_id", "type", "revision", "fit_token", "degree", "coeffs", "min_q", "max_q",
+           "flow_si", "value_si", "offsets", "flow", "value")
+_QUERY_CHUNK = 500
+_PENDING_KEY = "curve_store_changed_orgs"
+
+def enabled() -> bool:
+    return bool(CURVE_STORE_DIR)
+
+def _org_dir(org_id: int) -> str:
+    return os.path.join(CURVE_STORE_DIR, f"org_{org_id}")
+
+def _read(path: str, default: str = "") -> str:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return default
+
+def _write_atomic(path: str, content: str) -> None:
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+def invalidate(org_id: int) -> None:
+    """
+    Marks the org's snapshot stale. Call after the commit that changed it.
+    """
+    if not enabled():
+        return
+    os.makedirs(_org_dir(org_id), exist_ok=True)
+    _write_atomic(os.path.join(_org_dir(org_id), "DIRTY"), uuid.uuid4().hex)
+
+def mark_changed(session: Session, org_id: int) -> None:
+    """
+    Invalidates the org's snapshot when the session next commits (not
+    before: a rebuild in between would read the old rows and look current).
+    """
+    session.info.setdefault(_PENDING_KEY, set()).add(org_id)
+
+@event.listens_for(_ORMSession, "after_commit")
+def _invalidate_after_commit(session):
+    for org_id in session.info.pop(_PENDING_KEY, ()):
+        invalidate(org_id)
+        schedule_rebuild(session.get_bind(), org_id)
+
+@event.listens_for(_ORMSession, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+class StoredPoint(NamedTuple):
+    flow: float
+    value: float
+
+@dataclass
+class StoredSeries:
+    """
+    One series read from a snapshot, with the attributes the evaluation
+    endpoints use from CurveSeries. flow/value are read-only views.
+    """
+    id: int
+    curve_set_id: int
+    pump_id: int
+    type: SeriesType
+    revision: int
+    fit_model_type: Optional[str]
+    fit_params: Optional[Dict[str, Any]]
+    data_range: Dict[str, float]
+    units: Dict[str, str]
+    flow: Any
+    value: Any
+
+    @property
+    def points(self) -> List[StoredPoint]:
+        return [StoredPoint(q, v) for q, v in zip(self.flow.tolist(), self.value.tolist())]
+
+class Snapshot:
+    def __init__(self, arrays: Dict[str, Any], meta: Dict[str, Any], generation: Optional[str] = None):
+        self.arrays = arrays
+        self.meta = meta
+        self.generation = generation
+
+    def __len__(self) -> int:
+        return len(self.arrays["series_id"])
+
+    def find(self, series_id: int) -> Optional[int]:
+        import numpy as np
+
+        ids = self.arrays["series_id"]
+        i = int(np.searchsorted(ids, series_id))
+        return i if i < len(ids) and ids[i] == series_id else None
+
+    def series(self, i: int) -> StoredSeries:
+        a = self.arrays
+        degree = int(a["degree"][i])
+        start, end = int(a["offsets"][i]), int(a["offsets"][i + 1])
+        min_q, max_q = float(a["min_q"][i]), float(a["max_q"][i])
+        return StoredSeries(
+            id=int(a["series_id"][i]),
+            curve_set_id=int(a["curve_set_id"][i]),
+            pump_id=int(a["pump_id"][i]),
+            type=SERIES_TYPES[a["type"][i]],
+            revision=int(a["revision"][i]),
+            fit_model_type=f"polynomial_{degree}" if degree else None,
+            fit_params={"coeffs": a["coeffs"][i, MAX_DEGREE - degree:].tolist()} if degree else None,
+            data_range={} if min_q != min_q else {"min_q": min_q, "max_q": max_q}, # NaN: no range stored
+            units=self.meta["units"].get(str(int(a["curve_set_id"][i]))) or {},
+            flow=a["flow"][start:end],
+            value=a["value"][start:end],
+        )
+
+    def duty_point(self, flow_si: float, head_si: float, tolerance: float):
+        """
+        Head curves passing within `tolerance` (relative) of the duty point,
+        inside their data range. Evaluates every fit in one vectorized pass.
+        Returns (indices, head_si, deviation), closest first.
+        """
+        import numpy as np
+
+        a = self.arrays
+        with np.errstate(divide="ignore", invalid="ignore"):
+            q = flow_si / a["flow_si"] # In each series' own flow unit
+            c = a["coeffs"]
+            head = (((c[:, 0] * q + c[:, 1]) * q + c[:, 2]) * q + c[:, 3]) * a["value_si"]
+            deviation = np.abs(head - head_si) / abs(head_si)
+            mask = ((a["type"] == SERIES_TYPES.index(SeriesType.head)) & (a["degree"] > 0)
+                    & (q >= a["min_q"]) & (q <= a["max_q"]) & (deviation <= tolerance))
+        indices = np.flatnonzero(mask)
+        order = np.argsort(deviation[indices], kind="stable")
+        indices = indices[order]
+        return indices, head[indices], deviation[indices]
+
+def _factor(units: Dict[str, str], quantity: str) -> float:
+    from backend.curves.units import to_si
+
+    try:
+        return to_si(units, quantity)
+    except ValueError:
+        return float("nan")
+
+def _chunks(values: List[int]):
+    for i in range(0, len(values), _QUERY_CHUNK):
+        yield values[i:i + _QUERY_CHUNK]
+
+def build(session: Session, org_id: int, previous: Optional[Snapshot] = None, token: str = "") -> Snapshot:
+    """
+    Builds the org's snapshot in memory. Series whose id and fit_token match
+    `previous` reuse its columns; only the others are read from the database.
+    (Not the revision: a replaced series can get its id back at revision 1.)
+    """
+    import numpy as np
+
+    rows = session.exec(
+        select(CurveSeries.id, CurveSeries.curve_set_id, CurveSet.pump_id, CurveSeries.type, CurveSeries.revision, CurveSet.units,
+               CurveSeries.fit_token)
+        .join(CurveSet, CurveSeries.curve_set_id == CurveSet.id)
+        .where(CurveSeries.org_id == org_id, CurveSeries.deleted_at.is_(None))
+        .order_by(CurveSeries.id)
+    ).all()
+    m = len(rows)
+    series_id = np.array([r[0] for r in rows], dtype=np.int64)
+    revision = np.array([r[4] or 0 for r in rows], dtype=np.int64)
+    fit_token = np.array([(r[6] or "").encode() for r in rows], dtype="S32")
+
+    reused = np.full(m, -1, dtype=np.int64) # Index into previous, or -1
+    if previous is not None and len(previous) and m:
+        prev_ids = previous.arrays["series_id"]
+        j = np.minimum(np.searchsorted(prev_ids, series_id), len(prev_ids) - 1)
+        same = (prev_ids[j] == series_id) & (previous.arrays["fit_token"][j] == fit_token)
+        reused[same] = j[same]
+    changed = series_id[reused < 0].tolist()
+
+    fits, point_chunks = {}, []
+    for chunk in _chunks(changed):
+        for sid, model, params, data_range in session.exec(
+            select(CurveSeries.id, CurveSeries.fit_model_type, CurveSeries.fit_params, CurveSeries.data_range).where(CurveSeries.id.in_(chunk))
+        ):
+            fits[sid] = (model, params, data_range)
+        # Core rows streamed into an array: no ORM rows or per-point lists kept
+        point_rows = session.connection().execute(
+            select(CurvePoint.series_id, CurvePoint.flow, CurvePoint.value)
+            .where(CurvePoint.series_id.in_(chunk)).order_by(CurvePoint.series_id, CurvePoint.sequence)
+        )
+        point_chunks.append(np.fromiter((v for row in point_rows for v in row), dtype=float).reshape(-1, 3))
+    # Sorted by series id, so each changed series is one contiguous run
+    fetched = np.concatenate(point_chunks) if point_chunks else np.empty((0, 3))
+    starts = np.searchsorted(fetched[:, 0], changed, side="left")
+    ends = np.searchsorted(fetched[:, 0], changed, side="right")
+
+    degree = np.zeros(m, dtype=np.int8)
+    coeffs = np.zeros((m, MAX_DEGREE + 1))
+    min_q, max_q = np.full(m, np.nan), np.full(m, np.nan)
+    lengths = np.zeros(m, dtype=np.int64)
+    flow_pieces, value_pieces = [], []
+    prev = previous.arrays if previous is not None else None
+    k = 0 # Position in changed
+    for i, sid in enumerate(series_id.tolist()):
+        j = int(reused[i])
+        if j >= 0:
+            degree[i], coeffs[i], min_q[i], max_q[i] = prev["degree"][j], prev["coeffs"][j], prev["min_q"][j], prev["max_q"][j]
+            start, end = prev["offsets"][j], prev["offsets"][j + 1]
+            flow_pieces.append(prev["flow"][start:end])
+            value_pieces.append(prev["value"][start:end])
+            lengths[i] = end - start
+            continue
+
+        model, params, data_range = fits.get(sid, (None, None, None))
+        c = (params or {}).get("coeffs") if (model or "").startswith("polynomial") else None
+        if c and len(c) <= MAX_DEGREE + 1:
+            degree[i] = len(c) - 1
+            coeffs[i, MAX_DEGREE + 1 - len(c):] = c
+        if data_range and "min_q" in data_range and "max_q" in data_range:
+            min_q[i], max_q[i] = data_range["min_q"], data_range["max_q"]
+        run = fetched[starts[k]:ends[k]]
+        k += 1
+        flow_pieces.append(run[:, 1])
+        value_pieces.append(run[:, 2])
+        lengths[i] = len(run)
+
+    type_codes = {t: k for k, t in enumerate(SERIES_TYPES)}
+    units = {str(r[1]): r[5] or {} for r in rows}
+    arrays = {
+        "series_id": series_id,
+        "curve_set_id": np.array([r[1] for r in rows], dtype=np.int64),
+        "pump_id": np.array([r[2] for r in rows], dtype=np.int64),
+        "type": np.array([type_codes[r[3]] for r in rows], dtype=np.int8),
+        "revision": revision,
+        "fit_token": fit_token,
+        "degree": degree,
+        "coeffs": coeffs,
+        "min_q": min_q,
+        "max_q": max_q,
+        "flow_si": np.array([_factor(r[5], "flow") for r in rows]),
+        "value_si": np.array([_factor(r[5], r[3].value) for r in rows]),
+        "offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        "flow": np.concatenate(flow_pieces) if flow_pieces else np.empty(0),
+        "value": np.concatenate(value_pieces) if value_pieces else np.empty(0),
+    }
+    return Snapshot(arrays, {"org_id": org_id, "built_from": token, "units": units})
+
+def _write(org_id: int, snapshot: Snapshot) -> str:
+    import numpy as np
+
+    org_dir = _org_dir(org_id)
+    generation = f"g{uuid.uuid4().hex}"
+    tmp = os.path.join(org_dir, f".{generation}.tmp")
+    os.makedirs(tmp)
+    for name in COLUMNS:
+        np.save(os.path.join(tmp, f"{name}.npy"), snapshot.arrays[name])
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(snapshot.meta, f)
+    os.rename(tmp, os.path.join(org_dir, generation))
+
+    previous = _read(os.path.join(org_dir, "CURRENT"))
+    _write_atomic(os.path.join(org_dir, "CURRENT"), generation)
+    # Keep the generation just replaced: readers may have read CURRENT but not opened it yet
+    for name in os.listdir(org_dir):
+        if name.startswith("g") and name not in (generation, previous):
+            shutil.rmtree(os.path.join(org_dir, name), ignore_errors=True)
+    return generation
+
+def _load(org_id: int, generation: str) -> Snapshot:
+    import numpy as np
+
+    path = os.path.join(_org_dir(org_id), generation)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+    return Snapshot(arrays, meta, generation)
+
+_snapshots: Dict[int, Snapshot] = {}
+_snapshots_lock = threading.Lock()
+
+def _stale(org_id: int) -> Tuple[Optional[Snapshot], bool]:
+    """
+    (the org's published snapshot or None, whether it is stale).
+    """
+    org_dir = _org_dir(org_id)
+    token = _read(os.path.join(org_dir, "DIRTY"), "0")
+    generation = _read(os.path.join(org_dir, "CURRENT"))
+
+    cached = _snapshots.get(org_id)
+    if cached is not None and cached.generation == generation and cached.meta["built_from"] == token:
+        return cached, False
+
+    current = None
+    if generation:
+        try:
+            current = _load(org_id, generation)
+        except FileNotFoundError: # Replaced and removed since CURRENT was read
+            current = None
+    if current is None or current.meta["built_from"] != token:
+        return current, True
+    with _snapshots_lock:
+        _snapshots[org_id] = current
+    return current, False
+
+def snapshot(session: Session, org_id: int) -> Optional[Snapshot]:
+    """
+    The org's current memory-mapped snapshot. None when the store is
+    disabled or the snapshot is stale (callers then read through the ORM);
+    a stale snapshot is rebuilt in the background.
+    """
+    if not enabled():
+        return None
+    current, stale = _stale(org_id)
+    if stale:
+        schedule_rebuild(session.get_bind(), org_id)
+        return None
+    return current
+
+def refresh(session: Session, org_id: int) -> Optional[Snapshot]:
+    """
+    Like snapshot, but rebuilds a stale snapshot in this thread. None when
+    the store is disabled or another process is rebuilding it.
+    """
+    if not enabled():
+        return None
+    current, stale = _stale(org_id)
+    if stale:
+        current = _rebuild(session, org_id, current)
+        if current is None:
+            return None
+        with _snapshots_lock:
+            _snapshots[org_id] = current
+    return current
+
+# Orgs with a background rebuild running -> whether another was requested meanwhile
+_rebuilding: Dict[int, bool] = {}
+
+def _submit(fn: Callable[[], None]) -> None:
+    threading.Thread(target=fn, name="curve-store-rebuild", daemon=True).start()
+
+def schedule_rebuild(bind: Engine, org_id: int) -> None:
+    """
+    Rebuilds the org's snapshot in a background thread. Requests made while
+    one is running are coalesced into a single rebuild after it.
+    """
+    if not enabled():
+        return
+    with _snapshots_lock:
+        if org_id in _rebuilding:
+            _rebuilding[org_id] = True
+            return
+        _rebuilding[org_id] = False
+
+    def run():
+        while True:
+            try:
+                with Session(bind) as session:
+                    refresh(session, org_id)
+            except Exception:
+                logger.exception("Curve store rebuild failed for org %s", org_id)
+            with _snapshots_lock:
+                if not _rebuilding[org_id]:
+                    del _rebuilding[org_id]
+                    return
+                _rebuilding[org_id] = False
+
+    _submit(run)
+
+def _rebuild(session: Session, org_id: int, previous: Optional[Snapshot]) -> Optional[Snapshot]:
+    import fcntl
+
+    org_dir = _org_dir(org_id)
+    os.makedirs(org_dir, exist_ok=True)
+    with open(os.path.join(org_dir, ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        # Token first: a commit after this point leaves the snapshot stale again
+        token = _read(os.path.join(org_dir, "DIRTY"), "0")
+        built = build(session, org_id, previous, token)
+        return _load(org_id, _write(org_id, built))
+
+def library(session: Session, org_id: int) -> Snapshot:
+    """
+    Snapshot for whole-library scans: the shared one when the store is
+    enabled and current, otherwise built in memory for this call (reusing
+    the stale one's unchanged series).
+    """
+    if not enabled():
+        return build(session, org_id)
+    current, stale = _stale(org_id)
+    if not stale:
+        return current
+    schedule_rebuild(session.get_bind(), org_id)
+    return build(session, org_id, current)
+
+def find_series(session: Session, org_id: int, series_id: int) -> Optional[StoredSeries]:
+    """
+    The org's series from the snapshot, or None (store disabled, snapshot
+    stale, or no such series in the org).
+    """
+    snap = snapshot(session, org_id)
+    i = snap.find(series_id) if snap is not None else None
+    return snap.series(i) if i is not None else None
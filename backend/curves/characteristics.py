@@ -0,0 +1,116 @@
+from typing import Any, Dict, List, Optional, Tuple
+from backend.models import SeriesType
+from backend.curves.units import to_si, FLOW_TO_SI, HEAD_TO_SI, CHARACTERISTIC_QUANTITIES
+
+CHARACTERISTIC_FIELDS = ("bep_flow", "bep_head", "bep_efficiency", "shutoff_head", "runout_flow", "max_power", "specific_speed")
+
+def sort_field(field: str) -> str:
+    """
+    Stored column to compare `field` on across curve sets: the SI copy for
+    unit-dependent values, the value itself for specific speed.
+    """
+    return f"{field}_si" if field in CHARACTERISTIC_QUANTITIES else field
+
+def _polynomial(fit: Optional[Dict[str, Any]]):
+    if not fit or not (fit.get("fit_model_type") or "").startswith("polynomial"):
+        return None
+    coeffs = (fit.get("fit_params") or {}).get("coeffs")
+    data_range = fit.get("data_range") or {}
+    if not coeffs or "min_q" not in data_range or "max_q" not in data_range:
+        return None
+
+    import numpy as np
+
+    return np.poly1d(coeffs), float(data_range["min_q"]), float(data_range["max_q"])
+
+def _argmax(poly, lo: float, hi: float) -> Tuple[float, float]:
+    """
+    Maximum of a polynomial on [lo, hi]: compares the endpoints and the real
+    stationary points inside the interval.
+    """
+    import numpy as np
+
+    candidates = [lo, hi]
+    if poly.order > 1:
+        candidates += [float(r.real) for r in np.roots(poly.deriv().coeffs) if abs(r.imag) < 1e-9 and lo <= r.real <= hi]
+    best = max(candidates, key=lambda q: poly(q))
+    return best, float(poly(best))
+
+def specific_speed(rpm: Optional[float], flow: Optional[float], head: Optional[float], units: Dict[str, str]) -> Optional[float]:
+    """
+    Ns = N * sqrt(Q) / H^0.75 at the best efficiency point, in US customary
+    units (rpm, gpm, ft) as on pump selection charts. Curve sets without
+    units are taken as gpm/ft, like the UI default.
+    """
+    if not rpm or flow is None or head is None or flow <= 0 or head <= 0:
+        return None
+    try:
+        flow_factor = to_si(units, "flow") / FLOW_TO_SI["gpm"]
+        head_factor = to_si(units, "head") / HEAD_TO_SI["ft"]
+    except ValueError:
+        return None
+    return float(rpm) * (flow * flow_factor) ** 0.5 / (head * head_factor) ** 0.75
+
+def compute_characteristics(fits: Dict[SeriesType, Dict[str, Any]], units: Dict[str, str] = None,
+                            rpm: Optional[float] = None) -> Dict[str, Optional[float]]:
+    """
+    Hydraulic characteristics of one curve set from its stored fits.
+
+    fits maps series type to {"fit_model_type", "fit_params", "data_range"}.
+    Missing or failed fits leave the dependent values as None:
+        bep_*           efficiency maximum over its data range, with head there
+        shutoff_head    head fit at zero flow
+        runout_flow     largest measured flow of the head curve
+        max_power       power maximum over its data range
+        specific_speed  at the BEP, needs rpm (see specific_speed)
+    """
+    result: Dict[str, Optional[float]] = dict.fromkeys(CHARACTERISTIC_FIELDS)
+    head = _polynomial(fits.get(SeriesType.head))
+    efficiency = _polynomial(fits.get(SeriesType.efficiency))
+    power = _polynomial(fits.get(SeriesType.power))
+
+    if head:
+        poly, _, max_q = head
+        result["shutoff_head"] = float(poly(0.0))
+        result["runout_flow"] = max_q
+
+    if efficiency:
+        poly, lo, hi = efficiency
+        result["bep_flow"], result["bep_efficiency"] = _argmax(poly, lo, hi)
+        if head:
+            result["bep_head"] = float(head[0](result["bep_flow"]))
+
+    if power:
+        poly, lo, hi = power
+        result["max_power"] = _argmax(poly, lo, hi)[1]
+
+    result["specific_speed"] = specific_speed(rpm, result["bep_flow"], result["bep_head"], units)
+    result.update(normalized_characteristics(result, units))
+    return result
+
+def normalized_characteristics(values: Dict[str, Optional[float]], units: Dict[str, str] = None) -> Dict[str, Optional[float]]:
+    """
+    SI copies of the unit-dependent values ("bep_flow_si", ...), so curve sets
+    in different units compare correctly. None where the unit is unknown.
+    """
+    result: Dict[str, Optional[float]] = {}
+    for field, quantity in CHARACTERISTIC_QUANTITIES.items():
+        value = values.get(field)
+        try:
+            result[sort_field(field)] = None if value is None else value * to_si(units, quantity)
+        except ValueError:
+            result[sort_field(field)] = None
+    return result
+
+def rpm_from_meta(*meta_data: Optional[Dict[str, Any]]) -> Optional[float]:
+    """
+    First numeric "rpm" found in the given meta_data dicts (curve set, then pump).
+    """
+    for meta in meta_data:
+        value = (meta or {}).get("rpm")
+        try:
+            if value is not None:
+                return float(value)
+        except (TypeError, ValueError):
+            continue
+    return None
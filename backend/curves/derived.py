@@ -0,0 +1,58 @@
+from typing import Any, Dict, Optional, Tuple
+from backend.curves.units import to_si, GRAVITY, WATER_DENSITY
+
+DERIVED_POWER_SAMPLES = 128
+# Near shutoff both Q and efficiency go to zero and rho*g*Q*H/eta is 0/0;
+# only samples above this share of peak efficiency are fitted.
+MIN_EFFICIENCY_SHARE = 0.2
+
+def derive_power(head_fit: Dict[str, Any], efficiency_fit: Dict[str, Any], units: Dict[str, str],
+                 specific_gravity: float = 1.0) -> Tuple[str, Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """
+    Shaft power P = rho * g * Q * H / eta from fitted head and efficiency
+    curves, in the curve set's power unit.
+
+    The ratio is evaluated on a grid over the range both fits cover and
+    summarised by a cubic, like a measured power series, so evaluation and
+    comparison treat it the same way. Fits are {"fit_params", "data_range"}.
+    Returns fit_model_type, fit_params, fit_quality, data_range (as fit_curve
+    does); raises ValueError when power cannot be derived.
+    """
+    import numpy as np
+
+    head_coeffs = (head_fit.get("fit_params") or {}).get("coeffs")
+    efficiency_coeffs = (efficiency_fit.get("fit_params") or {}).get("coeffs")
+    if not head_coeffs or not efficiency_coeffs:
+        raise ValueError("Head and efficiency need polynomial fits to derive power.")
+
+    head_range, efficiency_range = head_fit.get("data_range") or {}, efficiency_fit.get("data_range") or {}
+    lo = max(head_range.get("min_q", 0.0), efficiency_range.get("min_q", 0.0))
+    hi = min(head_range.get("max_q", 0.0), efficiency_range.get("max_q", 0.0))
+    if hi <= lo:
+        raise ValueError("Head and efficiency curves do not cover a common flow range.")
+
+    q = np.linspace(lo, hi, DERIVED_POWER_SAMPLES)
+    head = np.polyval(head_coeffs, q)
+    efficiency = np.polyval(efficiency_coeffs, q) * to_si(units, "efficiency")
+    mask = (efficiency > MIN_EFFICIENCY_SHARE * efficiency.max()) & (head > 0) & (q > 0)
+    if mask.sum() < 4:
+        raise ValueError("Too little of the efficiency curve is positive to derive power.")
+
+    rho_g = specific_gravity * WATER_DENSITY * GRAVITY
+    power = rho_g * q[mask] * to_si(units, "flow") * head[mask] * to_si(units, "head") / efficiency[mask]
+    power /= to_si(units, "power")
+
+    coeffs = np.polyfit(q[mask], power, 3)
+    residuals = power - np.polyval(coeffs, q[mask])
+    ss_tot = np.sum((power - power.mean()) ** 2)
+    fit_quality = {
+        "rmse": float(np.sqrt(np.mean(residuals ** 2))),
+        "r2": float(1 - np.sum(residuals ** 2) / ss_tot) if ss_tot != 0 else 0.0,
+    }
+    return "polynomial_3", {"coeffs": coeffs.tolist()}, fit_quality, {"min_q": float(lo), "max_q": float(hi)}
+
+def specific_gravity_from_meta(meta_data: Optional[Dict[str, Any]]) -> float:
+    try:
+        return float((meta_data or {}).get("specific_gravity", 1.0))
+    except (TypeError, ValueError):
+        return 1.0
@@ -1,5 +1,4 @@
 from typing import Dict, Any, Optional, List
-import numpy as np
 from backend.models import SeriesType
 
 def evaluate_curve_at_point(
@@ -12,6 +11,8 @@ def evaluate_curve_at_point(
     """
     Evaluates the curve at a given flow.
     """
+    import numpy as np # Deferred: keeps app import and cold start fast
+
     prediction = None
     warnings = []
 
@@ -54,3 +55,65 @@ def evaluate_curve_at_point(
         "is_extrapolation": is_extrapolation,
         "warnings": warnings
     }
+
+def sample_curve(
+    fit_model_type: Optional[str],
+    fit_params: Optional[Dict[str, Any]],
+    data_range: Dict[str, Any],
+    n: int,
+    points: List[Dict[str, float]] = None
+):
+    """
+    Evaluates the curve at n evenly spaced flows across its data range in one
+    vectorized call. Without a polynomial fit, linearly interpolates the
+    points instead. Returns (flows, values) numpy arrays, empty if neither
+    a fit nor points are available.
+    """
+    import numpy as np
+
+    coeffs = (fit_params or {}).get("coeffs") if (fit_model_type or "").startswith("polynomial") else None
+    if points and (not data_range or "min_q" not in data_range):
+        data_range = {"min_q": min(p["flow"] for p in points), "max_q": max(p["flow"] for p in points)}
+    if not data_range or "min_q" not in data_range or (not coeffs and not points):
+        return np.empty(0), np.empty(0)
+
+    flows = np.linspace(data_range["min_q"], data_range["max_q"], n)
+    if coeffs:
+        return flows, np.polyval(coeffs, flows)
+    sorted_points = sorted(points, key=lambda x: x["flow"])
+    return flows, np.interp(flows, [p["flow"] for p in sorted_points], [p["value"] for p in sorted_points])
+
+class CompiledCurve:
+    """
+    A series prepared for many scalar evaluations (interactive sweeps):
+    coefficients as a tuple evaluated by Horner's rule in plain Python, with
+    no per-call numpy or dict lookups. Same results as
+    evaluate_curve_at_point, including the fallback to interpolating points.
+    """
+    __slots__ = ("coeffs", "min_q", "max_q", "flows", "values")
+
+    def __init__(self, fit_model_type: Optional[str], fit_params: Optional[Dict[str, Any]],
+                 data_range: Optional[Dict[str, Any]], points: List[Dict[str, float]] = None):
+        coeffs = (fit_params or {}).get("coeffs") if (fit_model_type or "").startswith("polynomial") else None
+        self.coeffs = tuple(float(c) for c in coeffs) if coeffs else None
+        self.min_q = (data_range or {}).get("min_q", 0)
+        self.max_q = (data_range or {}).get("max_q", 0)
+        sorted_points = sorted(points or [], key=lambda x: x["flow"])
+        self.flows = [p["flow"] for p in sorted_points]
+        self.values = [p["value"] for p in sorted_points]
+
+    def __call__(self, flow: float):
+        """
+        Returns (predicted value or None, is_extrapolation).
+        """
+        is_extrapolation = flow < self.min_q or flow > self.max_q
+        if self.coeffs:
+            value = 0.0
+            for c in self.coeffs:
+                value = value * flow + c
+            return value, is_extrapolation
+        if self.flows:
+            import numpy as np
+
+            return float(np.interp(flow, self.flows, self.values)), is_extrapolation
+        return None, is_extrapolation
@@ -1,7 +1,6 @@
-import numpy as np
-from scipy.interpolate import UnivariateSpline
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 from backend.models import SeriesType
+from backend.tracing import stage
 
 def fit_curve(series_type: SeriesType, points: List[Dict[str, float]]) -> Tuple[str, Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
     """
@@ -15,6 +14,8 @@ def fit_curve(series_type: SeriesType, points: List[Dict[str, float]]) -> Tuple[
     if not points or len(points) < 2:
         return None, None, None, None
 
+    import numpy as np # Deferred: keeps app import and cold start fast
+
     flows = np.array([p["flow"] for p in points])
     values = np.array([p["value"] for p in points])
 
@@ -31,7 +32,8 @@ def fit_curve(series_type: SeriesType, points: List[Dict[str, float]]) -> Tuple[
         # Use numpy.polyfit
         # H = a*Q^2 + b*Q + c
         try:
-            coeffs = np.polyfit(flows, values, 2)
+            with stage("fit.polynomial_2"):
+                coeffs = np.polyfit(flows, values, 2)
             # coeffs is [a, b, c] for a*x^2 + b*x + c
             fit_model_type = "polynomial_2"
             fit_params = {
@@ -56,46 +58,15 @@ def fit_curve(series_type: SeriesType, points: List[Dict[str, float]]) -> Tuple[
             fit_quality = {"error": str(e)}
 
     elif series_type == SeriesType.efficiency or series_type == SeriesType.power:
-        # Univariate Spline with smoothing
-        # "smooth curve with a single peak preference" for eff
-        # "monotonic-ish smoothing" for power
-
-        # We can use UnivariateSpline. It allows setting a smoothing factor s.
-        # If we don't provide s, it uses len(w).
-        # Let's try a default smoothing strategy.
+        # Polynomial degree 3: handles the single peak (efficiency) and the
+        # monotonic-ish rise (power) without the oscillations of a spline.
         try:
-            # Sort just in case (though validation ensures sorted)
-            # UnivariateSpline requires strictly increasing x
-            # Deduplication should have handled equal x.
-
-            # To store spline, we need knots (t), coeffs (c), degree (k)
-            # UnivariateSpline defaults to k=3
-
-            # Simple heuristic for s: len(points) if noisy?
-            # Let's try s=None (default) first, which might be interpolating if no weights.
-            # We want smoothing. s controls the smoothness.
-            # s = number of points?
-
-            spl = UnivariateSpline(flows, values, k=3, s=len(flows)) # Just a guess for s
+            # Same minimum as the cubic smoothing spline this replaced (m > k)
+            if len(flows) <= 3:
+                raise ValueError("A cubic fit needs at least 4 points.")
 
-            # If s is too large, it might be too smooth (flat). If too small, too wiggly.
-            # Let's try to find a good s? Or just use a fixed small s or leave it to scipy defaults which usually interpolate.
-            # Requirement: "Auto-fit a smooth curve".
-            # For efficiency, we expect a hump.
-            # For power, we expect monotonic increase usually.
-
-            # For robustness, let's use a lower order polynomial (3 or 4) for Efficiency/Power if points are few,
-            # or Spline if many.
-            # Actually, the prompt says "recommended fits... Efficiency: smooth curve... Power: monotonic-ish".
-
-            # Let's stick to polynomial degree 3 for efficiency and power for simplicity and robustness against wild oscillations of splines.
-            # Unless the user really wants splines.
-            # "Head vs Flow: polynomial regression... Efficiency... smooth curve... Power... monotonic-ish"
-
-            # Let's try Polynomial degree 3 for all others for now as a baseline robust fit.
-            # It handles single peak (efficiency) and monotonic (power) reasonably well for pump curves.
-
-            coeffs = np.polyfit(flows, values, 3)
+            with stage("fit.polynomial_3"):
+                coeffs = np.polyfit(flows, values, 3)
             fit_model_type = "polynomial_3"
             fit_params = {
                 "coeffs": coeffs.tolist()
@@ -119,3 +90,161 @@ def fit_curve(series_type: SeriesType, points: List[Dict[str, float]]) -> Tuple[
             fit_quality = {"error": str(e)}
 
     return fit_model_type, fit_params, fit_quality, data_range
+
+# Polynomial degree fitted per series type (see fit_curve)
+POLYNOMIAL_DEGREES = {
+    SeriesType.head: 2,
+    SeriesType.efficiency: 3,
+    SeriesType.power: 3,
+}
+
+def moment_stats(series_type: SeriesType, points: List[Dict[str, float]]) -> Dict[str, Any]:
+    """
+    Least-squares sufficient statistics for the series' polynomial fit.
+
+    Stores the normal-equation sums in a scaled variable x = flow / scale,
+    which keeps the sums well conditioned:
+        sx[k]  = sum(x^k)      k = 0..2d   (sx[0] is the point count)
+        sxy[k] = sum(x^k * y)  k = 0..d
+        syy    = sum(y^2)
+    Points can then be added or removed in O(d) and the fit recomputed in
+    O(d^2) without touching the other points (see update_moment_stats).
+    """
+    import numpy as np
+
+    degree = POLYNOMIAL_DEGREES[series_type]
+    flows = np.array([p["flow"] for p in points], dtype=float)
+    values = np.array([p["value"] for p in points], dtype=float)
+    scale = float(np.max(np.abs(flows))) if len(flows) else 0.0
+    scale = scale or 1.0
+
+    x = flows / scale
+    powers = np.vander(x, 2 * degree + 1, increasing=True) if len(x) else np.zeros((0, 2 * degree + 1))
+    return {
+        "degree": degree,
+        "scale": scale,
+        "sx": powers.sum(axis=0).tolist(),
+        "sxy": (powers[:, :degree + 1] * values[:, None]).sum(axis=0).tolist(),
+        "syy": float(np.sum(values ** 2)),
+    }
+
+def update_moment_stats(stats: Dict[str, Any], added: List[Tuple[float, float]] = (), removed: List[Tuple[float, float]] = ()) -> Dict[str, Any]:
+    """
+    Returns new statistics with (flow, value) pairs added and removed.
+    """
+    degree, scale = stats["degree"], stats["scale"]
+    sx, sxy, syy = list(stats["sx"]), list(stats["sxy"]), stats["syy"]
+
+    for sign, pairs in ((1.0, added), (-1.0, removed)):
+        for flow, value in pairs:
+            x = flow / scale
+            xk = 1.0
+            for k in range(2 * degree + 1):
+                sx[k] += sign * xk
+                if k <= degree:
+                    sxy[k] += sign * xk * value
+                xk *= x
+            syy += sign * value * value
+
+    return {"degree": degree, "scale": scale, "sx": sx, "sxy": sxy, "syy": syy}
+
+def fit_from_moments(stats: Dict[str, Any]) -> Tuple[Optional[str], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Solves the normal equations held in stats. Equivalent to np.polyfit on the
+    underlying points, in O(d^2) regardless of point count.
+    Returns fit_model_type, fit_params, fit_quality (as fit_curve does).
+    """
+    degree, scale = stats["degree"], stats["scale"]
+    sx, sxy, syy = stats["sx"], stats["sxy"], stats["syy"]
+    n = sx[0]
+    if n < 2:
+        return None, None, None
+    if degree == 3 and round(n) <= degree: # As fit_curve
+        return "failed", {}, {"error": "A cubic fit needs at least 4 points."}
+
+    import numpy as np
+
+    try:
+        A = np.array([[sx[i + j] for j in range(degree + 1)] for i in range(degree + 1)])
+        b = np.array(sxy[:degree + 1])
+        # lstsq gives the minimum-norm solution when there are <= degree points
+        a, *_ = np.linalg.lstsq(A, b, rcond=None)
+    except Exception as e:
+        return "failed", {}, {"error": str(e)}
+
+    ss_res = max(float(syy - 2 * a @ b + a @ A @ a), 0.0)
+    ss_tot = syy - sxy[0] ** 2 / n
+    rmse = float(np.sqrt(ss_res / n))
+    r2 = 1 - (ss_res / ss_tot) if ss_tot > 1e-12 * max(syy, 1.0) else 0
+
+    # Back to flow units, highest power first (np.poly1d order)
+    coeffs = [float(a[k] / scale ** k) for k in range(degree, -1, -1)]
+    return f"polynomial_{degree}", {"coeffs": coeffs}, {"rmse": rmse, "r2": float(r2)}
+
+def fit_curves(items: Sequence[Tuple[SeriesType, Sequence[float], Sequence[float]]]) -> List[Tuple[Optional[str], Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    fit_curve and moment_stats for many (series_type, flows, values) at once.
+
+    Series are grouped by polynomial degree and point count; each group is
+    stacked into (series x points) arrays and solved as one batch of normal
+    equations in the scaled variable of moment_stats, with RMSE/R^2 computed
+    over the whole group. Series too short or too degenerate for that (fewer
+    distinct flows than coefficients, non-finite values) go through fit_curve
+    one by one, so results always match it.
+    Returns (fit_model_type, fit_params, fit_quality, data_range, fit_stats)
+    per item, in order.
+    """
+    import numpy as np
+
+    results: List[Any] = [None] * len(items)
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for i, (series_type, flows, _) in enumerate(items):
+        degree = POLYNOMIAL_DEGREES.get(series_type)
+        if degree is not None and len(flows) > degree:
+            groups.setdefault((degree, len(flows)), []).append(i)
+
+    with stage("fit.batch"):
+        for (degree, n), indices in groups.items():
+            p = degree + 1
+            flows = np.array([items[i][1] for i in indices], dtype=float) # m x n
+            values = np.array([items[i][2] for i in indices], dtype=float)
+            scale = np.max(np.abs(flows), axis=1)
+            scale[scale == 0] = 1.0
+
+            powers = (flows / scale[:, None])[..., None] ** np.arange(2 * degree + 1) # m x n x (2d+1)
+            sx = powers.sum(axis=1)
+            sxy = np.einsum("mnk,mn->mk", powers[..., :p], values)
+            syy = np.einsum("mn,mn->m", values, values)
+            A = sx[:, np.add.outer(np.arange(p), np.arange(p))] # m x p x p
+
+            # Full rank needs more distinct flows than the degree
+            distinct = 1 + np.count_nonzero(np.diff(np.sort(flows, axis=1), axis=1) > 1e-9 * scale[:, None], axis=1)
+            ok = (distinct > degree) & np.isfinite(A).all(axis=(1, 2)) & np.isfinite(sxy).all(axis=1)
+            if not ok.any():
+                continue
+            a = np.linalg.solve(A[ok], sxy[ok][..., None])[..., 0] # m' x p, lowest power first
+
+            residuals = values[ok] - np.einsum("mnk,mk->mn", powers[ok][..., :p], a)
+            ss_res = np.sum(residuals ** 2, axis=1)
+            ss_tot = np.sum((values[ok] - values[ok].mean(axis=1, keepdims=True)) ** 2, axis=1)
+            rmse = np.sqrt(ss_res / n)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                r2 = np.where(ss_tot != 0, 1 - ss_res / ss_tot, 0.0)
+            # Back to flow units, highest power first (np.poly1d order)
+            coeffs = a[:, ::-1] / scale[ok][:, None] ** np.arange(degree, -1, -1)
+            min_q, max_q = flows[ok].min(axis=1), flows[ok].max(axis=1)
+
+            # One tolist per array: per-row conversions would dominate the batch
+            model = f"polynomial_{degree}"
+            rows = zip(np.flatnonzero(ok).tolist(), coeffs.tolist(), rmse.tolist(), r2.tolist(), min_q.tolist(), max_q.tolist(),
+                       scale[ok].tolist(), sx[ok].tolist(), sxy[ok].tolist(), syy[ok].tolist())
+            for j, c, e, r, lo, hi, sc, s_x, s_xy, s_yy in rows:
+                stats = {"degree": degree, "scale": sc, "sx": s_x, "sxy": s_xy, "syy": s_yy}
+                results[indices[j]] = (model, {"coeffs": c}, {"rmse": e, "r2": r}, {"min_q": lo, "max_q": hi}, stats)
+
+    for i, result in enumerate(results):
+        if result is None:
+            series_type, flows, values = items[i]
+            points = [{"flow": q, "value": v} for q, v in zip(flows, values)]
+            results[i] = (*fit_curve(series_type, points), moment_stats(series_type, points))
+    return results
@@ -0,0 +1,75 @@
+import os
+from typing import Any, Dict, Optional, Sequence
+
+BOOTSTRAP_REPLICATES = int(os.getenv("BOOTSTRAP_REPLICATES", "400"))
+BOOTSTRAP_GRID = int(os.getenv("BOOTSTRAP_GRID", "33"))
+PREDICTION_LEVEL = 0.95
+
+def bootstrap_bands(flows: Sequence[float], values: Sequence[float], degree: int,
+                    replicates: int = BOOTSTRAP_REPLICATES, grid_size: int = BOOTSTRAP_GRID,
+                    level: float = PREDICTION_LEVEL, seed: int = 0) -> Optional[Dict[str, Any]]:
+    """
+    Prediction intervals for a polynomial fit by residual bootstrap.
+
+    Every replicate shares the design matrix, so all replicate fits are one
+    matrix product with its pseudo-inverse: (replicates x n) @ (n x p).
+    Replicate curves plus a resampled residual give the prediction
+    distribution on a grid over the data range. Stored compactly as lower/
+    upper offsets from the fitted curve at grid_size evenly spaced flows.
+    Returns None when there are too few points to estimate residuals.
+    """
+    import numpy as np
+
+    x = np.asarray(flows, dtype=float)
+    y = np.asarray(values, dtype=float)
+    n, p = len(x), degree + 1
+    if n <= p:
+        return None
+
+    scale = float(np.max(np.abs(x))) or 1.0 # Scaled x keeps the Vandermonde matrix well conditioned
+    X = np.vander(x / scale, p)
+    pinv = np.linalg.pinv(X) # p x n
+    beta = pinv @ y
+    fitted = X @ beta
+    # Inflate for the degrees of freedom the fit used, and centre
+    residuals = (y - fitted) * np.sqrt(n / (n - p))
+    residuals -= residuals.mean()
+
+    rng = np.random.default_rng(seed)
+    y_star = fitted + residuals[rng.integers(0, n, size=(replicates, n))] # replicates x n
+    beta_star = y_star @ pinv.T # replicates x p: every refit at once
+
+    lo, hi = float(x.min()), float(x.max())
+    grid = np.vander(np.linspace(lo, hi, grid_size) / scale, p)
+    predictions = beta_star @ grid.T + residuals[rng.integers(0, n, size=(replicates, grid_size))]
+    alpha = (1 - level) / 2
+    lower, upper = np.quantile(predictions, [alpha, 1 - alpha], axis=0)
+    center = grid @ beta
+
+    return {
+        "level": level,
+        "replicates": replicates,
+        "min_q": lo,
+        "max_q": hi,
+        "lower": (lower - center).tolist(),
+        "upper": (upper - center).tolist(),
+    }
+
+def band_offsets(bands: Dict[str, Any], flows):
+    """
+    Lower and upper offsets from the fitted value at the given flows, by
+    linear interpolation on the stored grid (held constant beyond it).
+    """
+    import numpy as np
+
+    grid = np.linspace(bands["min_q"], bands["max_q"], len(bands["lower"]))
+    flows = np.asarray(flows, dtype=float)
+    return np.interp(flows, grid, bands["lower"]), np.interp(flows, grid, bands["upper"])
+
+def polynomial_degree(fit_model_type: Optional[str]) -> Optional[int]:
+    if fit_model_type and fit_model_type.startswith("polynomial_"):
+        try:
+            return int(fit_model_type.rsplit("_", 1)[1])
+        except ValueError:
+            return None
+    return None
@@ -0,0 +1,168 @@
+"""
+Unit factors for curve quantities. Each table maps a unit label (as stored
+in CurveSet.units) to the multiplier that converts it to SI: m3/s, m, W,
+and fraction for efficiency.
+"""
+from typing import Any, Dict
+
+FLOW_TO_SI = {
+    "m3/s": 1.0,
+    "m3/h": 1.0 / 3600.0,
+    "l/s": 1e-3,
+    "lpm": 1.0 / 60000.0,
+    "gpm": 6.30901964e-5, # US gallons per minute
+}
+HEAD_TO_SI = {"m": 1.0, "ft": 0.3048}
+POWER_TO_SI = {"W": 1.0, "kW": 1000.0, "hp": 745.699872}
+EFFICIENCY_TO_SI = {"%": 0.01, "fraction": 1.0}
+
+FACTORS = {"flow": FLOW_TO_SI, "head": HEAD_TO_SI, "power": POWER_TO_SI, "efficiency": EFFICIENCY_TO_SI}
+
+# What the UI assumes when a curve set has no units recorded
+DEFAULT_UNITS = {"flow": "gpm", "head": "ft", "efficiency": "%", "power": "hp"}
+
+GRAVITY = 9.80665 # m/s^2
+WATER_DENSITY = 998.2 # kg/m^3 at 20 C
+
+def unit_for(units: Dict[str, str], quantity: str) -> str:
+    return (units or {}).get(quantity) or DEFAULT_UNITS[quantity]
+
+def to_si(units: Dict[str, str], quantity: str) -> float:
+    """
+    Factor converting `quantity` in the curve set's unit to SI. Raises
+    ValueError for units not in the tables above.
+    """
+    unit = unit_for(units, quantity)
+    try:
+        return FACTORS[quantity][unit]
+    except KeyError:
+        raise ValueError(f"Unknown {quantity} unit '{unit}'. Expected one of: {', '.join(FACTORS[quantity])}")
+
+# Unit systems accepted by ?units=. SI uses m3/h for flow, as pump curves do.
+UNIT_SYSTEMS = {
+    "SI": {"flow": "m3/h", "head": "m", "efficiency": "%", "power": "kW"},
+    "US": {"flow": "gpm", "head": "ft", "efficiency": "%", "power": "hp"},
+}
+
+# Precomputed factor for every (from, to) pair of each quantity
+CONVERSIONS = {
+    quantity: {(a, b): table[a] / table[b] for a in table for b in table}
+    for quantity, table in FACTORS.items()
+}
+
+# Which quantity a series' values are in
+SERIES_QUANTITY = {"head": "head", "efficiency": "efficiency", "power": "power"}
+
+def parse_units(spec: str) -> Dict[str, str]:
+    """
+    Target units from a ?units= value: "SI", "US", or a custom list such as
+    "flow:l/s,head:m". Quantities left out of a custom list are not converted.
+    Raises ValueError for unknown systems, quantities or units.
+    """
+    system = UNIT_SYSTEMS.get(spec.upper())
+    if system is not None:
+        return dict(system)
+
+    target = {}
+    for part in spec.split(","):
+        quantity, sep, unit = part.partition(":")
+        quantity, unit = quantity.strip(), unit.strip()
+        if not sep or quantity not in FACTORS:
+            raise ValueError(f"Invalid units '{spec}'. Use SI, US or e.g. flow:l/s,head:m (quantities: {', '.join(FACTORS)})")
+        if unit not in FACTORS[quantity]:
+            raise ValueError(f"Unknown {quantity} unit '{unit}'. Expected one of: {', '.join(FACTORS[quantity])}")
+        target[quantity] = unit
+    return target
+
+def conversion_factors(source: Dict[str, str], target: Dict[str, str]) -> Dict[str, float]:
+    """
+    Multipliers taking values in the curve set's units to the target units,
+    per quantity (1.0 where the target leaves a quantity unchanged).
+    """
+    factors = {}
+    for quantity in FACTORS:
+        to_unit = target.get(quantity)
+        if to_unit is None:
+            factors[quantity] = 1.0
+            continue
+        from_unit = unit_for(source, quantity)
+        try:
+            factors[quantity] = CONVERSIONS[quantity][(from_unit, to_unit)]
+        except KeyError:
+            raise ValueError(f"Unknown {quantity} unit '{from_unit}'. Expected one of: {', '.join(FACTORS[quantity])}")
+    return factors
+
+def converted_units(source: Dict[str, str], target: Dict[str, str]) -> Dict[str, str]:
+    return {**{q: unit_for(source, q) for q in FACTORS}, **(source or {}), **target}
+
+def scale_coeffs(coeffs, flow_factor: float, value_factor: float):
+    """
+    Rescales polynomial coefficients (highest power first, np.poly1d order)
+    for x' = flow_factor * x and y' = value_factor * y, without refitting:
+    c'_k = value_factor * c_k / flow_factor^k.
+    """
+    import numpy as np
+
+    c = np.asarray(coeffs, dtype=float)
+    powers = np.arange(len(c) - 1, -1, -1)
+    return (c * value_factor / flow_factor ** powers).tolist()
+
+def convert_series(series: Dict[str, Any], factors: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Converts a serialized series (CurveSeriesRead or the columnar variant) in
+    place: points, fit coefficients, fit rmse and data_range.
+    """
+    import numpy as np
+
+    type_value = series["type"].value if hasattr(series["type"], "value") else series["type"]
+    a, b = factors["flow"], factors[SERIES_QUANTITY[type_value]]
+
+    points = series.get("points")
+    if isinstance(points, dict): # Columnar
+        points["flow"] = (np.asarray(points["flow"], dtype=float) * a).tolist()
+        points["value"] = (np.asarray(points["value"], dtype=float) * b).tolist()
+    elif points:
+        flows = (np.fromiter((p["flow"] for p in points), float, len(points)) * a).tolist()
+        values = (np.fromiter((p["value"] for p in points), float, len(points)) * b).tolist()
+        for p, flow, value in zip(points, flows, values):
+            p["flow"], p["value"] = flow, value
+
+    params = series.get("fit_params")
+    if params and params.get("coeffs"):
+        series["fit_params"] = {**params, "coeffs": scale_coeffs(params["coeffs"], a, b)}
+    quality = series.get("fit_quality")
+    if quality and quality.get("rmse") is not None:
+        series["fit_quality"] = {**quality, "rmse": quality["rmse"] * b}
+    data_range = series.get("data_range")
+    if data_range:
+        series["data_range"] = {k: (v * a if k in ("min_q", "max_q") and v is not None else v) for k, v in data_range.items()}
+    return series
+
+# Characteristic -> quantity; specific_speed is always rpm/gpm/ft
+CHARACTERISTIC_QUANTITIES = {
+    "bep_flow": "flow", "bep_head": "head", "bep_efficiency": "efficiency",
+    "shutoff_head": "head", "runout_flow": "flow", "max_power": "power",
+}
+
+def convert_curve_set(curve_set: Dict[str, Any], target: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Converts a serialized curve set (with or without series) in place and
+    reports the resulting units in its `units` field.
+    """
+    source = curve_set.get("units") or {}
+    factors = conversion_factors(source, target)
+    for series in curve_set.get("series") or []:
+        convert_series(series, factors)
+    characteristics = curve_set.get("characteristics")
+    if characteristics:
+        for key, quantity in CHARACTERISTIC_QUANTITIES.items():
+            if characteristics.get(key) is not None:
+                characteristics[key] *= factors[quantity]
+    curve_set["units"] = converted_units(source, target)
+    return curve_set
+
+def units_key(target: Dict[str, str]) -> str:
+    """
+    Stable text form of target units, e.g. for cache validator variants.
+    """
+    return ".".join(f"{q}={u}" for q, u in sorted(target.items()))
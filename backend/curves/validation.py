@@ -1,6 +1,7 @@
 from typing import List, Dict, Any, Tuple
 from pydantic import BaseModel
 from backend.models import SeriesType
+from backend.tracing import stage
 
 class ValidationResult(BaseModel):
     blocking_errors: List[Dict[str, Any]]
@@ -51,6 +52,7 @@ def validate_points(series_type: SeriesType, points: List[Dict[str, Any]]) -> Va
         })
         return ValidationResult(blocking_errors=blocking_errors, warnings=warnings, normalized_points=[])
 
+    dedupe = stage("dedupe").start()
     # 2. Sorting
     # Sort by flow
     clean_points.sort(key=lambda x: x["flow"])
@@ -75,7 +77,8 @@ def validate_points(series_type: SeriesType, points: List[Dict[str, Any]]) -> Va
                         "code": "DUPLICATE_FLOW",
                         "message": f"Duplicate flow values found at flow={current_flow}. Averaging values.",
                         "severity": "warning",
-                        "indices": [p["original_index"] for p in current_group]
+                        "indices": [p["original_index"] for p in current_group],
+                        "flows": [current_flow]
                     })
                     # Strategy: Average
                     avg_val = sum(p["value"] for p in current_group) / len(current_group)
@@ -92,7 +95,8 @@ def validate_points(series_type: SeriesType, points: List[Dict[str, Any]]) -> Va
                 "code": "DUPLICATE_FLOW",
                 "message": f"Duplicate flow values found at flow={current_flow}. Averaging values.",
                 "severity": "warning",
-                "indices": [p["original_index"] for p in current_group]
+                "indices": [p["original_index"] for p in current_group],
+                "flows": [current_flow]
             })
             avg_val = sum(p["value"] for p in current_group) / len(current_group)
             unique_points.append({"flow": current_flow, "value": avg_val})
@@ -100,8 +104,10 @@ def validate_points(series_type: SeriesType, points: List[Dict[str, Any]]) -> Va
             unique_points.append({"flow": current_group[0]["flow"], "value": current_group[0]["value"]})
 
     normalized_points = unique_points
+    dedupe.stop()
 
-    # 4. Type specific checks
+    # 4. Type specific checks. Per-point findings carry the flows as well as
+    # the indices: indices go stale once points are edited (see patch_curve_points).
     flows = [p["flow"] for p in normalized_points]
     values = [p["value"] for p in normalized_points]
 
@@ -113,7 +119,8 @@ def validate_points(series_type: SeriesType, points: List[Dict[str, Any]]) -> Va
                  "code": "EFF_GT_100",
                  "message": "Efficiency values > 100% detected.",
                  "severity": "warning", # Prompt says "warning or error (justify and document)". Defaulting to warning as user might mean >1 or weird units.
-                 "indices": indices_gt_100
+                 "indices": indices_gt_100,
+                 "flows": [flows[i] for i in indices_gt_100]
              })
         # Efficiency < 0
         indices_lt_0 = [i for i, v in enumerate(values) if v < 0]
@@ -122,7 +129,8 @@ def validate_points(series_type: SeriesType, points: List[Dict[str, Any]]) -> Va
                  "code": "EFF_LT_0",
                  "message": "Efficiency values < 0% detected.",
                  "severity": "error",
-                 "indices": indices_lt_0
+                 "indices": indices_lt_0,
+                 "flows": [flows[i] for i in indices_lt_0]
              })
 
     elif series_type == SeriesType.head:
@@ -133,7 +141,8 @@ def validate_points(series_type: SeriesType, points: List[Dict[str, Any]]) -> Va
                  "code": "NEGATIVE_HEAD",
                  "message": "Negative head values detected.",
                  "severity": "warning",
-                 "indices": indices_lt_0
+                 "indices": indices_lt_0,
+                 "flows": [flows[i] for i in indices_lt_0]
              })
 
     elif series_type == SeriesType.power:
@@ -1,4 +1,7 @@
+import hashlib
 import os
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import SQLModel, create_engine, Session
 
 # Updated database name to force schema refresh for new features
@@ -9,8 +12,100 @@ sqlite_url = f"sqlite:///{sqlite_file_name}"
 connect_args = {"check_same_thread": False}
 engine = create_engine(sqlite_url, echo=False, connect_args=connect_args)
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+SCHEMA_VERSION_TABLE = "schema_version"
+
+def schema_fingerprint() -> str:
+    """
+    Hash of the tables, columns and indexes the models declare. Changes
+    whenever a model change could need create_all/add_missing_columns.
+    """
+    parts = []
+    for table in SQLModel.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{c.name}:{c.type!r}:{c.nullable}:{c.server_default is not None}" for c in table.columns)
+        parts.extend(sorted(f"{i.name}:{[c.name for c in i.columns]}:{i.unique}" for i in table.indexes))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+def schema_is_current(bind, fingerprint: str) -> bool:
+    with bind.connect() as conn:
+        if not inspect(conn).has_table(SCHEMA_VERSION_TABLE):
+            return False
+        stored = conn.execute(text(f"SELECT fingerprint FROM {SCHEMA_VERSION_TABLE} WHERE id = 1")).scalar()
+    return stored == fingerprint
+
+def create_db_and_tables(bind=None) -> bool:
+    """
+    Creates missing tables and columns, unless the stored schema fingerprint
+    shows the database already matches the models (one query on warm starts).
+    Returns True if the schema was (re)applied.
+    """
+    bind = bind if bind is not None else engine
+    fingerprint = schema_fingerprint()
+    if schema_is_current(bind, fingerprint):
+        return False
+
+    SQLModel.metadata.create_all(bind)
+    add_missing_columns(bind)
+    backfill_org_ids(bind)
+    add_missing_indexes(bind)
+    with bind.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (id INTEGER PRIMARY KEY, fingerprint TEXT NOT NULL)"))
+        conn.execute(text(f"DELETE FROM {SCHEMA_VERSION_TABLE}"))
+        conn.execute(text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (id, fingerprint) VALUES (1, :fingerprint)"), {"fingerprint": fingerprint})
+    return True
+
+def add_missing_columns(bind):
+    """
+    create_all only creates missing tables. Columns added to existing models
+    later (e.g. revision counters) are added here, using their server default
+    so existing rows get a sensible value.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(bind.dialect)}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+
+def add_missing_indexes(bind):
+    """
+    Like add_missing_columns, for indexes declared after a table was created.
+    Rows that violate a new unique index stop startup with a message naming
+    the index; they are never deleted here (see backend.dedupe).
+    """
+    inspector = inspect(bind)
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {i["name"] for i in inspector.get_indexes(table.name)} if inspector.has_table(table.name) else set()
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind, checkfirst=True)
+            except IntegrityError as e:
+                columns = ", ".join(c.name for c in index.columns)
+                raise RuntimeError(
+                    f"Cannot create unique index {index.name}: {table.name} has rows with the same ({columns}). "
+                    "Run `python -m backend.dedupe` to move the older duplicates into backup tables, then restart."
+                ) from e
+
+# Denormalized org_id columns, filled from the owning pump for rows written
+# before the column existed. Rows written since always set it.
+ORG_ID_BACKFILL = [
+    "UPDATE curveset SET org_id = (SELECT pump.org_id FROM pump WHERE pump.id = curveset.pump_id) WHERE org_id IS NULL",
+    "UPDATE curveseries SET org_id = (SELECT curveset.org_id FROM curveset WHERE curveset.id = curveseries.curve_set_id) WHERE org_id IS NULL",
+]
+
+def backfill_org_ids(bind):
+    with bind.begin() as conn:
+        for statement in ORG_ID_BACKFILL:
+            conn.execute(text(statement))
 
 def get_session():
     with Session(engine) as session:
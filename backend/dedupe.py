@@ -0,0 +1,55 @@
+"""
+Removes rows that block a unique index added in a later version. Startup
+never deletes data: when it stops with "Cannot create unique index ...",
+run `python -m backend.dedupe`, which moves the offending rows into
+_dedupe_backup_<table> tables, then restart.
+"""
+from typing import Dict
+
+from sqlalchemy import inspect, text
+
+BACKUP_PREFIX = "_dedupe_backup_"
+
+# Older versions replaced a series by delete-then-insert, so concurrent
+# requests could leave two series of one type in a curve set; the newest
+# (highest id) is the one that replaced the others and is kept.
+_OLDER_DUPLICATE_SERIES = (
+    "SELECT s.id FROM curveseries s WHERE EXISTS (SELECT 1 FROM curveseries t "
+    "WHERE t.curve_set_id = s.curve_set_id AND t.type = s.type AND t.id > s.id)"
+)
+
+# Unique index -> (table, condition) of the rows to remove, children first
+UNIQUE_INDEX_DUPLICATES = {
+    "ix_curveseries_curve_set_id_type": [
+        ("curvepoint", f"series_id IN ({_OLDER_DUPLICATE_SERIES})"),
+        ("curveseries", f"id IN ({_OLDER_DUPLICATE_SERIES})"),
+    ],
+}
+
+def remove_duplicates(bind) -> Dict[str, int]:
+    """
+    Moves the rows listed in UNIQUE_INDEX_DUPLICATES into backup tables, in
+    one transaction. Returns the number of rows moved per table.
+    """
+    inspector = inspect(bind)
+    moved: Dict[str, int] = {}
+    with bind.begin() as conn:
+        for steps in UNIQUE_INDEX_DUPLICATES.values():
+            if not all(inspector.has_table(table) for table, _ in steps):
+                continue
+            for table, condition in steps:
+                backup = BACKUP_PREFIX + table
+                conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{backup}" AS SELECT * FROM "{table}" WHERE 0'))
+                conn.execute(text(f'INSERT INTO "{backup}" SELECT * FROM "{table}" WHERE {condition}'))
+                moved[table] = moved.get(table, 0) + conn.execute(text(f'DELETE FROM "{table}" WHERE {condition}')).rowcount
+    return moved
+
+if __name__ == "__main__":
+    # Registers the tables
+    from backend import models # noqa: F401
+    from backend.database import engine, create_db_and_tables
+
+    for table, count in remove_duplicates(engine).items():
+        print(f"Moved {count} rows from {table} to {BACKUP_PREFIX}{table}.")
+    create_db_and_tables()
+    print("Schema is up to date.")
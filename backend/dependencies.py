@@ -1,15 +1,65 @@
-from typing import Annotated, Optional
-from fastapi import Depends, HTTPException, status, Header
+import os
+import time
+from typing import Annotated, Any, Dict, NamedTuple, Optional, Tuple
+from fastapi import Depends, HTTPException, status, Header, Query, WebSocket, WebSocketException
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session as _ORMSession
 from sqlmodel import Session, select
 from backend.database import get_session
-from backend.models import User, Organization, Membership, UserRole
+from backend.models import User, Membership, UserRole, Pump, CurveSet, CurveSeries
 from backend.auth_utils import SECRET_KEY, ALGORITHM
+from backend.curves.units import parse_units
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: Session = Depends(get_session)) -> User:
+class ActiveOrg(NamedTuple):
+    """
+    The org a request acts in. Only the id: with role claims it is resolved
+    without loading the Organization row (session.get it when needed).
+    """
+    id: int
+
+# Tokens with role claims (see auth_utils.create_user_token) authorize without
+# a membership query; they are only checked against the user's token_version,
+# cached here for a few seconds. revoke_tokens bumps the version.
+TOKEN_VERSION_CACHE_SECONDS = float(os.getenv("TOKEN_VERSION_CACHE_SECONDS", "5"))
+
+_token_versions: Dict[int, Tuple[Optional[int], float]] = {} # user id -> (version, fetched at)
+_REVOKED_KEY = "revoked_token_users"
+
+def current_token_version(session: Session, user_id: int) -> Optional[int]:
+    """
+    The user's token_version, or None for missing and inactive users.
+    """
+    cached = _token_versions.get(user_id)
+    now = time.monotonic()
+    if cached is not None and now - cached[1] < TOKEN_VERSION_CACHE_SECONDS:
+        return cached[0]
+    row = session.exec(select(User.token_version, User.is_active).where(User.id == user_id)).first()
+    version = row[0] if row and row[1] else None
+    _token_versions[user_id] = (version, now)
+    return version
+
+def revoke_tokens(session: Session, user_id: int) -> None:
+    """
+    Invalidates the user's claims tokens issued so far, e.g. after a
+    membership change. Takes effect on commit; does not commit.
+    """
+    session.execute(update(User).where(User.id == user_id).values(token_version=User.token_version + 1))
+    session.info.setdefault(_REVOKED_KEY, set()).add(user_id)
+
+@event.listens_for(_ORMSession, "after_commit")
+def _forget_revoked(session) -> None:
+    for user_id in session.info.pop(_REVOKED_KEY, ()):
+        _token_versions.pop(user_id, None)
+
+@event.listens_for(_ORMSession, "after_rollback")
+def _keep_revoked(session) -> None:
+    session.info.pop(_REVOKED_KEY, None)
+
+def claims_from_token(token: str, session: Session) -> Dict[str, Any]:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -23,16 +73,56 @@ def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: Ses
     except JWTError:
         raise credentials_exception
 
-    user = session.exec(select(User).where(User.email == email)).first()
+    if "orgs" in payload and current_token_version(session, payload.get("uid")) != payload.get("ver"):
+        raise credentials_exception # Revoked, or the user was deactivated
+    return payload
+
+def get_token_claims(token: Annotated[str, Depends(oauth2_scheme)], session: Session = Depends(get_session)) -> Dict[str, Any]:
+    return claims_from_token(token, session)
+
+def get_current_user(claims: Annotated[Dict[str, Any], Depends(get_token_claims)], session: Session = Depends(get_session)) -> User:
+    return user_for_claims(claims, session)
+
+def user_for_claims(claims: Dict[str, Any], session: Session) -> User:
+    user = session.exec(select(User).where(User.email == claims["sub"])).first()
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 def get_active_org(
-    current_user: Annotated[User, Depends(get_current_user)],
+    claims: Annotated[Dict[str, Any], Depends(get_token_claims)],
     session: Session = Depends(get_session),
     x_org_id: Optional[str] = Header(None)
-) -> Organization:
+) -> ActiveOrg:
+    return org_for_claims(claims, session, x_org_id)
+
+def org_for_claims(claims: Dict[str, Any], session: Session, x_org_id: Optional[str]) -> ActiveOrg:
+    """
+    The active org: the X-Org-ID one (which the user must belong to), else
+    the first membership. Tokens with role claims are resolved from the
+    claims alone.
+    """
+    if "orgs" not in claims:
+        return org_for_user(user_for_claims(claims, session), session, x_org_id)
+
+    org_ids = [org_id for org_id, _ in claims["orgs"]]
+    if not org_ids:
+        raise HTTPException(status_code=403, detail="User is not a member of any organization")
+    if not x_org_id:
+        return ActiveOrg(org_ids[0])
+    try:
+        target_org_id = int(x_org_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid X-Org-ID header")
+    if target_org_id not in org_ids:
+        raise HTTPException(status_code=403, detail="User is not a member of the requested organization")
+    return ActiveOrg(target_org_id)
+
+def org_for_user(current_user: User, session: Session, x_org_id: Optional[str]) -> ActiveOrg:
     # MVP: If user has 1 org, return it. If multiple, check header. If header missing, return first.
     # Logic:
     # 1. Get all memberships for user.
@@ -49,22 +139,44 @@ def get_active_org(
             target_org_id = int(x_org_id)
             for m in memberships:
                 if m.org_id == target_org_id:
-                    return m.organization
+                    return ActiveOrg(m.org_id)
             raise HTTPException(status_code=403, detail="User is not a member of the requested organization")
         except ValueError:
              raise HTTPException(status_code=400, detail="Invalid X-Org-ID header")
 
     # Default to first org if no header
-    return memberships[0].organization
+    return ActiveOrg(memberships[0].org_id)
+
+def get_websocket_org(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    org_id: Optional[str] = Query(None),
+    session: Session = Depends(get_session)
+) -> ActiveOrg:
+    """
+    get_active_org for WebSocket routes. Browsers cannot set headers on the
+    handshake, so the token and org may also come from ?token= and ?org_id=.
+    Failures close the handshake with 1008 instead of an HTTP status.
+    """
+    authorization = websocket.headers.get("authorization", "")
+    if token is None and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    try:
+        claims = claims_from_token(token or "", session)
+        return org_for_claims(claims, session, org_id or websocket.headers.get("x-org-id"))
+    except HTTPException as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
 
 def get_current_role(
-    current_user: Annotated[User, Depends(get_current_user)],
-    active_org: Annotated[Organization, Depends(get_active_org)],
+    claims: Annotated[Dict[str, Any], Depends(get_token_claims)],
+    active_org: Annotated[ActiveOrg, Depends(get_active_org)],
     session: Session = Depends(get_session)
 ) -> UserRole:
+    if "orgs" in claims:
+        return UserRole(dict(claims["orgs"])[active_org.id]) # get_active_org checked membership
     membership = session.exec(
         select(Membership)
-        .where(Membership.user_id == current_user.id)
+        .where(Membership.user_id == user_for_claims(claims, session).id)
         .where(Membership.org_id == active_org.id)
     ).first()
     if not membership:
@@ -79,3 +191,41 @@ class RequireRole:
         if role not in self.allowed_roles:
             raise HTTPException(status_code=403, detail="Insufficient permissions")
         return role
+
+def get_target_units(
+    units: Optional[str] = Query(None, description="Convert to SI, US, or custom units such as flow:l/s,head:m")
+) -> Optional[Dict[str, str]]:
+    if units is None:
+        return None
+    try:
+        return parse_units(units)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def owned_pump(session: Session, pump_id: int, org_id: int) -> Pump:
+    """
+    The pump, if it belongs to the org and is not deleted. 404 otherwise.
+    """
+    pump = session.get(Pump, pump_id)
+    if not pump or pump.org_id != org_id or pump.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Pump not found")
+    return pump
+
+def owned_curve_set(session: Session, curve_set_id: int, org_id: int) -> CurveSet:
+    """
+    The curve set, if it belongs to the org (checked on its denormalized
+    org_id, without loading the pump) and is not deleted. 404 otherwise.
+    """
+    curve_set = session.get(CurveSet, curve_set_id)
+    if not curve_set or curve_set.org_id != org_id or curve_set.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Curve Set not found")
+    return curve_set
+
+def owned_series(session: Session, series_id: int, org_id: int) -> CurveSeries:
+    """
+    The series, if it belongs to the org. 404 otherwise.
+    """
+    series = session.get(CurveSeries, series_id)
+    if not series or series.org_id != org_id or series.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return series
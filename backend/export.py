@@ -0,0 +1,308 @@
+"""
+Columnar export of an org's curve library as Parquet or Arrow IPC.
+
+Rows are read from the database in keyset-paginated chunks and converted to
+Arrow record batches one chunk at a time, so memory stays bounded regardless
+of library size.
+
+CLI (writes a partitioned dataset directory):
+
+    python -m backend.export --org-id 1 --out ./curve_library --format parquet
+
+    out/pumps/part-0.parquet
+    out/curve_sets/part-0.parquet
+    out/series/part-0.parquet
+    out/points/type=head/part-0.parquet   (hive-partitioned by series type)
+    ...
+
+Load with ``pyarrow.dataset.dataset(out / "points", partitioning="hive")``
+or ``pandas.read_parquet``.
+"""
+import argparse
+import io
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import orjson
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from backend.models import Pump, CurveSet, CurveSeries, CurvePoint
+
+EXPORT_TABLES = ("pumps", "curve_sets", "series", "points")
+EXPORT_FORMATS = ("parquet", "arrow")
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "50000"))
+
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+def _pyarrow():
+    # pyarrow is an optional dependency; only exports need it
+    try:
+        import pyarrow as pa
+        import pyarrow.compute # noqa: F401
+        import pyarrow.ipc # noqa: F401
+        import pyarrow.parquet # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("Exports require pyarrow. Install it with `pip install pyarrow`.") from e
+    return pa
+
+def table_schema(table: str):
+    pa = _pyarrow()
+    series_type = pa.dictionary(pa.int8(), pa.string())
+    schemas = {
+        "pumps": [
+            ("id", pa.int64()),
+            ("manufacturer", pa.string()),
+            ("model", pa.string()),
+            ("meta_data", pa.string()), # JSON text
+            ("created_at", pa.timestamp("us")),
+            ("updated_at", pa.timestamp("us")),
+        ],
+        "curve_sets": [
+            ("id", pa.int64()),
+            ("pump_id", pa.int64()),
+            ("name", pa.string()),
+            ("units", pa.string()), # JSON text
+            ("meta_data", pa.string()), # JSON text
+            ("created_at", pa.timestamp("us")),
+            ("updated_at", pa.timestamp("us")),
+        ],
+        "series": [
+            ("id", pa.int64()),
+            ("curve_set_id", pa.int64()),
+            ("pump_id", pa.int64()),
+            ("type", series_type),
+            ("fit_model_type", pa.string()),
+            ("coeffs", pa.list_(pa.float64())),
+            ("rmse", pa.float64()),
+            ("r2", pa.float64()),
+            ("min_q", pa.float64()),
+            ("max_q", pa.float64()),
+            ("is_derived", pa.bool_()),
+        ],
+        "points": [
+            ("id", pa.int64()),
+            ("series_id", pa.int64()),
+            ("curve_set_id", pa.int64()),
+            ("pump_id", pa.int64()),
+            ("type", series_type),
+            ("sequence", pa.int32()),
+            ("flow", pa.float64()),
+            ("value", pa.float64()),
+        ],
+    }
+    if table not in schemas:
+        raise ValueError(f"Unknown export table: {table}")
+    return pa.schema(schemas[table])
+
+def _json_text(value) -> Optional[str]:
+    return orjson.dumps(value).decode() if value is not None else None
+
+def _query(table: str, org_id: int, after_id: int, limit: int):
+    if table == "pumps":
+        stmt = (
+            select(Pump.id, Pump.manufacturer, Pump.model, Pump.meta_data, Pump.created_at, Pump.updated_at)
+            .where(Pump.org_id == org_id, Pump.deleted_at.is_(None), Pump.id > after_id)
+            .order_by(Pump.id)
+        )
+    elif table == "curve_sets":
+        stmt = (
+            select(CurveSet.id, CurveSet.pump_id, CurveSet.name, CurveSet.units, CurveSet.meta_data, CurveSet.created_at, CurveSet.updated_at)
+            .where(CurveSet.org_id == org_id, CurveSet.deleted_at.is_(None), CurveSet.id > after_id)
+            .order_by(CurveSet.id)
+        )
+    elif table == "series":
+        stmt = (
+            select(CurveSeries.id, CurveSeries.curve_set_id, CurveSet.pump_id, CurveSeries.type,
+                   CurveSeries.fit_model_type, CurveSeries.fit_params, CurveSeries.fit_quality, CurveSeries.data_range,
+                   CurveSeries.is_derived)
+            .join(CurveSet, CurveSet.id == CurveSeries.curve_set_id)
+            .where(CurveSeries.org_id == org_id, CurveSeries.deleted_at.is_(None), CurveSeries.id > after_id)
+            .order_by(CurveSeries.id)
+        )
+    elif table == "points":
+        stmt = (
+            select(CurvePoint.id, CurvePoint.series_id, CurveSeries.curve_set_id, CurveSet.pump_id, CurveSeries.type,
+                   CurvePoint.sequence, CurvePoint.flow, CurvePoint.value)
+            .join(CurveSeries, CurveSeries.id == CurvePoint.series_id)
+            .join(CurveSet, CurveSet.id == CurveSeries.curve_set_id)
+            .where(CurveSeries.org_id == org_id, CurveSeries.deleted_at.is_(None), CurvePoint.id > after_id)
+            .order_by(CurvePoint.id)
+        )
+    else:
+        raise ValueError(f"Unknown export table: {table}")
+    return stmt.limit(limit)
+
+def _to_columns(table: str, rows: List[tuple]) -> Dict[str, list]:
+    cols = list(zip(*rows))
+    if table == "pumps":
+        ids, manufacturers, models, meta, created, updated = cols
+        return {
+            "id": ids, "manufacturer": manufacturers, "model": models,
+            "meta_data": [_json_text(m) for m in meta], "created_at": created, "updated_at": updated,
+        }
+    if table == "curve_sets":
+        ids, pump_ids, names, units, meta, created, updated = cols
+        return {
+            "id": ids, "pump_id": pump_ids, "name": names,
+            "units": [_json_text(u) for u in units], "meta_data": [_json_text(m) for m in meta],
+            "created_at": created, "updated_at": updated,
+        }
+    if table == "series":
+        ids, set_ids, pump_ids, types, models, params, quality, ranges, derived = cols
+        params = [p or {} for p in params]
+        quality = [q or {} for q in quality]
+        ranges = [r or {} for r in ranges]
+        return {
+            "id": ids, "curve_set_id": set_ids, "pump_id": pump_ids,
+            "type": [t.value for t in types], "fit_model_type": models,
+            "coeffs": [p.get("coeffs") for p in params],
+            "rmse": [q.get("rmse") for q in quality], "r2": [q.get("r2") for q in quality],
+            "min_q": [r.get("min_q") for r in ranges], "max_q": [r.get("max_q") for r in ranges],
+            "is_derived": [bool(d) for d in derived],
+        }
+    ids, series_ids, set_ids, pump_ids, types, sequences, flows, values = cols
+    return {
+        "id": ids, "series_id": series_ids, "curve_set_id": set_ids, "pump_id": pump_ids,
+        "type": [t.value for t in types], "sequence": sequences, "flow": flows, "value": values,
+    }
+
+def iter_record_batches(bind: Engine, org_id: int, table: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Yields Arrow record batches of at most chunk_size rows. Each chunk uses a
+    fresh keyset query (id > last id) so the DB never materializes the
+    full result.
+    """
+    pa = _pyarrow()
+    schema = table_schema(table)
+    after_id = 0
+    while True:
+        with Session(bind) as session:
+            rows = session.exec(_query(table, org_id, after_id, chunk_size)).all()
+        if not rows:
+            return
+        columns = _to_columns(table, rows)
+        yield pa.RecordBatch.from_arrays([pa.array(columns[f.name], type=f.type) for f in schema], schema=schema)
+        after_id = rows[-1][0]
+        if len(rows) < chunk_size:
+            return
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file object that buffers what Arrow writes until drained,
+    letting Parquet/IPC writers feed an HTTP stream.
+    """
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _open_writer(fmt: str, sink, schema):
+    pa = _pyarrow()
+    if fmt == "parquet":
+        return pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+    if fmt == "arrow":
+        return pa.ipc.new_stream(sink, schema)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+def stream_table(bind: Engine, org_id: int, table: str, fmt: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Serializes one table as a Parquet file or Arrow IPC stream, yielding
+    bytes after every record batch.
+    """
+    schema = table_schema(table)
+    sink = _ChunkSink()
+    writer = _open_writer(fmt, sink, schema)
+    for batch in iter_record_batches(bind, org_id, table, chunk_size):
+        if fmt == "parquet":
+            writer.write_batch(batch, row_group_size=chunk_size)
+        else:
+            writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+def write_dataset(bind: Engine, org_id: int, out_dir: Path, fmt: str = "parquet",
+                  chunk_size: int = EXPORT_CHUNK_SIZE, progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+    """
+    Writes all tables under out_dir, points partitioned by series type.
+    Returns row counts per table.
+    """
+    pa = _pyarrow()
+    extension = "parquet" if fmt == "parquet" else "arrow"
+    counts = {}
+    for table in EXPORT_TABLES:
+        schema = table_schema(table)
+        partitioned = table == "points"
+        file_schema = schema.remove(schema.get_field_index("type")) if partitioned else schema
+        writers = {}
+        counts[table] = 0
+        for batch in iter_record_batches(bind, org_id, table, chunk_size):
+            counts[table] += batch.num_rows
+            if partitioned:
+                types = batch.column("type").cast(pa.string())
+                parts = {}
+                for series_type in set(types.to_pylist()):
+                    mask = pa.compute.equal(types, series_type)
+                    parts[series_type] = batch.filter(mask).drop_columns(["type"])
+            else:
+                parts = {None: batch}
+
+            for key, part in parts.items():
+                if key not in writers:
+                    directory = out_dir / table / (f"type={key}" if key is not None else "")
+                    directory.mkdir(parents=True, exist_ok=True)
+                    path = directory / f"part-0.{extension}"
+                    if fmt == "parquet":
+                        writers[key] = pa.parquet.ParquetWriter(path, file_schema, compression="zstd")
+                    else:
+                        writers[key] = pa.ipc.new_file(str(path), file_schema)
+                writers[key].write_batch(part)
+            if progress:
+                progress(table, counts[table])
+        for writer in writers.values():
+            writer.close()
+    return counts
+
+def main():
+    from backend.database import engine
+
+    parser = argparse.ArgumentParser(description="Export an org's curve library as a partitioned Parquet/Arrow dataset.")
+    parser.add_argument("--org-id", type=int, required=True)
+    parser.add_argument("--out", type=Path, required=True, help="Output directory")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="parquet")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    def report(table, rows):
+        print(f"\r{table}: {rows} rows", end="", flush=True)
+
+    counts = write_dataset(engine, args.org_id, args.out, args.format, args.chunk_size, progress=report)
+    print()
+    for table, rows in counts.items():
+        print(f"{table}: {rows} rows")
+
+if __name__ == "__main__":
+    main()
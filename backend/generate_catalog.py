@@ -0,0 +1,250 @@
+"""
+Deterministic large-catalog generator for local load testing and benchmarks.
+
+    python -m backend.generate_catalog --orgs 2 --pumps-per-org 1000 --points-per-series 150
+
+Creates orgs, users (password "password"), pumps with realistic meta_data,
+curve sets for several impeller trims (affinity laws), and head/efficiency/
+power series with noisy points and fitted curves. The same --seed always
+produces the same data. Rows are written with bulk executemany inserts and
+explicit ids, so a million points take seconds rather than minutes.
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Engine
+
+from backend.models import (
+    Organization, User, Membership, Pump, CurveSet, CurveSetCharacteristics, CurveSeries, CurvePoint, SeriesType, UserRole
+)
+from backend.curves.fitting import fit_curves
+from backend.curves.characteristics import compute_characteristics
+
+GENERATED_PASSWORD = "password"
+
+US_UNITS = {"flow": "gpm", "head": "ft", "efficiency": "%", "power": "hp"}
+SI_UNITS = {"flow": "m3/h", "head": "m", "efficiency": "%", "power": "kW"}
+# US -> SI factors for generated values
+SI_FACTORS = {"flow": 0.227124707, "head": 0.3048, "efficiency": 1.0, "power": 0.745699872}
+
+MANUFACTURERS = ["Acme Pumps", "Hydrodyne", "Centriflow", "Aquaforce", "Northbay", "Kessler"]
+PUMP_TYPES = ["end-suction", "split-case", "vertical inline", "multistage"]
+RPMS = [1150, 1750, 3500]
+
+@dataclass
+class CatalogConfig:
+    orgs: int = 1
+    users_per_org: int = 3
+    pumps_per_org: int = 100
+    curve_sets_per_pump: int = 2
+    points_per_series: int = 50
+    noise: float = 0.01 # Relative to each series' scale
+    si_fraction: float = 0.5 # Share of curve sets recorded in SI units
+    fit: bool = True
+    seed: int = 0
+    batch_points: int = 200_000 # Rows buffered before a flush to the DB
+
+def _next_ids(conn, models) -> Dict[Any, int]:
+    return {m: (conn.execute(select(func.max(m.id))).scalar() or 0) + 1 for m in models}
+
+def _series_shapes(rng: np.random.Generator, n: int, trim: float, pump: Dict[str, float], noise: float):
+    """
+    Head/efficiency/power for one impeller trim, in US units. Trim scales the
+    full-diameter curves by the affinity laws (Q ~ D, H ~ D^2, P ~ D^3).
+    """
+    q_bep = pump["q_bep"] * trim
+    q_max = q_bep * pump["runout"]
+    flows = np.sort(np.linspace(0.0, q_max, n) + rng.uniform(-0.3, 0.3, n) * (q_max / max(n - 1, 1)))
+    flows = np.unique(np.clip(flows, 0.0, None))
+    r = flows / q_bep
+
+    h0 = pump["h0"] * trim ** 2
+    head = h0 * (1 + pump["k1"] * r - (1 + pump["k1"] - pump["h_bep"]) * r ** 2)
+    efficiency = np.clip(pump["eta_max"] * (2 * r - r ** 2), 0.0, None)
+    p_bep = q_bep * h0 * pump["h_bep"] / (3960 * pump["eta_max"] / 100)
+    power = p_bep * (pump["p0"] + (1 - pump["p0"]) * r) * (1 - 0.04 * (r - 1) ** 2)
+
+    shapes = {SeriesType.head: head, SeriesType.efficiency: efficiency, SeriesType.power: power}
+    for series_type, values in shapes.items():
+        scale = float(np.max(np.abs(values))) or 1.0
+        shapes[series_type] = values + rng.normal(0.0, noise * scale, len(values))
+    shapes[SeriesType.efficiency] = np.clip(shapes[SeriesType.efficiency], 0.0, None)
+    return flows, shapes
+
+def generate(engine: Engine, config: CatalogConfig, progress: Optional[callable] = None) -> Dict[str, Any]:
+    """
+    Writes a generated catalog and returns a summary with row counts and
+    the ids/emails created (useful to benchmarks).
+    """
+    from backend.auth_utils import get_password_hash
+
+    rng = np.random.default_rng(config.seed)
+    password_hash = get_password_hash(GENERATED_PASSWORD) # bcrypt is slow; hash once
+    base_time = datetime(2024, 1, 1)
+    counts = {"orgs": 0, "users": 0, "pumps": 0, "curve_sets": 0, "series": 0, "points": 0}
+    summary = {"org_ids": [], "user_emails": [], "counts": counts}
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        ids = _next_ids(conn, [Organization, User, Membership, Pump, CurveSet, CurveSeries, CurvePoint])
+
+        tables = (Pump, CurveSet, CurveSetCharacteristics, CurveSeries)
+        rows = {m: [] for m in tables}
+        point_rows = []
+        # Series rows and characteristics waiting for the batched fit in flush()
+        pending_fits, pending_sets = [], []
+
+        def fit_pending():
+            fits = fit_curves([(row["type"], flows, values) for row, flows, values in pending_fits])
+            for (row, _, _), (model, params, quality, data_range, stats) in zip(pending_fits, fits):
+                row.update(fit_model_type=model, fit_params=params, fit_quality=quality, data_range=data_range, fit_stats=stats)
+            for characteristics_row, set_fits, units, rpm in pending_sets:
+                characteristics_row.update(compute_characteristics(set_fits, units, rpm))
+            pending_fits.clear()
+            pending_sets.clear()
+
+        def flush():
+            fit_pending()
+            for model in tables:
+                if rows[model]:
+                    conn.execute(insert(model), rows[model])
+                    rows[model].clear()
+            if point_rows:
+                conn.exec_driver_sql(
+                    "INSERT INTO curvepoint (id, series_id, flow, value, sequence) VALUES (?, ?, ?, ?, ?)",
+                    point_rows
+                )
+                point_rows.clear()
+            if progress:
+                progress(counts)
+
+        for o in range(config.orgs):
+            org_id = ids[Organization]
+            ids[Organization] += 1
+            conn.execute(insert(Organization), [{"id": org_id, "name": f"Generated Org {o + 1}", "created_at": base_time}])
+            summary["org_ids"].append(org_id)
+            counts["orgs"] += 1
+
+            for u in range(config.users_per_org):
+                user_id = ids[User]
+                ids[User] += 1
+                email = f"user{u + 1}@org{org_id}.example.com"
+                conn.execute(insert(User), [{"id": user_id, "email": email, "hashed_password": password_hash,
+                                             "is_active": True, "created_at": base_time}])
+                role = UserRole.admin if u == 0 else (UserRole.editor if u % 2 else UserRole.viewer)
+                conn.execute(insert(Membership), [{"id": ids[Membership], "user_id": user_id, "org_id": org_id,
+                                                   "role": role, "created_at": base_time}])
+                ids[Membership] += 1
+                summary["user_emails"].append(email)
+                counts["users"] += 1
+
+            for p in range(config.pumps_per_org):
+                pump_id = ids[Pump]
+                ids[Pump] += 1
+                created = base_time + timedelta(minutes=int(rng.integers(0, 60 * 24 * 365)))
+                rpm = int(rng.choice(RPMS))
+                diameter = float(np.round(rng.uniform(6.0, 16.0), 2))
+                pump = {
+                    "q_bep": float(np.exp(rng.uniform(np.log(50), np.log(3000)))),
+                    "h0": float(rng.uniform(30, 400)),
+                    "h_bep": float(rng.uniform(0.78, 0.9)),
+                    "k1": float(rng.uniform(0.0, 0.12)),
+                    "runout": float(rng.uniform(1.3, 1.55)),
+                    "eta_max": float(rng.uniform(55, 88)),
+                    "p0": float(rng.uniform(0.35, 0.55)),
+                }
+                rows[Pump].append({
+                    "id": pump_id, "org_id": org_id,
+                    "manufacturer": str(rng.choice(MANUFACTURERS)),
+                    "model": f"{chr(65 + p % 26)}{rpm // 100}-{p + 1:05d}",
+                    "meta_data": {"rpm": rpm, "impeller": f"{diameter} in", "type": str(rng.choice(PUMP_TYPES)),
+                                  "stages": int(rng.integers(1, 4)), "design_flow_gpm": round(pump["q_bep"], 1)},
+                    "created_at": created, "updated_at": created,
+                })
+                counts["pumps"] += 1
+
+                for c in range(config.curve_sets_per_pump):
+                    set_id = ids[CurveSet]
+                    ids[CurveSet] += 1
+                    trim = 1.0 - 0.08 * c
+                    si = bool(rng.random() < config.si_fraction)
+                    units = SI_UNITS if si else US_UNITS
+                    rows[CurveSet].append({
+                        "id": set_id, "pump_id": pump_id, "org_id": org_id,
+                        "name": f"{rpm} RPM, {diameter * trim:.2f} in impeller",
+                        "units": units,
+                        "meta_data": {"rpm": rpm, "impeller_diameter": round(diameter * trim, 2),
+                                      "test_date": (created + timedelta(days=c)).date().isoformat()},
+                        "created_at": created, "updated_at": created,
+                    })
+                    counts["curve_sets"] += 1
+
+                    n = max(5, int(rng.integers(config.points_per_series // 2, config.points_per_series * 3 // 2 + 1)))
+                    flows, shapes = _series_shapes(rng, n, trim, pump, config.noise)
+                    if si:
+                        flows = flows * SI_FACTORS["flow"]
+                        shapes = {t: v * SI_FACTORS[t.value] for t, v in shapes.items()}
+
+                    flow_list = flows.tolist()
+                    fits = {}
+                    for series_type, values in shapes.items():
+                        series_id = ids[CurveSeries]
+                        ids[CurveSeries] += 1
+                        series_row = {"id": series_id, "curve_set_id": set_id, "org_id": org_id, "type": series_type, "validation_warnings": []}
+                        if config.fit:
+                            pending_fits.append((series_row, flow_list, values.tolist()))
+                            fits[series_type] = series_row
+                        rows[CurveSeries].append(series_row)
+                        counts["series"] += 1
+
+                        first = ids[CurvePoint]
+                        ids[CurvePoint] += len(flow_list)
+                        point_rows.extend(zip(range(first, first + len(flow_list)), [series_id] * len(flow_list),
+                                              flow_list, values.tolist(), range(len(flow_list))))
+                        counts["points"] += len(flow_list)
+
+                    characteristics_row = {"curve_set_id": set_id, "pump_id": pump_id, "computed_at": created}
+                    rows[CurveSetCharacteristics].append(characteristics_row)
+                    pending_sets.append((characteristics_row, fits, units, rpm))
+
+                if len(point_rows) >= config.batch_points:
+                    flush()
+        flush()
+
+    return summary
+
+def main():
+    from backend.database import engine, create_db_and_tables
+
+    defaults = CatalogConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orgs", type=int, default=defaults.orgs)
+    parser.add_argument("--users-per-org", type=int, default=defaults.users_per_org)
+    parser.add_argument("--pumps-per-org", type=int, default=defaults.pumps_per_org)
+    parser.add_argument("--curve-sets-per-pump", type=int, default=defaults.curve_sets_per_pump)
+    parser.add_argument("--points-per-series", type=int, default=defaults.points_per_series, help="Mean; actual counts vary +/-50%%")
+    parser.add_argument("--noise", type=float, default=defaults.noise)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--no-fit", action="store_true", help="Skip curve fitting (faster, series have no fit)")
+    args = parser.parse_args()
+
+    config = CatalogConfig(
+        orgs=args.orgs, users_per_org=args.users_per_org, pumps_per_org=args.pumps_per_org,
+        curve_sets_per_pump=args.curve_sets_per_pump, points_per_series=args.points_per_series,
+        noise=args.noise, seed=args.seed, fit=not args.no_fit,
+    )
+    create_db_and_tables()
+    start = time.perf_counter()
+    summary = generate(engine, config, progress=lambda c: print(f"\r{c['pumps']} pumps, {c['points']} points", end="", flush=True))
+    print()
+    print(f"Generated {summary['counts']} in {time.perf_counter() - start:.1f}s")
+    print(f"Log in as {summary['user_emails'][0]} / {GENERATED_PASSWORD}" if summary["user_emails"] else "")
+
+if __name__ == "__main__":
+    main()
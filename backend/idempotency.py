@@ -0,0 +1,44 @@
+"""
+Idempotency keys for create endpoints. A client that retries a create with
+the same Idempotency-Key header gets the stored response of the first
+attempt instead of a duplicate. The key row is inserted in the same
+transaction as the created objects, so a key exists exactly when its create
+committed; two concurrent attempts collide on the primary key.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from backend.models import IdempotencyKey
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+
+def request_hash(body: Any) -> str:
+    return hashlib.sha256(orjson.dumps(body, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+def lookup(session: Session, org_id: int, key: str, body_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Stored response for the key, or None if it is unused or expired.
+    Reusing a key with a different body is a client error (422).
+    """
+    record = session.get(IdempotencyKey, (org_id, key))
+    if record is None:
+        return None
+    if record.created_at < datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS):
+        session.delete(record) # Expired; freed for reuse with this request
+        session.flush()
+        return None
+    if record.request_hash != body_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+    return record.response
+
+def record(session: Session, org_id: int, key: str, body_hash: str, response: Dict[str, Any]) -> None:
+    """
+    Adds the key to the current transaction. Does not commit.
+    """
+    session.add(IdempotencyKey(org_id=org_id, key=key, request_hash=body_hash, response=response))
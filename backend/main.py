@@ -1,10 +1,15 @@
-from fastapi import FastAPI
+import hmac
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from backend.database import create_db_and_tables, get_session
-from backend.routers import pumps, curves, auth, orgs
+from backend.routers import pumps, curves, auth, orgs, export, sweep, maintenance as maintenance_router
 from backend.models import User, Organization, Membership, UserRole
 from backend.auth_utils import get_password_hash
+from backend.compression import CompressionMiddleware
+from backend import catalog_import, maintenance, metrics, tracing, tracing_middleware
 from sqlmodel import Session, select
 
 @asynccontextmanager
@@ -43,7 +48,11 @@ async def lifespan(app: FastAPI):
                 session.add(membership)
                 session.commit()
 
+    scheduler = maintenance.start(engine)
     yield
+    if scheduler is not None:
+        scheduler.cancel()
+    catalog_import.shutdown_pool()
 
 app = FastAPI(
     title="Pump Performance Storage",
@@ -59,11 +68,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for large curve payloads (streamed responses pass through)
+app.add_middleware(CompressionMiddleware)
+
+# Opt-in stage timings (off by default), see backend/tracing_middleware.py
+app.add_middleware(tracing_middleware.TracingMiddleware)
+
+# Outermost, so latency includes compression and CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(auth.router)
 app.include_router(pumps.router)
 app.include_router(curves.router)
+app.include_router(sweep.router)
 app.include_router(orgs.router)
+app.include_router(export.router)
+app.include_router(maintenance_router.router)
 
 @app.get("/")
 def root():
     return {"message": "Pump Performance API is running"}
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics(authorization: Optional[str] = Header(None)):
+    # async: threadpool statistics must be read on the event loop
+    if not metrics.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Metrics are disabled; set METRICS_TOKEN to enable them")
+    if not hmac.compare_digest(authorization or "", f"Bearer {metrics.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(
+        metrics.registry.render(metrics.threadpool_stats()) + tracing.stats.render() + maintenance.stats.render(),
+        media_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,291 @@
+"""
+In-process maintenance scheduler.
+
+Started from the app lifespan. Every tick (MAINTENANCE_TICK_SECONDS, with
+jitter) each worker tries to claim the jobs that are due. A claim is one
+conditional UPDATE of the job's MaintenanceJob row, so with several workers
+exactly one of them runs a job; the lease expires on its own if that worker
+dies mid-run. Jobs get a time budget and stop between batches when it runs
+out; the rest is picked up by the next run.
+
+Per job, MAINTENANCE_<NAME>_INTERVAL and MAINTENANCE_<NAME>_BUDGET (seconds)
+override the defaults below; an interval of 0 disables the job.
+
+    python -m backend.maintenance             # last run of every job
+    python -m backend.maintenance --run purge_deleted
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from backend.models import CurveSeries, IdempotencyKey, Invite, MaintenanceJob
+from backend import curve_store
+from backend.idempotency import IDEMPOTENCY_TTL_HOURS
+from backend.purge import purge_deleted
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "1") != "0"
+MAINTENANCE_TICK_SECONDS = float(os.getenv("MAINTENANCE_TICK_SECONDS", "60"))
+# Fraction of the tick and of each interval that is randomized, so workers
+# started together do not all poll (or run a job) at the same moment
+MAINTENANCE_JITTER = float(os.getenv("MAINTENANCE_JITTER", "0.2"))
+MAINTENANCE_WARM_ORGS = int(os.getenv("MAINTENANCE_WARM_ORGS", "5"))
+# VACUUM rewrites the whole file, so only when this share of pages is free
+MAINTENANCE_VACUUM_MIN_FREE = float(os.getenv("MAINTENANCE_VACUUM_MIN_FREE", "0.2"))
+
+@dataclass
+class Job:
+    name: str
+    run: Callable[[Engine, float], Dict[str, Any]] # (bind, monotonic deadline) -> result
+    interval: float # Seconds between runs; 0 disables
+    budget: float # Seconds
+
+def _job(name: str, run, interval: float, budget: float) -> Job:
+    prefix = f"MAINTENANCE_{name.upper()}"
+    return Job(name, run, float(os.getenv(f"{prefix}_INTERVAL", str(interval))), float(os.getenv(f"{prefix}_BUDGET", str(budget))))
+
+# Jobs
+
+def expire_invites(bind: Engine, deadline: float) -> Dict[str, Any]:
+    with Session(bind) as session:
+        result = session.execute(delete(Invite).where(Invite.expires_at < datetime.utcnow()))
+        session.commit()
+    return {"deleted": result.rowcount}
+
+def expire_idempotency_keys(bind: Engine, deadline: float) -> Dict[str, Any]:
+    cutoff = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    with Session(bind) as session:
+        result = session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+        session.commit()
+    return {"deleted": result.rowcount}
+
+def purge_tombstones(bind: Engine, deadline: float) -> Dict[str, Any]:
+    # Normally done right after each delete; this catches interrupted purges
+    return {"removed": purge_deleted(bind, deadline=deadline)}
+
+def sqlite_optimize(bind: Engine, deadline: float) -> Dict[str, Any]:
+    """
+    Refreshes planner statistics (ANALYZE, sampled so it stays cheap on large
+    tables). If the database runs in WAL mode (set outside the app), also
+    checkpoints the WAL so it does not grow without bound; the default
+    rollback journal needs none.
+    """
+    if bind.dialect.name != "sqlite":
+        return {"skipped": bind.dialect.name}
+    with bind.connect() as conn:
+        conn.exec_driver_sql("PRAGMA analysis_limit = 1000")
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+        journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        if journal_mode != "wal":
+            return {"analyzed": True, "journal_mode": journal_mode}
+        busy, log_frames, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+    return {"analyzed": True, "journal_mode": journal_mode, "wal_busy": bool(busy), "wal_frames": log_frames,
+            "wal_checkpointed": checkpointed}
+
+def sqlite_vacuum(bind: Engine, deadline: float) -> Dict[str, Any]:
+    if bind.dialect.name != "sqlite":
+        return {"skipped": bind.dialect.name}
+    with bind.connect() as conn:
+        pages = conn.exec_driver_sql("PRAGMA page_count").scalar() or 0
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+        if not pages or free / pages < MAINTENANCE_VACUUM_MIN_FREE:
+            return {"vacuumed": False, "pages": pages, "free_pages": free}
+        conn.exec_driver_sql("VACUUM")
+    return {"vacuumed": True, "pages": pages, "free_pages": free}
+
+def warm_curve_store(bind: Engine, deadline: float) -> Dict[str, Any]:
+    """
+    Brings the curve store snapshots of the largest orgs (by series count)
+    up to date, so the first read after a burst of writes does not pay for
+    the rebuild.
+    """
+    if not curve_store.enabled():
+        return {"skipped": "curve store disabled"}
+    # Results are shown to every org's admins (GET /maintenance/jobs): counts only, no org ids
+    warmed = 0
+    with Session(bind) as session:
+        org_ids = session.scalars(
+            select(CurveSeries.org_id).where(CurveSeries.deleted_at.is_(None))
+            .group_by(CurveSeries.org_id).order_by(func.count().desc()).limit(MAINTENANCE_WARM_ORGS)
+        ).all()
+        for org_id in org_ids:
+            if time.monotonic() > deadline:
+                break
+            if curve_store.refresh(session, org_id) is not None:
+                warmed += 1
+    return {"warmed_orgs": warmed}
+
+JOBS: List[Job] = [
+    _job("expire_invites", expire_invites, interval=3600, budget=30),
+    _job("expire_idempotency_keys", expire_idempotency_keys, interval=3600, budget=30),
+    _job("purge_deleted", purge_tombstones, interval=600, budget=60),
+    _job("sqlite_optimize", sqlite_optimize, interval=6 * 3600, budget=120),
+    _job("sqlite_vacuum", sqlite_vacuum, interval=7 * 86400, budget=600),
+    _job("warm_curve_store", warm_curve_store, interval=300, budget=60),
+]
+
+# Leases
+
+def claim(bind: Engine, job: Job, holder: str, now: Optional[datetime] = None) -> bool:
+    """
+    Takes the job's lease if the job is due and nobody holds an unexpired
+    lease. Atomic across workers: the conditional UPDATE matches at most
+    once.
+    """
+    now = now or datetime.utcnow()
+    with Session(bind) as session:
+        if session.get(MaintenanceJob, job.name) is None:
+            session.add(MaintenanceJob(name=job.name))
+            try:
+                session.commit()
+            except IntegrityError: # Another worker created it first
+                session.rollback()
+        due_before = now - timedelta(seconds=job.interval * (1 - MAINTENANCE_JITTER * random.random()))
+        result = session.execute(
+            update(MaintenanceJob)
+            .where(
+                MaintenanceJob.name == job.name,
+                or_(MaintenanceJob.lease_until.is_(None), MaintenanceJob.lease_until < now),
+                or_(MaintenanceJob.last_started_at.is_(None), MaintenanceJob.last_started_at <= due_before),
+            )
+            # Twice the budget: a job only checks its budget between batches
+            .values(lease_holder=holder, lease_until=now + timedelta(seconds=2 * job.budget + 60), last_started_at=now)
+        )
+        session.commit()
+    return result.rowcount == 1
+
+def run_job(bind: Engine, job: Job, holder: str) -> Dict[str, Any]:
+    """
+    Runs a claimed job within its budget and records the outcome on its
+    row, releasing the lease.
+    """
+    start = time.monotonic()
+    try:
+        result, outcome = job.run(bind, start + job.budget), "ok"
+    except Exception as e:
+        logger.exception("Maintenance job %s failed", job.name)
+        # The message stays in the log: the stored result is shown to every org's admins
+        result, outcome = {"error": type(e).__name__}, "error"
+    duration_ms = (time.monotonic() - start) * 1000
+    stats.record(job.name, outcome, duration_ms / 1000)
+
+    with Session(bind) as session:
+        session.execute(
+            update(MaintenanceJob)
+            .where(MaintenanceJob.name == job.name, MaintenanceJob.lease_holder == holder)
+            .values(lease_holder=None, lease_until=None, last_finished_at=datetime.utcnow(),
+                    last_duration_ms=duration_ms, last_status=outcome, last_result=result)
+        )
+        session.commit()
+    logger.info("Maintenance job %s: %s in %.0f ms %s", job.name, outcome, duration_ms, result)
+    return result
+
+def run_due(bind: Engine, holder: str, jobs: List[Job] = JOBS) -> List[str]:
+    """
+    Runs every enabled job this worker can claim. Returns their names.
+    """
+    ran = []
+    for job in jobs:
+        if job.interval > 0 and claim(bind, job, holder):
+            run_job(bind, job, holder)
+            ran.append(job.name)
+    return ran
+
+class JobStats:
+    """
+    Runs of this process, for /metrics. The MaintenanceJob rows hold the
+    last run across all workers.
+    """
+    def __init__(self):
+        self.jobs: Dict[str, Dict[str, float]] = {}
+
+    def record(self, name: str, status: str, seconds: float) -> None:
+        entry = self.jobs.setdefault(name, {"ok": 0, "error": 0, "last_seconds": 0.0, "last_finished": 0.0})
+        entry[status] += 1
+        entry["last_seconds"] = seconds
+        entry["last_finished"] = time.time()
+
+    def render(self) -> str:
+        lines = ["# HELP maintenance_runs_total Maintenance job runs in this process.", "# TYPE maintenance_runs_total counter"]
+        for name, entry in sorted(self.jobs.items()):
+            lines += [f'maintenance_runs_total{{job="{name}",status="{s}"}} {int(entry[s])}' for s in ("ok", "error")]
+        lines += ["# TYPE maintenance_last_duration_seconds gauge"]
+        lines += [f'maintenance_last_duration_seconds{{job="{name}"}} {e["last_seconds"]}' for name, e in sorted(self.jobs.items())]
+        lines += ["# TYPE maintenance_last_finished_timestamp_seconds gauge"]
+        lines += [f'maintenance_last_finished_timestamp_seconds{{job="{name}"}} {e["last_finished"]}' for name, e in sorted(self.jobs.items())]
+        return "\n".join(lines) + "\n"
+
+stats = JobStats()
+
+# Scheduler
+
+def _jittered(seconds: float) -> float:
+    return seconds * (1 + MAINTENANCE_JITTER * (2 * random.random() - 1))
+
+async def scheduler(bind: Engine, holder: Optional[str] = None) -> None:
+    holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    while True:
+        # Sleep first: keeps jobs off the startup path
+        await asyncio.sleep(_jittered(MAINTENANCE_TICK_SECONDS))
+        try:
+            await run_in_threadpool(run_due, bind, holder)
+        except Exception: # E.g. database locked; try again next tick
+            logger.exception("Maintenance tick failed")
+
+def start(bind: Engine) -> Optional[asyncio.Task]:
+    if not MAINTENANCE_ENABLED:
+        return None
+    return asyncio.create_task(scheduler(bind))
+
+def status(bind: Engine, redact: bool = False) -> List[Dict[str, Any]]:
+    """
+    Configuration and last run (across all workers) of every job. With
+    redact, the lease holder (host name and pid) is reduced to "leased".
+    """
+    with Session(bind) as session:
+        rows = {row.name: row for row in session.scalars(select(MaintenanceJob))}
+    report = []
+    for job in JOBS:
+        row = rows.get(job.name)
+        entry = {
+            "name": job.name, "interval_s": job.interval, "budget_s": job.budget,
+            **({k: getattr(row, k) for k in ("lease_holder", "lease_until", "last_started_at", "last_finished_at",
+                                             "last_duration_ms", "last_status", "last_result")} if row else {}),
+        }
+        if redact and row:
+            entry["leased"] = entry.pop("lease_holder") is not None
+        report.append(entry)
+    return report
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from backend.database import engine, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Show or run maintenance jobs")
+    parser.add_argument("--run", choices=[job.name for job in JOBS], help="Run this job now (ignores its interval)")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    if args.run:
+        job = next(job for job in JOBS if job.name == args.run)
+        print(json.dumps(job.run(engine, time.monotonic() + job.budget), default=str))
+    else:
+        for entry in status(engine):
+            print(json.dumps(entry, default=str))
@@ -0,0 +1,181 @@
+"""
+In-process request metrics with a Prometheus text exposition.
+
+MetricsMiddleware records per-route latency histograms and status codes;
+SQLAlchemy cursor events count statements and SQL time for the request
+that issued them. Everything is plain dicts and lists updated on the event
+loop thread, so the per-request cost is a few perf_counter calls and dict
+lookups.
+
+The exposition shows per-route traffic and latency, so it is never
+public: /metrics is disabled (404) until METRICS_TOKEN is set, and then
+needs `Authorization: Bearer <token>`.
+"""
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _SQLAccumulator:
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+# Set per request by the middleware. Threadpool workers run in a copy of the
+# request context, so SQL issued from sync endpoints lands in the same object.
+_current_sql: ContextVar[Optional[_SQLAccumulator]] = ContextVar("current_sql", default=None)
+
+class MetricsRegistry:
+    def __init__(self):
+        self.latency: Dict[Tuple[str, str, str], _Histogram] = {}
+        self.sql_per_request: Dict[Tuple[str, str], _Histogram] = {}
+        self.sql_statements: Dict[Tuple[str, str], int] = {}
+        self.sql_seconds: Dict[Tuple[str, str], float] = {}
+        self.in_progress = 0
+
+    def record(self, method: str, route: str, status: int, seconds: float, sql: _SQLAccumulator) -> None:
+        key = (method, route, str(status))
+        hist = self.latency.get(key)
+        if hist is None:
+            hist = self.latency[key] = _Histogram(LATENCY_BUCKETS)
+        hist.observe(seconds)
+
+        route_key = (method, route)
+        sql_hist = self.sql_per_request.get(route_key)
+        if sql_hist is None:
+            sql_hist = self.sql_per_request[route_key] = _Histogram(SQL_COUNT_BUCKETS)
+        sql_hist.observe(sql.statements)
+        self.sql_statements[route_key] = self.sql_statements.get(route_key, 0) + sql.statements
+        self.sql_seconds[route_key] = self.sql_seconds.get(route_key, 0.0) + sql.seconds
+
+    def render(self, threadpool: Optional[Dict[str, float]] = None) -> str:
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, series, label_names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in sorted(series.items()):
+                base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(label_names, labels))
+                cumulative = 0
+                for bound, count in zip(hist.bounds + (float("inf"),), hist.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{{base},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{base}}} {hist.sum}")
+                lines.append(f"{name}_count{{{base}}} {hist.count}")
+
+        def counter(name: str, help_text: str, series, label_names, kind="counter"):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series.items()):
+                base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(label_names, labels))
+                lines.append(f"{name}{{{base}}} {value}")
+
+        histogram("http_request_duration_seconds", "Request latency by route and status.",
+                  self.latency, ("method", "route", "status"))
+        histogram("http_request_sql_statements", "SQL statements issued per request.",
+                  self.sql_per_request, ("method", "route"))
+        counter("sql_statements_total", "SQL statements executed, by route.", self.sql_statements, ("method", "route"))
+        counter("sql_duration_seconds_total", "Time spent executing SQL, by route.", self.sql_seconds, ("method", "route"))
+
+        lines.append("# HELP http_requests_in_progress Requests currently being handled.")
+        lines.append("# TYPE http_requests_in_progress gauge")
+        lines.append(f"http_requests_in_progress {self.in_progress}")
+
+        if threadpool:
+            for name, value in threadpool.items():
+                lines.append(f"# TYPE threadpool_{name} gauge")
+                lines.append(f"threadpool_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+registry = MetricsRegistry()
+
+def threadpool_stats() -> Dict[str, float]:
+    """
+    Occupancy of the threadpool that runs sync endpoints and dependencies.
+    Must be called from the event loop.
+    """
+    from anyio.to_thread import current_default_thread_limiter
+
+    stats = current_default_thread_limiter().statistics()
+    return {
+        "workers_busy": stats.borrowed_tokens,
+        "workers_total": stats.total_tokens,
+        "queue_depth": stats.tasks_waiting,
+    }
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_sql.get() is not None:
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    acc = _current_sql.get()
+    if acc is None:
+        return
+    starts = conn.info.get("metrics_start")
+    if starts:
+        acc.seconds += time.perf_counter() - starts.pop()
+    acc.statements += 1
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        acc = _SQLAccumulator()
+        token = _current_sql.set(acc)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.registry.in_progress += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.registry.in_progress -= 1
+            _current_sql.reset(token)
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = scope.get("route")
+            self.registry.record(scope["method"], route.path if route is not None else "unmatched", status, elapsed, acc)
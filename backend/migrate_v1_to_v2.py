@@ -1,107 +1,186 @@
 import sqlite3
 import os
-
-def migrate():
-    # Paths compatible with both local dev (if running from backend dir) and Docker mount
-    # In Docker, we are in /app, so backend/ is where files are.
-    # But wait, local run is typically from root.
-    # Docker mount is /app/backend.
-
-    # Let's verify where we are.
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "50000"))
+
+# Tables in dependency order: (table, target columns, source expressions,
+# filter on the source row `src`). The v1 schema has no orgs and no fit
+# columns; pumps go to the first org (bound as :org_id, also denormalized onto
+# curve sets and series) and series get empty warnings and no fit.
+# v2 allows one series per type in a curve set: of v1 duplicates only the
+# newest (highest id) is copied, as the app's own replace kept it. Rows whose
+# parent was not copied are skipped rather than left as orphans.
+TABLES = [
+    ("pump",
+     "id, manufacturer, model, meta_data, created_at, updated_at, org_id",
+     "id, manufacturer, model, meta_data, created_at, updated_at, :org_id",
+     None),
+    ("curveset",
+     "id, name, pump_id, units, meta_data, created_at, updated_at, org_id",
+     "id, name, pump_id, units, meta_data, created_at, updated_at, :org_id",
+     "src.pump_id IN (SELECT id FROM main.pump)"),
+    ("curveseries",
+     "id, curve_set_id, type, validation_warnings, org_id",
+     "id, curve_set_id, type, '[]', :org_id",
+     "src.curve_set_id IN (SELECT id FROM main.curveset) AND NOT EXISTS ("
+     "SELECT 1 FROM old.curveseries t WHERE t.curve_set_id = src.curve_set_id AND t.type = src.type AND t.id > src.id)"),
+    ("curvepoint",
+     "id, series_id, flow, value, sequence",
+     "id, series_id, flow, value, sequence",
+     "src.series_id IN (SELECT id FROM main.curveseries)"),
+]
+
+CHECKPOINT_TABLE = "_migration_v1_checkpoint"
+
+def _default_paths():
+    # Script lives in backend/; in Docker that is the /app/backend mount
     base_dir = os.path.dirname(os.path.abspath(__file__))
-
-    # Assuming this script is in backend/ folder.
     old_db = os.path.join(base_dir, "pump_curves.db")
-    new_db = os.path.join(base_dir, "pump_curves_v2.db")
-
-    # If using environment variable override
-    if "SQLITE_DB_PATH" in os.environ:
-         new_db = os.environ["SQLITE_DB_PATH"]
-
-    print(f"Old DB Path: {old_db}")
-    print(f"New DB Path: {new_db}")
+    new_db = os.environ.get("SQLITE_DB_PATH", os.path.join(base_dir, "pump_curves_v2.db"))
+    return old_db, new_db
+
+def _checkpoint(conn: sqlite3.Connection, table: str) -> int:
+    row = conn.execute(f"SELECT last_id FROM {CHECKPOINT_TABLE} WHERE name = ?", (table,)).fetchone()
+    return row[0] if row else 0
+
+def copy_table(conn: sqlite3.Connection, table: str, columns: str, source: str, where: Optional[str], org_id: int,
+               batch_size: int, progress: Callable[[str], None]) -> int:
+    """
+    Copies the old.<table> rows matching `where` into main.<table> in
+    id-ordered batches of INSERT OR IGNORE ... SELECT, committing a
+    checkpoint with each batch so an interrupted run resumes after the last
+    committed id. Returns the number of rows inserted by this run.
+    """
+    total = conn.execute(f"SELECT COUNT(*) FROM old.{table}").fetchone()[0]
+    last_id = _checkpoint(conn, table)
+    done = conn.execute(f"SELECT COUNT(*) FROM old.{table} WHERE id <= ?", (last_id,)).fetchone()[0]
+    inserted = 0
+    start = time.perf_counter()
+
+    while True:
+        # Upper id of the next batch (keyset pagination; ids may be sparse)
+        row = conn.execute(
+            f"SELECT id FROM old.{table} WHERE id > ? ORDER BY id LIMIT 1 OFFSET ?", (last_id, batch_size - 1)
+        ).fetchone()
+        upper = row[0] if row else conn.execute(f"SELECT MAX(id) FROM old.{table}").fetchone()[0]
+        if upper is None or upper <= last_id:
+            break
+
+        with conn: # One transaction per batch, checkpoint included
+            cur = conn.execute(
+                f"INSERT OR IGNORE INTO main.{table} ({columns}) "
+                f"SELECT {source} FROM old.{table} AS src WHERE id > :lower AND id <= :upper AND ({where or 1})",
+                {"lower": last_id, "upper": upper, "org_id": org_id}
+            )
+            inserted += cur.rowcount
+            conn.execute(
+                f"INSERT INTO {CHECKPOINT_TABLE} (name, last_id) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id",
+                (table, upper)
+            )
+        done += conn.execute(f"SELECT COUNT(*) FROM old.{table} WHERE id > ? AND id <= ?", (last_id, upper)).fetchone()[0]
+        last_id = upper
+
+        elapsed = time.perf_counter() - start
+        progress(f"{table}: {done}/{total} rows ({inserted} inserted, {elapsed:.1f}s)")
+
+    return inserted
+
+def verify(conn: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+    """
+    Row counts per table: rows in the old DB, rows in the new DB, old rows
+    skipped by the TABLES filters (older duplicate series, rows whose parent
+    was not copied), and other old rows whose id is missing from the new DB
+    (should be 0).
+    """
+    report = {}
+    for table, _, _, where in TABLES:
+        report[table] = {
+            "old": conn.execute(f"SELECT COUNT(*) FROM old.{table}").fetchone()[0],
+            "new": conn.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0],
+            "skipped": conn.execute(f"SELECT COUNT(*) FROM old.{table} AS src WHERE NOT ({where or 1})").fetchone()[0],
+            "missing": conn.execute(
+                f"SELECT COUNT(*) FROM old.{table} AS src WHERE ({where or 1}) "
+                f"AND NOT EXISTS (SELECT 1 FROM main.{table} n WHERE n.id = src.id)"
+            ).fetchone()[0],
+        }
+    return report
+
+def skipped_duplicates(conn: sqlite3.Connection) -> List[Tuple[int, int, str]]:
+    """
+    (series id, curve set id, type) of the old series not copied because a
+    newer series of the same type exists in their curve set.
+    """
+    return conn.execute(
+        "SELECT s.id, s.curve_set_id, s.type FROM old.curveseries s WHERE EXISTS ("
+        "SELECT 1 FROM old.curveseries t WHERE t.curve_set_id = s.curve_set_id AND t.type = s.type AND t.id > s.id) "
+        "ORDER BY s.id"
+    ).fetchall()
+
+def migrate(old_db: Optional[str] = None, new_db: Optional[str] = None, batch_size: int = MIGRATION_BATCH_SIZE,
+            progress: Callable[[str], None] = print) -> Optional[Dict[str, Dict[str, int]]]:
+    """
+    Migrates a v1 database into an initialized v2 database. Safe to re-run:
+    existing ids are skipped and completed batches are not repeated.
+    Returns the verification report, or None if there was nothing to do.
+    """
+    default_old, default_new = _default_paths()
+    old_db = old_db or default_old
+    new_db = new_db or default_new
+
+    progress(f"Old DB Path: {old_db}")
+    progress(f"New DB Path: {new_db}")
 
     if not os.path.exists(old_db):
-        print(f"No existing database {old_db} found. Skipping migration.")
-        return
+        progress(f"No existing database {old_db} found. Skipping migration.")
+        return None
 
     if not os.path.exists(new_db):
-        print(f"Target database {new_db} does not exist. Please run the app once to initialize schema.")
-        return
-
-    print(f"Migrating data from {old_db} to {new_db}...")
+        progress(f"Target database {new_db} does not exist. Please run the app once to initialize schema.")
+        return None
 
-    conn_old = sqlite3.connect(old_db)
-    conn_new = sqlite3.connect(new_db)
-
-    conn_old.row_factory = sqlite3.Row
+    progress(f"Migrating data from {old_db} to {new_db}...")
 
+    conn = sqlite3.connect(new_db, isolation_level=None)
     try:
-        cur_new = conn_new.cursor()
+        conn.execute("ATTACH DATABASE ? AS old", (old_db,))
+        conn.execute(f"CREATE TABLE IF NOT EXISTS main.{CHECKPOINT_TABLE} (name TEXT PRIMARY KEY, last_id INTEGER NOT NULL)")
 
-        # Get default org id
-        cur_new.execute("SELECT id FROM organization LIMIT 1")
-        row = cur_new.fetchone()
+        row = conn.execute("SELECT id FROM main.organization ORDER BY id LIMIT 1").fetchone()
         if not row:
-            print("No organization found in new DB. Skipping.")
-            return
+            progress("No organization found in new DB. Skipping.")
+            return None
         default_org_id = row[0]
 
-        # Migrate Pumps
-        pumps = conn_old.execute("SELECT * FROM pump").fetchall()
-        for pump in pumps:
-            # Check if pump already exists
-            exists = cur_new.execute("SELECT 1 FROM pump WHERE id = ?", (pump["id"],)).fetchone()
-            if not exists:
-                cur_new.execute(
-                    "INSERT INTO pump (id, manufacturer, model, meta_data, created_at, updated_at, org_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (pump["id"], pump["manufacturer"], pump["model"], pump["meta_data"], pump["created_at"], pump["updated_at"], default_org_id)
-                )
-
-        # Migrate CurveSets
-        # Assuming table name is curveset (SQLModel default)
-        sets = conn_old.execute("SELECT * FROM curveset").fetchall()
-        for s in sets:
-             exists = cur_new.execute("SELECT 1 FROM curveset WHERE id = ?", (s["id"],)).fetchone()
-             if not exists:
-                 cur_new.execute(
-                     "INSERT INTO curveset (id, name, pump_id, units, meta_data, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                     (s["id"], s["name"], s["pump_id"], s["units"], s["meta_data"], s["created_at"], s["updated_at"])
-                 )
-
-        # Migrate CurveSeries
-        series = conn_old.execute("SELECT * FROM curveseries").fetchall()
-        for s in series:
-             exists = cur_new.execute("SELECT 1 FROM curveseries WHERE id = ?", (s["id"],)).fetchone()
-             if not exists:
-                 # Check if new columns exist in old db (they don't)
-                 # New schema has fit/validation columns. We insert defaults (NULL/Empty)
-                 cur_new.execute(
-                     """INSERT INTO curveseries
-                     (id, curve_set_id, type, validation_warnings, fit_model_type, fit_params, fit_quality, data_range)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                     (s["id"], s["curve_set_id"], s["type"], "[]", None, None, None, None)
-                 )
-
-        # Migrate CurvePoint
-        points = conn_old.execute("SELECT * FROM curvepoint").fetchall()
-        for p in points:
-             exists = cur_new.execute("SELECT 1 FROM curvepoint WHERE id = ?", (p["id"],)).fetchone()
-             if not exists:
-                 cur_new.execute(
-                     "INSERT INTO curvepoint (id, series_id, flow, value, sequence) VALUES (?, ?, ?, ?, ?)",
-                     (p["id"], p["series_id"], p["flow"], p["value"], p["sequence"])
-                 )
-
-        conn_new.commit()
-        print("Migration complete.")
-
-    except Exception as e:
-        print(f"Migration failed: {e}")
-        conn_new.rollback()
+        for table, columns, source, where in TABLES:
+            copy_table(conn, table, columns, source, where, default_org_id, batch_size, progress)
+
+        report = verify(conn)
+        for table, counts in report.items():
+            progress(f"{table}: old={counts['old']} new={counts['new']} skipped={counts['skipped']} missing={counts['missing']}")
+        for series_id, curve_set_id, series_type in skipped_duplicates(conn):
+            progress(f"Skipped duplicate series {series_id} ({series_type} in curve set {curve_set_id}) and its points; "
+                     "a newer series of that type was copied.")
+        if any(counts["missing"] for counts in report.values()):
+            progress("Migration incomplete: some rows were not copied (see 'missing' above).")
+        else:
+            # Verified: a re-run starts from scratch (and only skips existing ids)
+            conn.execute(f"DROP TABLE main.{CHECKPOINT_TABLE}")
+            progress("Migration complete.")
+        return report
+    except sqlite3.Error as e:
+        # Committed batches are kept; re-running resumes from the checkpoint
+        progress(f"Migration failed: {e}")
+        raise
     finally:
-        conn_old.close()
-        conn_new.close()
+        conn.close()
 
 if __name__ == "__main__":
-    migrate()
+    try:
+        report = migrate()
+    except sqlite3.Error:
+        sys.exit(1)
+    sys.exit(1 if report and any(c["missing"] for c in report.values()) else 0)
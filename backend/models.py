@@ -1,13 +1,22 @@
+import uuid
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship, Column, JSON
 from enum import Enum
 
+def new_fit_token() -> str:
+    return uuid.uuid4().hex
+
 class SeriesType(str, Enum):
     head = "head"
     efficiency = "efficiency"
     power = "power"
 
+class PointsFormat(str, Enum):
+    objects = "objects" # List of CurvePointRead (default)
+    columnar = "columnar" # {"flow": [...], "value": [...]} per series
+
 class UserRole(str, Enum):
     admin = "admin"
     editor = "editor"
@@ -39,7 +48,7 @@ class PumpBase(SQLModel):
 
 class CurveSetBase(SQLModel):
     name: str
-    pump_id: int = Field(foreign_key="pump.id")
+    pump_id: int = Field(foreign_key="pump.id", index=True)
     units: Dict[str, str] = Field(default={}, sa_column=Column(JSON)) # e.g. {"flow": "gpm", "head": "ft"}
     meta_data: Optional[Dict[str, Any]] = Field(default={}, sa_column=Column(JSON))
 
@@ -68,6 +77,8 @@ class User(UserBase, table=True):
     hashed_password: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_login_at: Optional[datetime] = None
+    # Bumped on membership changes; tokens with role claims carry the version they were issued at
+    token_version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
 
     memberships: List["Membership"] = Relationship(back_populates="user")
 
@@ -91,20 +102,98 @@ class Pump(PumpBase, table=True):
     org_id: int = Field(foreign_key="organization.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    revision: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+    # Set by a delete; the row is removed later by backend.purge
+    deleted_at: Optional[datetime] = Field(default=None, index=True)
 
     organization: Organization = Relationship(back_populates="pumps")
-    curve_sets: List["CurveSet"] = Relationship(back_populates="pump", sa_relationship_kwargs={"cascade": "all, delete-orphan"})
+    # Tombstoned curve sets are hidden until purged
+    curve_sets: List["CurveSet"] = Relationship(back_populates="pump", sa_relationship_kwargs={
+        "primaryjoin": "and_(Pump.id == CurveSet.pump_id, CurveSet.deleted_at == None)"
+    })
 
 class CurveSet(CurveSetBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Denormalized from the pump: ownership checks are one primary-key lookup
+    org_id: int = Field(foreign_key="organization.id", index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    revision: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+    deleted_at: Optional[datetime] = Field(default=None, index=True) # As on Pump
 
     pump: Optional[Pump] = Relationship(back_populates="curve_sets")
     series: List["CurveSeries"] = Relationship(back_populates="curve_set", sa_relationship_kwargs={"cascade": "all, delete-orphan"})
+    # Loaded together with the curve sets (one query), not per set
+    characteristics: Optional["CurveSetCharacteristics"] = Relationship(
+        back_populates="curve_set",
+        sa_relationship_kwargs={"uselist": False, "cascade": "all, delete-orphan", "lazy": "selectin"}
+    )
+
+class CurveSetCharacteristicsBase(SQLModel):
+    bep_flow: Optional[float] = Field(default=None, index=True)
+    bep_head: Optional[float] = Field(default=None, index=True)
+    bep_efficiency: Optional[float] = Field(default=None, index=True)
+    shutoff_head: Optional[float] = None
+    runout_flow: Optional[float] = None
+    max_power: Optional[float] = None
+    specific_speed: Optional[float] = Field(default=None, index=True) # rpm, gpm, ft
+
+class CurveSetCharacteristics(CurveSetCharacteristicsBase, table=True):
+    """
+    Hydraulic characteristics derived from a curve set's fits (see
+    curves.characteristics). Recomputed whenever a fit changes.
+    """
+    curve_set_id: int = Field(foreign_key="curveset.id", primary_key=True)
+    pump_id: int = Field(foreign_key="pump.id", index=True) # Denormalized for pump list sorting
+    computed_at: datetime = Field(default_factory=datetime.utcnow)
+    # SI copies for sorting across curve sets in different units (see curves.characteristics.sort_field)
+    bep_flow_si: Optional[float] = Field(default=None, index=True)
+    bep_head_si: Optional[float] = Field(default=None, index=True)
+    bep_efficiency_si: Optional[float] = Field(default=None, index=True)
+    shutoff_head_si: Optional[float] = None
+    runout_flow_si: Optional[float] = None
+    max_power_si: Optional[float] = None
+
+    curve_set: Optional[CurveSet] = Relationship(back_populates="characteristics")
+
+class IdempotencyKey(SQLModel, table=True):
+    """
+    Stored result of a create made with an Idempotency-Key header (see
+    backend.idempotency). Written in the same transaction as the create.
+    """
+    org_id: int = Field(foreign_key="organization.id", primary_key=True)
+    key: str = Field(primary_key=True)
+    request_hash: str
+    response: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class MaintenanceJob(SQLModel, table=True):
+    """
+    Lease and last run of a scheduled maintenance job (see
+    backend.maintenance). Shared by all workers: only the holder of an
+    unexpired lease runs the job.
+    """
+    name: str = Field(primary_key=True)
+    lease_holder: Optional[str] = None
+    lease_until: Optional[datetime] = None
+    last_started_at: Optional[datetime] = None
+    last_finished_at: Optional[datetime] = None
+    last_duration_ms: Optional[float] = None
+    last_status: Optional[str] = None # "ok" or "error"
+    last_result: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
 
 class CurveSeries(CurveSeriesBase, table=True):
+    # One series per type; also serves lookups by curve_set_id alone
+    __table_args__ = (Index("ix_curveseries_curve_set_id_type", "curve_set_id", "type", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    org_id: int = Field(foreign_key="organization.id", index=True) # Denormalized, as on CurveSet
+    deleted_at: Optional[datetime] = Field(default=None, index=True) # Set with its curve set's
+    # Bumped on every refit; used for conditional GETs
+    revision: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+    # Replaced on every refit and unique across rows (a replaced series can get
+    # its id back and starts again at revision 1): the key for per-fit caches
+    fit_token: Optional[str] = Field(default_factory=new_fit_token, sa_column_kwargs={"default": new_fit_token})
 
     # New fields for Validation and Fitting
     validation_warnings: List[Dict[str, Any]] = Field(default=[], sa_column=Column(JSON))
@@ -112,11 +201,20 @@ class CurveSeries(CurveSeriesBase, table=True):
     fit_params: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
     fit_quality: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
     data_range: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+    # Least-squares sufficient statistics for incremental refits (see curves.fitting.moment_stats)
+    fit_stats: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+    # Derived series (power from head and efficiency) have a fit but no points;
+    # derived_from records the source fits it was computed from.
+    is_derived: bool = Field(default=False, sa_column_kwargs={"server_default": "0"})
+    derived_from: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
 
     curve_set: Optional[CurveSet] = Relationship(back_populates="series")
-    points: List["CurvePoint"] = Relationship(back_populates="series", sa_relationship_kwargs={"cascade": "all, delete-orphan"})
+    points: List["CurvePoint"] = Relationship(back_populates="series", sa_relationship_kwargs={"cascade": "all, delete-orphan", "order_by": "CurvePoint.sequence"})
 
 class CurvePoint(CurvePointBase, table=True):
+    # Points are always read per series in sequence order
+    __table_args__ = (Index("ix_curvepoint_series_id_sequence", "series_id", "sequence"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     series: Optional[CurveSeries] = Relationship(back_populates="points")
 
@@ -136,9 +234,18 @@ class CurvePointRead(CurvePointBase):
 class CurveSeriesCreate(CurveSeriesBase):
     points: List[CurvePointInput] = []
 
-class CurveSeriesRead(CurveSeriesBase):
+class CurvePointUpdate(SQLModel):
+    id: int
+    flow: Optional[float] = None
+    value: Optional[float] = None
+
+class CurvePointsPatch(SQLModel):
+    append: List[CurvePointInput] = [] # Placed by flow; sequence is ignored
+    update: List[CurvePointUpdate] = []
+    remove: List[int] = [] # Point ids
+
+class CurveSeriesReadBase(CurveSeriesBase):
     id: int
-    points: List[CurvePointRead] = []
 
     # Include new fields in response
     validation_warnings: List[Dict[str, Any]] = []
@@ -146,18 +253,36 @@ class CurveSeriesRead(CurveSeriesBase):
     fit_params: Optional[Dict[str, Any]] = None
     fit_quality: Optional[Dict[str, Any]] = None
     data_range: Optional[Dict[str, Any]] = None
+    is_derived: bool = False
+
+class CurveSeriesRead(CurveSeriesReadBase):
+    points: List[CurvePointRead] = []
+
+class CurvePointColumns(SQLModel):
+    flow: List[float] = []
+    value: List[float] = []
+
+class CurveSeriesReadColumnar(CurveSeriesReadBase):
+    points: CurvePointColumns = CurvePointColumns()
 
 class CurveSetCreate(CurveSetBase):
     pass
 
+class CurveSetCharacteristicsRead(CurveSetCharacteristicsBase):
+    pass
+
 class CurveSetRead(CurveSetBase):
     id: int
     created_at: datetime
     updated_at: datetime
+    characteristics: Optional[CurveSetCharacteristicsRead] = None
 
 class CurveSetReadWithSeries(CurveSetRead):
     series: List[CurveSeriesRead] = []
 
+class CurveSetReadWithColumnarSeries(CurveSetRead):
+    series: List[CurveSeriesReadColumnar] = []
+
 class CurveSetUpdate(SQLModel):
     name: Optional[str] = None
     units: Optional[Dict[str, str]] = None
@@ -166,6 +291,22 @@ class CurveSetUpdate(SQLModel):
 class PumpCreate(PumpBase):
     pass
 
+# Nested documents: a pump with its curve sets and raw series points.
+# Used by the NDJSON catalog import (one PumpCreateNested per line).
+
+class CurveSeriesCreateNested(SQLModel):
+    type: SeriesType
+    points: List[CurvePointInput] = []
+
+class CurveSetCreateNested(SQLModel):
+    name: str
+    units: Dict[str, str] = {}
+    meta_data: Optional[Dict[str, Any]] = {}
+    series: List[CurveSeriesCreateNested] = []
+
+class PumpCreateNested(PumpCreate):
+    curve_sets: List[CurveSetCreateNested] = []
+
 class PumpRead(PumpBase):
     id: int
     org_id: int
@@ -175,6 +316,16 @@ class PumpRead(PumpBase):
 class PumpReadWithCurveSets(PumpRead):
     curve_sets: List[CurveSetRead] = []
 
+class CurveSetSummary(SQLModel):
+    id: int
+    name: str
+    units: Dict[str, str] = {}
+    characteristics: Optional[CurveSetCharacteristicsRead] = None
+
+# Pump list entries: characteristics per curve set, without meta_data or points
+class PumpReadWithCharacteristics(PumpRead):
+    curve_sets: List[CurveSetSummary] = []
+
 class PumpUpdate(SQLModel):
     manufacturer: Optional[str] = None
     model: Optional[str] = None
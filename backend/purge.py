@@ -0,0 +1,106 @@
+"""
+Deletes of pumps and curve sets.
+
+A delete only tombstones rows: it sets deleted_at on the pump, its curve
+sets and their series with a few set-based UPDATEs, so it returns at once
+and readers (which filter on deleted_at) stop seeing them on commit. The
+points and the tombstoned rows are then removed by purge_deleted in small
+batches, each in its own short transaction, so a large pump never holds
+the database lock for long. A parent row is only purged once its children
+are gone, so an interrupted purge is simply resumed by the next one.
+
+    python -m backend.purge
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from backend.models import Pump, CurveSet, CurveSetCharacteristics, CurveSeries, CurvePoint
+
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "20000"))
+
+_purge_lock = threading.Lock()
+
+def tombstone_pump(session: Session, pump: Pump) -> None:
+    """
+    Marks the pump and everything under it deleted. Does not commit.
+    """
+    now = datetime.utcnow()
+    pump.deleted_at = now
+    session.add(pump)
+    sets = select(CurveSet.id).where(CurveSet.pump_id == pump.id, CurveSet.deleted_at.is_(None))
+    session.execute(update(CurveSeries).where(CurveSeries.curve_set_id.in_(sets), CurveSeries.deleted_at.is_(None)).values(deleted_at=now))
+    session.execute(update(CurveSet).where(CurveSet.pump_id == pump.id, CurveSet.deleted_at.is_(None)).values(deleted_at=now))
+
+def tombstone_curve_set(session: Session, curve_set: CurveSet) -> None:
+    """
+    Marks the curve set and its series deleted. Its characteristics row is
+    removed right away so pump sorting ignores it. Does not commit.
+    """
+    now = datetime.utcnow()
+    curve_set.deleted_at = now
+    session.add(curve_set)
+    session.execute(update(CurveSeries).where(CurveSeries.curve_set_id == curve_set.id, CurveSeries.deleted_at.is_(None)).values(deleted_at=now))
+    session.execute(delete(CurveSetCharacteristics).where(CurveSetCharacteristics.curve_set_id == curve_set.id))
+
+def delete_series(session: Session, series_ids: List[int]) -> None:
+    """
+    Deletes series and their points with set-based DELETEs (no ORM loads).
+    For single series replaced or removed in a request. Does not commit.
+    """
+    if not series_ids:
+        return
+    session.flush() # Keep pending changes; expire_all below would discard them
+    session.execute(delete(CurvePoint).where(CurvePoint.series_id.in_(series_ids)))
+    session.execute(delete(CurveSeries).where(CurveSeries.id.in_(series_ids)))
+    session.expire_all() # Loaded series/point objects may be stale now
+
+def _delete_batch(session: Session, model, condition, batch_size: int) -> int:
+    ids = select(model.id).where(condition).limit(batch_size)
+    result = session.execute(delete(model).where(model.id.in_(ids)))
+    session.commit()
+    return result.rowcount
+
+def purge_deleted(bind: Engine, batch_size: int = PURGE_BATCH_SIZE, progress: Callable[[str], None] = lambda msg: None,
+                  deadline: Optional[float] = None) -> int:
+    """
+    Removes tombstoned rows and their points, children first, in batches of
+    batch_size rows per transaction. Stops between batches once
+    time.monotonic() passes deadline. Returns the number of rows removed.
+    """
+    tombstoned_series = select(CurveSeries.id).where(CurveSeries.deleted_at.is_not(None))
+    stages = [
+        (CurvePoint, CurvePoint.series_id.in_(tombstoned_series)),
+        (CurveSeries, CurveSeries.deleted_at.is_not(None) & ~exists().where(CurvePoint.series_id == CurveSeries.id)),
+        (CurveSet, CurveSet.deleted_at.is_not(None) & ~exists().where(CurveSeries.curve_set_id == CurveSet.id)),
+        (Pump, Pump.deleted_at.is_not(None) & ~exists().where(CurveSet.pump_id == Pump.id)),
+    ]
+    removed = 0
+    with _purge_lock, Session(bind) as session:
+        # Characteristics of tombstoned curve sets (those of directly deleted sets are already gone)
+        session.execute(delete(CurveSetCharacteristics).where(
+            CurveSetCharacteristics.curve_set_id.in_(select(CurveSet.id).where(CurveSet.deleted_at.is_not(None)))
+        ))
+        session.commit()
+        for model, condition in stages:
+            while True:
+                if deadline is not None and time.monotonic() > deadline:
+                    return removed
+                count = _delete_batch(session, model, condition, batch_size)
+                removed += count
+                if count < batch_size:
+                    break
+                progress(f"{model.__tablename__}: {removed} rows purged")
+    return removed
+
+if __name__ == "__main__":
+    from backend.database import engine, create_db_and_tables
+
+    create_db_and_tables()
+    print(f"Purged {purge_deleted(engine, progress=print)} deleted rows.")
@@ -0,0 +1,13 @@
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+
+class FastJSONResponse(JSONResponse):
+    """
+    orjson-backed JSON response. Several times faster than the stdlib encoder
+    for large curve payloads, and serializes NumPy arrays directly.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
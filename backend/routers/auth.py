@@ -3,8 +3,8 @@ from sqlmodel import Session, select
 from datetime import datetime
 from backend.database import get_session
 from backend.models import User, UserLogin, Token, UserRole, Membership, Organization, UserRead, OrganizationRead
-from backend.auth_utils import verify_password, create_access_token, get_password_hash
-from backend.dependencies import get_current_user, get_active_org, get_current_role
+from backend.auth_utils import verify_password, create_user_token, get_password_hash
+from backend.dependencies import ActiveOrg, get_current_user, get_active_org, get_current_role
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -47,7 +47,7 @@ def register(user_in: UserLogin, session: Session = Depends(get_session)):
     session.commit()
 
     # Generate Token
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_user_token(user, [membership])
     return Token(
         access_token=access_token,
         token_type="bearer",
@@ -82,7 +82,7 @@ def login(user_in: UserLogin, session: Session = Depends(get_session)):
     active_org = memberships[0].organization
     role = memberships[0].role
 
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_user_token(user, memberships)
     return Token(
         access_token=access_token,
         token_type="bearer",
@@ -94,8 +94,9 @@ def login(user_in: UserLogin, session: Session = Depends(get_session)):
 @router.get("/me", response_model=Token)
 def read_users_me(
     user: User = Depends(get_current_user),
-    active_org: Organization = Depends(get_active_org),
-    role: UserRole = Depends(get_current_role)
+    active_org: ActiveOrg = Depends(get_active_org),
+    role: UserRole = Depends(get_current_role),
+    session: Session = Depends(get_session)
 ):
     # Re-issue token logic isn't here, just return current state
     # But for simplicity, we reuse the Token model to send back user info + context
@@ -103,6 +104,6 @@ def read_users_me(
         access_token="", # Client can ignore this or we can issue a new one
         token_type="bearer",
         user=user,
-        active_org=active_org,
+        active_org=session.get(Organization, active_org.id),
         role=role
     )
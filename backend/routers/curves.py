@@ -1,79 +1,231 @@
-from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, Body, status
+from typing import List, Optional, Dict, Any, Tuple
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Body, Query, status, Request, Response
+from sqlalchemy import func, update
 from sqlmodel import Session, select
 from backend.database import get_session
 from backend.models import (
     CurveSet, CurveSetCreate, CurveSetRead, CurveSetReadWithSeries, CurveSetUpdate,
-    CurveSeries, CurveSeriesCreate, CurveSeriesRead,
-    CurvePoint, CurvePointCreate, SeriesType, Organization, UserRole
+    CurveSeries, CurveSeriesCreate, CurveSeriesRead, CurveSeriesReadBase,
+    CurvePointColumns, PointsFormat,
+    CurvePoint, CurvePointCreate, CurvePointsPatch, SeriesType, UserRole
 )
 from backend.curves.validation import validate_points, ValidationResult
-from backend.curves.fitting import fit_curve
-from backend.curves.evaluation import evaluate_curve_at_point
-from backend.dependencies import get_active_org, RequireRole
-
-router = APIRouter(prefix="/curve-sets", tags=["curve-sets"])
+from backend.curves.fitting import fit_curve, moment_stats, update_moment_stats, fit_from_moments
+from backend.curves.evaluation import evaluate_curve_at_point, sample_curve
+from backend.dependencies import ActiveOrg, get_active_org, RequireRole, get_target_units, owned_pump, owned_curve_set, owned_series
+from backend.conditional import CacheValidators, touch
+from backend.responses import FastJSONResponse
+from backend.tracing import stage, mark
+from backend.characteristics import refresh_derived, update_derived_power, fit_bands
+from backend.curves.uncertainty import band_offsets
+from backend.curves import decimation
+from backend.curves.decimation import minmax_indices
+from backend import curve_store
+from backend.purge import tombstone_curve_set, delete_series, purge_deleted
+from backend.curves.units import conversion_factors, convert_curve_set, converted_units, units_key, to_si, unit_for, SERIES_QUANTITY
+
+router = APIRouter(prefix="/curve-sets", tags=["curve-sets"], default_response_class=FastJSONResponse)
 
 @router.post("/", response_model=CurveSetRead)
 def create_curve_set(
     curve_set: CurveSetCreate,
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org),
+    org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
 ):
-    # Verify pump belongs to org
-    # Since pump is parent, we must check pump ownership
-    pump = session.get(CurveSet, curve_set.pump_id)
-    # Wait, CurveSetCreate has pump_id. We need to check the Pump table.
-    # The variable name below was pump, but I should import Pump model.
-    # And check `pump.org_id`.
-    from backend.models import Pump
-    pump = session.get(Pump, curve_set.pump_id)
-    if not pump:
-        raise HTTPException(status_code=404, detail="Pump not found")
-    if pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Pump not found or access denied")
-
-    db_curve_set = CurveSet.model_validate(curve_set)
+    pump = owned_pump(session, curve_set.pump_id, org.id)
+
+    db_curve_set = CurveSet.model_validate(curve_set, update={"org_id": pump.org_id})
     session.add(db_curve_set)
+    touch(pump) # Pump detail lists its curve sets
+    refresh_derived(session, db_curve_set)
     session.commit()
     session.refresh(db_curve_set)
     return db_curve_set
 
-@router.get("/{curve_set_id}", response_model=CurveSetReadWithSeries)
-def read_curve_set(
-    curve_set_id: int,
+@router.get("/select")
+def select_by_duty_point(
+    flow: float = Query(..., gt=0),
+    head: float = Query(..., gt=0),
+    tolerance: float = Query(0.05, gt=0, le=1),
+    limit: int = Query(50, ge=1, le=1000),
+    target_units: Optional[Dict[str, str]] = Depends(get_target_units),
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org)
+    org: ActiveOrg = Depends(get_active_org)
 ):
-    curve_set = session.get(CurveSet, curve_set_id)
-    if not curve_set:
-        raise HTTPException(status_code=404, detail="Curve Set not found")
+    """
+    Head curves in the org passing within `tolerance` (relative) of the duty
+    point, closest first. `flow` and `head` are in `units` (default gpm/ft),
+    as are the returned heads; curve sets in any units are compared. Scans
+    every fit at once from the curve store snapshot.
+    """
+    flow_factor, head_factor = to_si(target_units, "flow"), to_si(target_units, "head")
+    library = curve_store.library(session, org.id)
+    indices, heads, deviations = library.duty_point(flow * flow_factor, head * head_factor, tolerance)
+    indices, heads, deviations = indices[:limit], heads[:limit] / head_factor, deviations[:limit]
 
-    # Check ownership via pump
-    if curve_set.pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Curve Set not found")
+    columns = library.arrays
+    return {
+        "units": {"flow": unit_for(target_units, "flow"), "head": unit_for(target_units, "head")},
+        "results": [
+            {"series_id": sid, "curve_set_id": cs_id, "pump_id": pump_id, "head": h, "deviation": d}
+            for sid, cs_id, pump_id, h, d in zip(
+                columns["series_id"][indices].tolist(), columns["curve_set_id"][indices].tolist(),
+                columns["pump_id"][indices].tolist(), heads.tolist(), deviations.tolist()
+            )
+        ],
+    }
 
-    return curve_set
+@router.get(
+    "/{curve_set_id}",
+    response_model=CurveSetReadWithSeries,
+    responses={200: {"description": "With `points=columnar`, series points are returned as CurveSetReadWithColumnarSeries."}}
+)
+def read_curve_set(
+    curve_set_id: int,
+    request: Request,
+    response: Response,
+    points: PointsFormat = Query(PointsFormat.objects),
+    max_points: Optional[int] = Query(None, ge=4, le=100000),
+    target_units: Optional[Dict[str, str]] = Depends(get_target_units),
+    session: Session = Depends(get_session),
+    org: ActiveOrg = Depends(get_active_org)
+):
+    """
+    Returns the curve set with all series. `points=columnar` returns each
+    series' points as parallel flow/value arrays instead of point objects.
+    `units` converts points, fit coefficients and ranges to SI, US or custom
+    units; the response `units` field names the units used. `max_points`
+    decimates each series for plotting (min/max per bucket, see
+    curves.decimation) and adds its full `point_count`.
+    """
+    curve_set = owned_curve_set(session, curve_set_id, org.id)
+
+    # Series/point writes touch the curve set, so its revision covers the whole graph
+    base_variant = f"{points.value}-max{max_points}" if max_points else points.value
+    validators = CacheValidators.for_object("curveset", curve_set, variant=_variant(base_variant, target_units))
+    if validators.matches(request):
+        return validators.not_modified()
+
+    if max_points:
+        payload = _decimated_curve_set(session, curve_set, points == PointsFormat.columnar, max_points)
+    elif points == PointsFormat.columnar:
+        payload = _columnar_curve_set(session, curve_set)
+    elif target_units:
+        payload = CurveSetReadWithSeries.model_validate(curve_set).model_dump(mode="json")
+    else:
+        validators.apply(response)
+        return curve_set
+
+    if target_units:
+        _convert_or_400(convert_curve_set, payload, target_units)
+    payload_response = FastJSONResponse(payload)
+    validators.apply(payload_response)
+    return payload_response
+
+def _variant(base: str, target_units: Optional[Dict[str, str]]) -> str:
+    if not target_units:
+        return base
+    return f"{base}-{units_key(target_units)}"
+
+def _convert_or_400(convert, *args):
+    # Curve sets can hold unit labels the registry does not know
+    try:
+        return convert(*args)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _point_columns(session: Session, series_ids: List[int]) -> Dict[int, CurvePointColumns]:
+    """
+    Loads flow/value columns for the given series in one query, skipping ORM
+    object construction for the points.
+    """
+    columns = {series_id: CurvePointColumns() for series_id in series_ids}
+    if not series_ids:
+        return columns
+    rows = session.exec(
+        select(CurvePoint.series_id, CurvePoint.flow, CurvePoint.value)
+        .where(CurvePoint.series_id.in_(series_ids))
+        .order_by(CurvePoint.series_id, CurvePoint.sequence)
+    )
+    for series_id, flow, value in rows:
+        target = columns[series_id]
+        target.flow.append(flow)
+        target.value.append(value)
+    return columns
+
+def _columnar_curve_set(session: Session, curve_set: CurveSet) -> Dict[str, Any]:
+    series_list = session.exec(select(CurveSeries).where(CurveSeries.curve_set_id == curve_set.id)).all()
+    columns = _point_columns(session, [s.id for s in series_list])
+
+    payload = CurveSetRead.model_validate(curve_set).model_dump(mode="json")
+    payload["series"] = []
+    for s in series_list:
+        item = CurveSeriesReadBase.model_validate(s).model_dump(mode="json")
+        item["points"] = {"flow": columns[s.id].flow, "value": columns[s.id].value}
+        payload["series"].append(item)
+    return payload
+
+def _decimated_curve_set(session: Session, curve_set: CurveSet, columnar: bool, max_points: int) -> Dict[str, Any]:
+    """
+    Curve set payload with each series' points decimated to max_points.
+    Decimated points are cached per series fit_token (not id and revision:
+    a replaced series can get both back); only series missing from the
+    cache have their points loaded.
+    """
+    series_list = session.exec(select(CurveSeries).where(CurveSeries.curve_set_id == curve_set.id)).all()
+    keys = {s.id: (s.id, s.fit_token, max_points, columnar) for s in series_list}
+    decimated = {series_id: decimation.cache.get(key) for series_id, key in keys.items()}
+
+    missing = [series_id for series_id, entry in decimated.items() if entry is None]
+    if missing:
+        import numpy as np
+
+        rows: Dict[int, List[Tuple[int, float, float, int]]] = {series_id: [] for series_id in missing}
+        for point in session.exec(
+            select(CurvePoint.series_id, CurvePoint.id, CurvePoint.flow, CurvePoint.value, CurvePoint.sequence)
+            .where(CurvePoint.series_id.in_(missing))
+            .order_by(CurvePoint.series_id, CurvePoint.sequence)
+        ):
+            rows[point[0]].append(point[1:])
+        for series_id in missing:
+            series_rows = rows[series_id]
+            keep = minmax_indices(np.fromiter((r[2] for r in series_rows), float, len(series_rows)), max_points).tolist()
+            kept = [series_rows[i] for i in keep]
+            if columnar:
+                points = {"flow": [r[1] for r in kept], "value": [r[2] for r in kept]}
+            else:
+                points = [{"series_id": series_id, "flow": r[1], "value": r[2], "sequence": r[3], "id": r[0]} for r in kept]
+            decimated[series_id] = (points, len(series_rows))
+            decimation.cache.put(keys[series_id], decimated[series_id])
+
+    payload = CurveSetRead.model_validate(curve_set).model_dump(mode="json")
+    payload["series"] = []
+    for s in series_list:
+        points, total = decimated[s.id]
+        item = CurveSeriesReadBase.model_validate(s).model_dump(mode="json")
+        # Copies: unit conversion rewrites the payload in place
+        item["points"] = dict(points) if columnar else [dict(p) for p in points]
+        item["point_count"] = total
+        payload["series"].append(item)
+    return payload
 
 @router.patch("/{curve_set_id}", response_model=CurveSetRead)
 def update_curve_set(
     curve_set_id: int,
     curve_set_update: CurveSetUpdate,
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org),
+    org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
 ):
-    db_curve_set = session.get(CurveSet, curve_set_id)
-    if not db_curve_set:
-        raise HTTPException(status_code=404, detail="Curve Set not found")
-
-    if db_curve_set.pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Curve Set not found")
+    db_curve_set = owned_curve_set(session, curve_set_id, org.id)
 
     curve_set_data = curve_set_update.model_dump(exclude_unset=True)
     db_curve_set.sqlmodel_update(curve_set_data)
+    touch(db_curve_set, db_curve_set.pump)
     session.add(db_curve_set)
+    # Units and rpm (meta_data) feed the specific speed
+    refresh_derived(session, db_curve_set)
     session.commit()
     session.refresh(db_curve_set)
     return db_curve_set
@@ -81,19 +233,18 @@ def update_curve_set(
 @router.delete("/{curve_set_id}")
 def delete_curve_set(
     curve_set_id: int,
+    background_tasks: BackgroundTasks,
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org),
+    org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
 ):
-    curve_set = session.get(CurveSet, curve_set_id)
-    if not curve_set:
-        raise HTTPException(status_code=404, detail="Curve Set not found")
-
-    if curve_set.pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Curve Set not found")
+    curve_set = owned_curve_set(session, curve_set_id, org.id)
 
-    session.delete(curve_set)
+    touch(curve_set.pump)
+    tombstone_curve_set(session, curve_set)
+    curve_store.mark_changed(session, org.id)
     session.commit()
+    background_tasks.add_task(purge_deleted, session.get_bind())
     return {"ok": True}
 
 # Validation Endpoint - Public/Stateless?
@@ -115,22 +266,21 @@ def create_curve_series(
     curve_set_id: int,
     series_data: CurveSeriesCreate,
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org),
+    org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
 ):
-    curve_set = session.get(CurveSet, curve_set_id)
-    if not curve_set:
-        raise HTTPException(status_code=404, detail="Curve Set not found")
+    # Body parsing, request validation and dependencies ran before this point
+    mark("parse")
 
-    if curve_set.pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Curve Set not found")
+    curve_set = owned_curve_set(session, curve_set_id, org.id)
 
     if series_data.curve_set_id != curve_set_id:
          raise HTTPException(status_code=400, detail="Curve Set ID mismatch")
 
     # 1. Validate Points
-    raw_points = [p.model_dump() for p in series_data.points]
-    validation_res = validate_points(series_data.type, raw_points)
+    with stage("validate"):
+        raw_points = [p.model_dump() for p in series_data.points]
+        validation_res = validate_points(series_data.type, raw_points)
 
     if validation_res.blocking_errors:
         raise HTTPException(status_code=400, detail={"message": "Validation failed", "errors": validation_res.blocking_errors})
@@ -138,85 +288,279 @@ def create_curve_series(
     # Use normalized points
     normalized_points = validation_res.normalized_points
 
-    # 2. Check for existing series
-    existing_series = session.exec(
-        select(CurveSeries)
-        .where(CurveSeries.curve_set_id == curve_set_id)
-        .where(CurveSeries.type == series_data.type)
-    ).first()
+    with stage("persist"):
+        # 2. Check for existing series
+        existing_series = session.exec(
+            select(CurveSeries)
+            .where(CurveSeries.curve_set_id == curve_set_id)
+            .where(CurveSeries.type == series_data.type)
+        ).first()
 
-    if existing_series:
-        session.delete(existing_series)
-        session.commit()
+        if existing_series:
+            delete_series(session, [existing_series.id])
+            session.commit()
 
     # 3. Fit Curve
-    fit_model_type, fit_params, fit_quality, data_range = fit_curve(series_data.type, normalized_points)
-
-    # 4. Create Series
-    db_series = CurveSeries(
-        curve_set_id=curve_set_id,
-        type=series_data.type,
-        validation_warnings=validation_res.warnings,
-        fit_model_type=fit_model_type,
-        fit_params=fit_params,
-        fit_quality=fit_quality,
-        data_range=data_range
-    )
-    session.add(db_series)
-    session.commit()
-    session.refresh(db_series)
-
-    # Add points
-    for i, pt in enumerate(normalized_points):
-        db_point = CurvePoint(
-            series_id=db_series.id,
-            flow=pt["flow"],
-            value=pt["value"],
-            sequence=i
+    with stage("fit"):
+        fit_model_type, fit_params, fit_quality, data_range = fit_curve(series_data.type, normalized_points)
+        fit_stats = moment_stats(series_data.type, normalized_points)
+
+    with stage("persist"):
+        # 4. Create Series
+        db_series = CurveSeries(
+            curve_set_id=curve_set_id,
+            org_id=curve_set.org_id,
+            type=series_data.type,
+            validation_warnings=validation_res.warnings,
+            fit_model_type=fit_model_type,
+            fit_params=fit_params,
+            fit_quality=fit_quality,
+            data_range=data_range,
+            fit_stats=fit_stats
         )
-        session.add(db_point)
+        session.add(db_series)
+        touch(curve_set, curve_set.pump)
+        session.commit()
+        session.refresh(db_series)
+
+        # Add points
+        for i, pt in enumerate(normalized_points):
+            db_point = CurvePoint(
+                series_id=db_series.id,
+                flow=pt["flow"],
+                value=pt["value"],
+                sequence=i
+            )
+            session.add(db_point)
+
+        refresh_derived(session, curve_set)
+        session.commit()
+        session.refresh(db_series)
+    return db_series
+
+DERIVED_SERIES_READ_ONLY = "Derived series have no points; they are recomputed when their source fits change."
+
+@router.post("/{curve_set_id}/series/derived-power", response_model=CurveSeriesRead)
+def create_derived_power_series(
+    curve_set_id: int,
+    session: Session = Depends(get_session),
+    org: ActiveOrg = Depends(get_active_org),
+    role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
+):
+    """
+    Adds a power series computed from the head and efficiency fits
+    (P = rho*g*Q*H/eta, in the curve set's units; `specific_gravity` in the
+    curve set meta_data defaults to 1). It stores no points and is kept up
+    to date whenever head or efficiency is refitted.
+    """
+    curve_set = owned_curve_set(session, curve_set_id, org.id)
 
+    series = session.exec(
+        select(CurveSeries).where(CurveSeries.curve_set_id == curve_set_id, CurveSeries.type == SeriesType.power)
+    ).first()
+    if series is not None and not series.is_derived:
+        raise HTTPException(status_code=409, detail="Curve set already has a measured power series")
+    if series is None:
+        series = CurveSeries(curve_set_id=curve_set_id, org_id=curve_set.org_id, type=SeriesType.power, is_derived=True, validation_warnings=[])
+
+    try:
+        update_derived_power(session, curve_set, series, force=True)
+    except ValueError as e:
+        session.rollback()
+        raise HTTPException(status_code=400, detail={"message": "Cannot derive power", "errors": [
+            {"code": "DERIVE_FAILED", "message": str(e), "severity": "error"}
+        ]})
+
+    touch(curve_set, curve_set.pump)
+    refresh_derived(session, curve_set)
     session.commit()
-    session.refresh(db_series)
-    return db_series
+    session.refresh(series)
+    return series
 
 @router.delete("/series/{series_id}")
 def delete_curve_series(
     series_id: int,
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org),
+    org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
 ):
-    series = session.get(CurveSeries, series_id)
-    if not series:
-        raise HTTPException(status_code=404, detail="Series not found")
-
-    # Ownership check
-    if series.curve_set.pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Series not found")
+    series = owned_series(session, series_id, org.id)
 
-    session.delete(series)
+    # Pump detail embeds curve_set.updated_at, so the pump revision moves too
+    curve_set = series.curve_set
+    touch(curve_set, curve_set.pump)
+    delete_series(session, [series.id])
+    refresh_derived(session, curve_set)
     session.commit()
     return {"ok": True}
 
+# Incremental point edits
+
+@router.patch("/series/{series_id}/points", response_model=CurveSeriesReadBase)
+def patch_curve_points(
+    series_id: int,
+    patch: CurvePointsPatch,
+    session: Session = Depends(get_session),
+    org: ActiveOrg = Depends(get_active_org),
+    role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
+):
+    """
+    Appends, modifies or removes individual points, then refits from the
+    stored least-squares statistics (O(degree^2)) instead of reloading and
+    refitting every point. Only the neighbourhood of each changed point is
+    validated.
+    """
+    series = owned_series(session, series_id, org.id)
+
+    if series.is_derived:
+        raise HTTPException(status_code=400, detail=DERIVED_SERIES_READ_ONLY)
+
+    stats = series.fit_stats
+    if stats is None:
+        # Series stored before statistics existed: build them once
+        stats = moment_stats(series.type, [{"flow": p.flow, "value": p.value} for p in series.points])
+
+    target_ids = [u.id for u in patch.update] + list(patch.remove)
+    if len(set(target_ids)) != len(target_ids):
+        raise HTTPException(status_code=400, detail="A point can only be updated or removed once per request")
+    existing = {}
+    if target_ids:
+        existing = {p.id: p for p in session.exec(
+            select(CurvePoint).where(CurvePoint.series_id == series_id, CurvePoint.id.in_(target_ids))
+        ).all()}
+    missing = [i for i in target_ids if i not in existing]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Points not found in series: {missing}")
+
+    added, removed, changed = [], [], []
+
+    for point_id in patch.remove:
+        point = existing[point_id]
+        removed.append((point.flow, point.value))
+        session.delete(point)
+        session.flush()
+        _shift_sequences(session, series_id, point.sequence + 1, -1)
+
+    for change in patch.update:
+        point = existing[change.id]
+        removed.append((point.flow, point.value))
+        if change.value is not None:
+            point.value = change.value
+        if change.flow is not None and change.flow != point.flow:
+            _shift_sequences(session, series_id, point.sequence + 1, -1, exclude_id=point.id)
+            point.flow = change.flow
+            point.sequence = _insert_position(session, series_id, point.flow, exclude_id=point.id)
+            _shift_sequences(session, series_id, point.sequence, 1, exclude_id=point.id)
+        added.append((point.flow, point.value))
+        changed.append(point)
+
+    for new_point in patch.append:
+        position = _insert_position(session, series_id, new_point.flow)
+        _shift_sequences(session, series_id, position, 1)
+        point = CurvePoint(series_id=series_id, flow=new_point.flow, value=new_point.value, sequence=position)
+        session.add(point)
+        added.append((point.flow, point.value))
+        changed.append(point)
+
+    session.flush()
+    stats = update_moment_stats(stats, added=added, removed=removed)
+    if stats["sx"][0] < 1.5:
+        raise HTTPException(status_code=400, detail={"message": "Validation failed", "errors": [{
+            "code": "TOO_FEW_POINTS", "message": "At least 2 points are required.", "severity": "error"
+        }]})
+
+    warnings = _validate_neighbourhood(session, series, changed)
+
+    # Range: extend cheaply, only rescan when an extreme point moved or left
+    data_range = dict(series.data_range or {})
+    old_flows = {flow for flow, _ in removed}
+    if not data_range or data_range.get("min_q") in old_flows or data_range.get("max_q") in old_flows:
+        min_q, max_q = session.exec(
+            select(func.min(CurvePoint.flow), func.max(CurvePoint.flow)).where(CurvePoint.series_id == series_id)
+        ).one()
+        data_range = {"min_q": float(min_q), "max_q": float(max_q)}
+    else:
+        new_flows = [flow for flow, _ in added]
+        if new_flows:
+            data_range = {"min_q": min(data_range["min_q"], *new_flows), "max_q": max(data_range["max_q"], *new_flows)}
+
+    fit_model_type, fit_params, fit_quality = fit_from_moments(stats)
+    series.fit_model_type = fit_model_type
+    series.fit_params = fit_params
+    series.fit_quality = fit_quality
+    series.fit_stats = stats
+    series.data_range = data_range
+    # Replace, not append: earlier warnings about these points are re-checked above.
+    # Warnings stored with indices only (older rows) cannot be matched to points
+    # once sequences shift, so they are dropped too.
+    touched = old_flows | {point.flow for point in changed}
+    kept = [w for w in series.validation_warnings or []
+            if not touched.intersection(w.get("flows", ())) and not ("indices" in w and "flows" not in w)]
+    merged = kept + [w for w in warnings if w not in kept]
+    if merged != (series.validation_warnings or []):
+        series.validation_warnings = merged
+    touch(series, series.curve_set, series.curve_set.pump)
+
+    session.add(series)
+    refresh_derived(session, series.curve_set)
+    session.commit()
+    session.refresh(series)
+    return series
+
+def _insert_position(session: Session, series_id: int, flow: float, exclude_id: Optional[int] = None) -> int:
+    stmt = select(func.count()).select_from(CurvePoint).where(CurvePoint.series_id == series_id, CurvePoint.flow < flow)
+    if exclude_id is not None:
+        stmt = stmt.where(CurvePoint.id != exclude_id)
+    return session.exec(stmt).one()
+
+def _shift_sequences(session: Session, series_id: int, from_sequence: int, delta: int, exclude_id: Optional[int] = None):
+    stmt = update(CurvePoint).where(CurvePoint.series_id == series_id, CurvePoint.sequence >= from_sequence)
+    if exclude_id is not None:
+        stmt = stmt.where(CurvePoint.id != exclude_id)
+    session.execute(stmt.values(sequence=CurvePoint.sequence + delta))
+
+def _validate_neighbourhood(session: Session, series: CurveSeries, changed: List[CurvePoint]) -> List[Dict[str, Any]]:
+    """
+    Runs validate_points on each changed point plus its immediate neighbours.
+    Raises 400 on blocking errors. A duplicate flow is blocking here: averaging
+    would silently rewrite an existing sample.
+    """
+    if not changed:
+        return []
+    sequences = {seq for p in changed for seq in (p.sequence - 1, p.sequence, p.sequence + 1)}
+    window = session.exec(
+        select(CurvePoint.flow, CurvePoint.value)
+        .where(CurvePoint.series_id == series.id, CurvePoint.sequence.in_(sequences))
+        .order_by(CurvePoint.sequence)
+    ).all()
+    result = validate_points(series.type, [{"flow": flow, "value": value} for flow, value in window])
+
+    errors = [e for e in result.blocking_errors if e["code"] != "TOO_FEW_POINTS"]
+    errors += [dict(w, severity="error", message=w["message"].replace("Averaging values.", "Update the existing point instead."))
+               for w in result.warnings if w["code"] == "DUPLICATE_FLOW"]
+    if errors:
+        raise HTTPException(status_code=400, detail={"message": "Validation failed", "errors": errors})
+
+    # Window-relative indices are meaningless to the caller; the flows identify the points
+    return [{k: v for k, v in w.items() if k != "indices"} for w in result.warnings
+            if w["code"] not in ("NARROW_RANGE", "POWER_DECREASING")] # Whole-series checks
+
 # Fit and Evaluation Endpoints
 
 @router.post("/series/{series_id}/fit")
 def fit_series(
     series_id: int,
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org),
+    org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
 ):
     """
     Manually re-fit a series.
     """
-    series = session.get(CurveSeries, series_id)
-    if not series:
-        raise HTTPException(status_code=404, detail="Series not found")
+    series = owned_series(session, series_id, org.id)
 
-    if series.curve_set.pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Series not found")
+    if series.is_derived:
+        raise HTTPException(status_code=400, detail=DERIVED_SERIES_READ_ONLY)
 
     # Get points
     points = [{"flow": p.flow, "value": p.value} for p in series.points]
@@ -227,8 +571,11 @@ def fit_series(
     series.fit_params = fit_params
     series.fit_quality = fit_quality
     series.data_range = data_range
+    series.fit_stats = moment_stats(series.type, points)
+    touch(series, series.curve_set, series.curve_set.pump)
 
     session.add(series)
+    refresh_derived(session, series.curve_set)
     session.commit()
     session.refresh(series)
 
@@ -244,25 +591,33 @@ def evaluate_series(
     series_id: int,
     flow: float = Body(..., embed=True),
     head_optional: Optional[float] = Body(None, embed=True),
+    intervals: bool = Query(False),
+    target_units: Optional[Dict[str, str]] = Depends(get_target_units),
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org)
+    org: ActiveOrg = Depends(get_active_org)
 ):
-    series = session.get(CurveSeries, series_id)
-    if not series:
-        raise HTTPException(status_code=404, detail="Series not found")
-
-    if series.curve_set.pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Series not found")
-
-    points = [{"flow": p.flow, "value": p.value} for p in series.points]
-
-    result = evaluate_curve_at_point(
-        series.fit_model_type,
-        series.fit_params,
-        series.data_range or {}, # Handle None
-        flow,
-        points
-    )
+    """
+    Predicts the series value at `flow`. With `units`, `flow`, `head_optional`
+    and the results are all in the requested units. With `intervals=true`,
+    also returns the bootstrap prediction interval (None when the series has
+    no bands, e.g. derived or too few points).
+    """
+    # Bands need the ORM row (derived flag, fit_token); everything else can come from the curve store
+    series, units = _readable_series(session, org, series_id, use_store=not intervals)
+    flow_factor, value_factor = _series_factors(units, series, target_units)
+
+    points = None if _has_fit(series) else [{"flow": p.flow, "value": p.value} for p in series.points]
+
+    with stage("evaluate"):
+        result = evaluate_curve_at_point(
+            series.fit_model_type,
+            series.fit_params,
+            series.data_range or {}, # Handle None
+            flow / flow_factor,
+            points
+        )
+    if result["predicted_value"] is not None:
+        result["predicted_value"] *= value_factor
 
     response = {
         "predictions": {},
@@ -274,6 +629,17 @@ def evaluate_series(
     # Store prediction in the appropriate field based on series type
     response["predictions"][series.type.value] = result["predicted_value"]
 
+    if intervals:
+        response["intervals"] = {series.type.value: None}
+        bands = fit_bands(session, series) if result["predicted_value"] is not None else None
+        if bands:
+            lower, upper = band_offsets(bands, flow / flow_factor)
+            response["intervals"][series.type.value] = {
+                "lower": result["predicted_value"] + float(lower) * value_factor,
+                "upper": result["predicted_value"] + float(upper) * value_factor,
+                "level": bands["level"],
+            }
+
     # Duty point check (specifically for Head)
     if head_optional is not None and series.type == SeriesType.head and result["predicted_value"] is not None:
          pred = result["predicted_value"]
@@ -283,4 +649,70 @@ def evaluate_series(
              "pass": abs(residual) <= 0.05 * pred # Default 5% tolerance
          }
 
+    if target_units:
+        response["units"] = converted_units(units, target_units)
+    return response
+
+def _readable_series(session: Session, org: ActiveOrg, series_id: int, use_store: bool = True):
+    """
+    (series, curve set units) for read-only endpoints. Comes from the org's
+    curve store snapshot when enabled (no ORM load, points are views of the
+    shared mapping); otherwise, or if the snapshot is being rebuilt, from
+    the database. 404 if the series is not in the org.
+    """
+    stored = curve_store.find_series(session, org.id, series_id) if use_store else None
+    if stored is not None:
+        return stored, stored.units
+    series = owned_series(session, series_id, org.id)
+    return series, series.curve_set.units
+
+def _has_fit(series) -> bool:
+    return (series.fit_model_type or "").startswith("polynomial") and bool((series.fit_params or {}).get("coeffs"))
+
+def _series_factors(units: Optional[Dict[str, str]], series, target_units: Optional[Dict[str, str]]):
+    """
+    (flow, value) multipliers from the series' stored units to the target.
+    """
+    if not target_units:
+        return 1.0, 1.0
+    factors = _convert_or_400(conversion_factors, units, target_units)
+    return factors["flow"], factors[SERIES_QUANTITY[series.type.value]]
+
+@router.get("/series/{series_id}/sample")
+def sample_series(
+    series_id: int,
+    n: int = Query(50, ge=2, le=10000),
+    intervals: bool = Query(False),
+    target_units: Optional[Dict[str, str]] = Depends(get_target_units),
+    session: Session = Depends(get_session),
+    org: ActiveOrg = Depends(get_active_org)
+):
+    """
+    The fitted curve at `n` evenly spaced flows across its data range, as
+    parallel flow/value arrays (for plotting and comparing pumps). Series
+    without a usable fit are interpolated from their points. With
+    `intervals=true`, adds lower/upper prediction band arrays (None without
+    bands).
+    """
+    series, units = _readable_series(session, org, series_id, use_store=not intervals)
+    flow_factor, value_factor = _series_factors(units, series, target_units)
+    has_fit = _has_fit(series)
+    points = None if has_fit else [{"flow": p.flow, "value": p.value} for p in series.points]
+    flows, values = sample_curve(series.fit_model_type, series.fit_params, series.data_range, n, points)
+
+    response = {
+        "series_id": series.id,
+        "type": series.type,
+        "fitted": has_fit,
+        "units": converted_units(units, target_units or {}),
+        "flow": (flows * flow_factor).tolist(),
+        "value": (values * value_factor).tolist(),
+    }
+    if intervals:
+        bands = fit_bands(session, series) if has_fit else None
+        response["lower"] = response["upper"] = None
+        if bands:
+            lower, upper = band_offsets(bands, flows)
+            response["lower"] = ((values + lower) * value_factor).tolist()
+            response["upper"] = ((values + upper) * value_factor).tolist()
     return response
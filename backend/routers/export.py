@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+from backend.database import get_session
+from backend.dependencies import ActiveOrg, get_active_org
+from backend import export
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+@router.get("/{table}")
+def export_table(
+    table: str,
+    format: str = Query("parquet", pattern="^(parquet|arrow)$"),
+    session: Session = Depends(get_session),
+    org: ActiveOrg = Depends(get_active_org)
+):
+    """
+    Streams one table of the active org's curve library (pumps, curve_sets,
+    series or points) as a Parquet file or an Arrow IPC stream.
+    """
+    if table not in export.EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table. Expected one of: {', '.join(export.EXPORT_TABLES)}")
+
+    try:
+        export.table_schema(table)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    # The request session is closed before the body streams, so the generator
+    # opens its own short-lived sessions on the same engine.
+    bind = session.get_bind()
+    extension = "parquet" if format == "parquet" else "arrows"
+    return StreamingResponse(
+        export.stream_table(bind, org.id, table, format),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'}
+    )
@@ -0,0 +1,23 @@
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends
+from sqlmodel import Session
+from backend.database import get_session
+from backend.models import UserRole
+from backend.dependencies import RequireRole
+from backend import maintenance
+
+router = APIRouter(prefix="/maintenance", tags=["maintenance"])
+
+@router.get("/jobs")
+def read_maintenance_jobs(
+    session: Session = Depends(get_session),
+    role: UserRole = Depends(RequireRole({UserRole.admin}))
+) -> List[Dict[str, Any]]:
+    """
+    Interval, budget and last run (start, finish, duration, status, result)
+    of each scheduled maintenance job, across all workers. Deployment-wide,
+    so any org's admin may read it: job results hold counts and error types
+    only, never org ids or other tenant data, and lease holders (host names)
+    are redacted.
+    """
+    return maintenance.status(session.get_bind(), redact=True)
@@ -6,10 +6,10 @@ import uuid
 
 from backend.database import get_session
 from backend.models import (
-    User, UserRead, Organization, OrganizationRead, Membership, MembershipRead, UserRole, Invite
+    User, UserRead, OrganizationRead, Membership, MembershipRead, UserRole, Invite
 )
-from backend.dependencies import get_current_user, get_active_org, RequireRole, get_current_role
-from backend.auth_utils import get_password_hash
+from backend.dependencies import ActiveOrg, get_current_user, get_active_org, RequireRole, get_current_role, revoke_tokens
+from backend.auth_utils import get_password_hash, create_user_token
 
 router = APIRouter(prefix="/orgs", tags=["orgs"])
 
@@ -17,7 +17,7 @@ router = APIRouter(prefix="/orgs", tags=["orgs"])
 def read_members(
     org_id: int,
     session: Session = Depends(get_session),
-    active_org: Organization = Depends(get_active_org),
+    active_org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.admin}))
 ):
     if active_org.id != org_id:
@@ -32,7 +32,7 @@ def update_member_role(
     user_id: int,
     role_update: UserRole = Body(..., embed=True),
     session: Session = Depends(get_session),
-    active_org: Organization = Depends(get_active_org),
+    active_org: ActiveOrg = Depends(get_active_org),
     current_role: UserRole = Depends(RequireRole({UserRole.admin})),
     current_user: User = Depends(get_current_user)
 ):
@@ -54,6 +54,7 @@ def update_member_role(
 
     membership.role = role_update
     session.add(membership)
+    revoke_tokens(session, user_id) # Their tokens carry the old role
     session.commit()
     session.refresh(membership)
     return membership
@@ -63,7 +64,7 @@ def remove_member(
     org_id: int,
     user_id: int,
     session: Session = Depends(get_session),
-    active_org: Organization = Depends(get_active_org),
+    active_org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.admin}))
 ):
     if active_org.id != org_id:
@@ -79,6 +80,7 @@ def remove_member(
         raise HTTPException(status_code=404, detail="Membership not found")
 
     session.delete(membership)
+    revoke_tokens(session, user_id)
     session.commit()
     return {"ok": True}
 
@@ -88,7 +90,7 @@ def create_invite(
     email: str = Body(..., embed=True),
     role: UserRole = Body(..., embed=True),
     session: Session = Depends(get_session),
-    active_org: Organization = Depends(get_active_org),
+    active_org: ActiveOrg = Depends(get_active_org),
     current_role: UserRole = Depends(RequireRole({UserRole.admin}))
 ):
     if active_org.id != org_id:
@@ -142,6 +144,10 @@ def redeem_invite(
     )
     session.add(membership)
     session.delete(invite) # Consume invite
+    revoke_tokens(session, user.id)
     session.commit()
 
-    return {"ok": True, "org_id": invite.org_id}
+    # The caller's token lacks the new org; hand out one that has it
+    session.refresh(user)
+    memberships = session.exec(select(Membership).where(Membership.user_id == user.id)).all()
+    return {"ok": True, "org_id": invite.org_id, "access_token": create_user_token(user, memberships)}
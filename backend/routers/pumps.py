@@ -1,18 +1,34 @@
+import os
+import tempfile
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
 from backend.database import get_session
-from backend.models import Pump, PumpCreate, PumpRead, PumpReadWithCurveSets, PumpUpdate, Organization, UserRole, CurveSet, CurveSetRead
-from backend.dependencies import get_active_org, RequireRole
+from backend.models import Pump, PumpCreate, PumpRead, PumpReadWithCurveSets, PumpReadWithCharacteristics, PumpUpdate, PumpCreateNested, UserRole, CurveSet, CurveSetRead, CurveSetCharacteristics
+from backend.dependencies import ActiveOrg, get_active_org, RequireRole, get_target_units, owned_pump
+from backend.conditional import CacheValidators, touch
+from backend.responses import FastJSONResponse
+from backend.catalog_import import import_catalog, prepare_pump, insert_prepared, SeriesValidationError
+from backend import idempotency
+from backend.purge import tombstone_pump, purge_deleted
+from backend.characteristics import refresh_derived
+from backend import curve_store
+from backend.curves.characteristics import CHARACTERISTIC_FIELDS, sort_field
+from backend.curves.units import convert_curve_set, units_key
 from datetime import datetime
 
-router = APIRouter(prefix="/pumps", tags=["pumps"])
+router = APIRouter(prefix="/pumps", tags=["pumps"], default_response_class=FastJSONResponse)
 
 @router.post("/", response_model=PumpRead)
 def create_pump(
     pump: PumpCreate,
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org),
+    org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
 ):
     # Using model_validate instead of from_orm
@@ -30,50 +46,186 @@ def create_pump(
     session.refresh(db_pump)
     return db_pump
 
-@router.get("/", response_model=List[PumpRead])
+@router.post("/composite", response_model=PumpReadWithCurveSets, status_code=status.HTTP_201_CREATED)
+def create_pump_composite(
+    document: PumpCreateNested,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    session: Session = Depends(get_session),
+    org: ActiveOrg = Depends(get_active_org),
+    role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
+):
+    """
+    Creates a pump with its curve sets and series in one request. Every
+    series is validated and fitted before anything is written, then all
+    rows are bulk-inserted in a single transaction: either the whole pump
+    is created or nothing is. With an `Idempotency-Key` header, a retry
+    returns the first attempt's response (`Idempotent-Replayed: true`).
+    """
+    body_hash = idempotency.request_hash(document.model_dump(mode="json"))
+    if idempotency_key:
+        replay = idempotency.lookup(session, org.id, idempotency_key, body_hash)
+        if replay is not None:
+            return _replayed(replay)
+
+    try:
+        prepared = prepare_pump(document)
+    except SeriesValidationError as e:
+        raise HTTPException(status_code=400, detail={"message": "Validation failed", "errors": e.errors})
+
+    pump_id = insert_prepared(session, org.id, [prepared])[0]["pump_id"]
+    payload = PumpReadWithCurveSets.model_validate(session.get(Pump, pump_id)).model_dump(mode="json")
+    if idempotency_key:
+        idempotency.record(session, org.id, idempotency_key, body_hash, payload)
+    curve_store.mark_changed(session, org.id)
+    try:
+        session.commit()
+    except IntegrityError:
+        # A concurrent attempt with the same key committed first
+        session.rollback()
+        if not idempotency_key:
+            raise
+        replay = idempotency.lookup(session, org.id, idempotency_key, body_hash)
+        if replay is None:
+            raise
+        return _replayed(replay)
+    return FastJSONResponse(payload, status_code=status.HTTP_201_CREATED)
+
+def _replayed(payload: Dict[str, Any]) -> FastJSONResponse:
+    return FastJSONResponse(payload, status_code=status.HTTP_201_CREATED, headers={"Idempotent-Replayed": "true"})
+
+# Uploads up to this size stay in memory; larger ones spill to a temp file
+IMPORT_SPOOL_MAX_MEMORY = int(os.getenv("IMPORT_SPOOL_MAX_MEMORY", str(16 * 1024 * 1024)))
+
+@router.post("/import")
+async def import_pumps(
+    request: Request,
+    session: Session = Depends(get_session),
+    org: ActiveOrg = Depends(get_active_org),
+    role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
+):
+    """
+    Bulk catalog import. The body is NDJSON, one PumpCreateNested document
+    (pump with nested curve sets and series points) per line. Responds with
+    an NDJSON stream: one result per input line, then a summary line.
+    """
+    # The body has to be consumed before the response starts streaming
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MAX_MEMORY)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+
+    bind = session.get_bind()
+
+    def results():
+        try:
+            yield from import_catalog(bind, org.id, spool)
+        finally:
+            spool.close()
+
+    return StreamingResponse(iterate_in_threadpool(results()), media_type="application/x-ndjson")
+
+PUMP_SORT_PATTERN = "^-?(" + "|".join(CHARACTERISTIC_FIELDS) + ")$"
+
+@router.get("/", response_model=List[PumpReadWithCharacteristics])
 def read_pumps(
     skip: int = 0,
     limit: int = 100,
+    sort: Optional[str] = Query(None, pattern=PUMP_SORT_PATTERN, description="Characteristic to sort by, e.g. bep_flow or -bep_efficiency"),
+    target_units: Optional[Dict[str, str]] = Depends(get_target_units),
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org)
+    org: ActiveOrg = Depends(get_active_org)
 ):
-    pumps = session.exec(
-        select(Pump)
-        .where(Pump.org_id == org.id)
-        .offset(skip)
-        .limit(limit)
-    ).all()
-    return pumps
+    """
+    Lists the org's pumps with each curve set's characteristics (no points).
+    Sorting compares SI values, so curve sets in different units rank
+    correctly; `units` converts the returned characteristics.
+    """
+    statement = (
+        select(Pump).where(Pump.org_id == org.id, Pump.deleted_at.is_(None))
+        .options(selectinload(Pump.curve_sets))
+    )
+    if sort:
+        descending = sort.startswith("-")
+        column = getattr(CurveSetCharacteristics, sort_field(sort.lstrip("-")))
+        # A pump ranks by its best live curve set in the requested direction;
+        # pumps without a value sort last either way.
+        aggregate = func.max(column) if descending else func.min(column)
+        keys = (
+            select(CurveSetCharacteristics.pump_id, aggregate.label("sort_key"))
+            .join(CurveSet, CurveSet.id == CurveSetCharacteristics.curve_set_id)
+            .where(CurveSet.org_id == org.id, CurveSet.deleted_at.is_(None))
+            .group_by(CurveSetCharacteristics.pump_id)
+            .subquery()
+        )
+        order = keys.c.sort_key.desc() if descending else keys.c.sort_key.asc()
+        statement = statement.outerjoin(keys, keys.c.pump_id == Pump.id).order_by(order.nulls_last(), Pump.id)
+
+    pumps = session.exec(statement.offset(skip).limit(limit)).all()
+    if not target_units:
+        return pumps
+
+    payload = [PumpReadWithCharacteristics.model_validate(pump).model_dump(mode="json") for pump in pumps]
+    try:
+        for pump in payload:
+            for curve_set in pump["curve_sets"]:
+                convert_curve_set(curve_set, target_units)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(payload)
 
 @router.get("/{pump_id}", response_model=PumpReadWithCurveSets)
 def read_pump(
     pump_id: int,
+    request: Request,
+    response: Response,
+    target_units: Optional[Dict[str, str]] = Depends(get_target_units),
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org)
+    org: ActiveOrg = Depends(get_active_org)
 ):
-    pump = session.get(Pump, pump_id)
-    if not pump or pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Pump not found")
-    return pump
+    """
+    Returns the pump with its curve sets and their characteristics; `units`
+    converts the characteristics (see GET /curve-sets/{id}).
+    """
+    pump = owned_pump(session, pump_id, org.id)
+
+    # Revision covers the embedded curve set list too (curve set writes touch the pump)
+    validators = CacheValidators.for_object("pump", pump, variant=units_key(target_units) if target_units else "")
+    if validators.matches(request):
+        return validators.not_modified()
+    if not target_units:
+        validators.apply(response)
+        return pump
+
+    payload = PumpReadWithCurveSets.model_validate(pump).model_dump(mode="json")
+    try:
+        for curve_set in payload["curve_sets"]:
+            convert_curve_set(curve_set, target_units)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    payload_response = FastJSONResponse(payload)
+    validators.apply(payload_response)
+    return payload_response
 
 @router.patch("/{pump_id}", response_model=PumpRead)
 def update_pump(
     pump_id: int,
     pump_update: PumpUpdate,
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org),
+    org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
 ):
-    db_pump = session.get(Pump, pump_id)
-    if not db_pump or db_pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Pump not found")
+    db_pump = owned_pump(session, pump_id, org.id)
 
     pump_data = pump_update.model_dump(exclude_unset=True)
     for key, value in pump_data.items():
         setattr(db_pump, key, value)
 
-    db_pump.updated_at = datetime.utcnow()
+    touch(db_pump)
     session.add(db_pump)
+    if "meta_data" in pump_data:
+        # Curve sets without their own rpm fall back to the pump's
+        for curve_set in db_pump.curve_sets:
+            refresh_derived(session, curve_set)
     session.commit()
     session.refresh(db_pump)
     return db_pump
@@ -81,14 +233,16 @@ def update_pump(
 @router.delete("/{pump_id}")
 def delete_pump(
     pump_id: int,
+    background_tasks: BackgroundTasks,
     session: Session = Depends(get_session),
-    org: Organization = Depends(get_active_org),
+    org: ActiveOrg = Depends(get_active_org),
     role: UserRole = Depends(RequireRole({UserRole.editor, UserRole.admin}))
 ):
-    db_pump = session.get(Pump, pump_id)
-    if not db_pump or db_pump.org_id != org.id:
-        raise HTTPException(status_code=404, detail="Pump not found")
+    db_pump = owned_pump(session, pump_id, org.id)
 
-    session.delete(db_pump)
+    tombstone_pump(session, db_pump)
+    curve_store.mark_changed(session, org.id)
     session.commit()
+    # Points and rows are removed in batches after the response is sent
+    background_tasks.add_task(purge_deleted, session.get_bind())
     return {"ok": True}
@@ -0,0 +1,142 @@
+"""
+WebSocket duty-point sweeps: authenticate once, compile the curve set's
+models once, then evaluate every flow/head the client sends.
+
+    ws://host/curve-sets/{id}/sweep?token=<jwt>&units=SI
+
+Client messages: {"flow": 120.0, "head": 35.0, "id": 7} (head and id
+optional). Replies: {"type": "result", "id", "flow", "predictions",
+"extrapolation", "residuals", "coalesced"}, or {"type": "error", ...} for a
+bad message. When inputs arrive faster than they are answered, only the
+latest is evaluated; "coalesced" counts the ones dropped before it.
+Models are compiled at connect time; reconnect to pick up later edits.
+"""
+import asyncio
+from typing import Any, Dict, Optional, Tuple, Union
+
+import orjson
+from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect, WebSocketException, status
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import Session
+
+from backend.database import get_session
+from backend.dependencies import ActiveOrg, get_websocket_org
+from backend.models import CurveSet, SeriesType
+from backend.curves.evaluation import CompiledCurve
+from backend.curves.units import parse_units, conversion_factors, converted_units, convert_series
+
+router = APIRouter(prefix="/curve-sets", tags=["curve-sets"])
+
+def compile_curve_set(session: Session, curve_set_id: int, org_id: int,
+                      target_units: Optional[Dict[str, str]]) -> Optional[Tuple[Dict[str, CompiledCurve], Dict[str, str]]]:
+    """
+    (models by series type, units) for the org's curve set, in the target
+    units. None if the curve set is not in the org. Raises ValueError for
+    units that cannot be converted.
+    """
+    curve_set = session.get(CurveSet, curve_set_id)
+    if not curve_set or curve_set.org_id != org_id or curve_set.deleted_at is not None:
+        return None
+
+    factors = conversion_factors(curve_set.units, target_units) if target_units else None
+    models = {}
+    for series in curve_set.series:
+        has_fit = (series.fit_model_type or "").startswith("polynomial") and bool((series.fit_params or {}).get("coeffs"))
+        data = {
+            "type": series.type,
+            "fit_params": series.fit_params,
+            "data_range": series.data_range,
+            "points": None if has_fit else [{"flow": p.flow, "value": p.value} for p in series.points],
+        }
+        if factors:
+            convert_series(data, factors)
+        models[series.type.value] = CompiledCurve(series.fit_model_type, data["fit_params"], data["data_range"], data["points"])
+    return models, converted_units(curve_set.units, target_units or {})
+
+def evaluate_message(models: Dict[str, CompiledCurve], message: Dict[str, Any]) -> Dict[str, Any]:
+    flow, head = message.get("flow"), message.get("head")
+    if not isinstance(flow, (int, float)) or isinstance(flow, bool) or (head is not None and not isinstance(head, (int, float))):
+        return {"type": "error", "id": message.get("id"), "message": "Expected numeric 'flow' and optional numeric 'head'."}
+
+    predictions, extrapolation = {}, False
+    for series_type, model in models.items():
+        predictions[series_type], outside = model(flow)
+        extrapolation = extrapolation or outside
+
+    residuals = None
+    predicted_head = predictions.get(SeriesType.head.value)
+    if head is not None and predicted_head is not None:
+        residual = head - predicted_head
+        residuals = {"value": residual, "pass": abs(residual) <= 0.05 * predicted_head} # As in evaluate
+    return {"type": "result", "id": message.get("id"), "flow": flow, "predictions": predictions,
+            "extrapolation": extrapolation, "residuals": residuals}
+
+@router.websocket("/{curve_set_id}/sweep")
+async def sweep(
+    websocket: WebSocket,
+    curve_set_id: int,
+    units: Optional[str] = Query(None),
+    session: Session = Depends(get_session),
+    org: ActiveOrg = Depends(get_websocket_org)
+):
+    try:
+        target_units = parse_units(units) if units else None
+        compiled = await run_in_threadpool(compile_curve_set, session, curve_set_id, org.id, target_units)
+    except ValueError as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+    finally:
+        session.close() # Give the connection back for the life of the socket
+    if compiled is None:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Curve Set not found")
+    models, result_units = compiled
+
+    await websocket.accept()
+    await websocket.send_text(orjson.dumps({"type": "ready", "curve_set_id": curve_set_id, "units": result_units,
+                                            "series": sorted(models)}).decode())
+
+    # Single-slot mailbox: the reader overwrites, the evaluator takes the latest
+    latest: Optional[Union[str, bytes]] = None
+    coalesced = 0
+    closed = False
+    ready = asyncio.Event()
+
+    async def read():
+        nonlocal latest, coalesced, closed
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if latest is not None:
+                    coalesced += 1
+                latest = message.get("text") if message.get("text") is not None else message.get("bytes", b"")
+                ready.set()
+        except Exception: # Whatever ends the reader must also end the evaluator loop
+            pass
+        finally:
+            closed = True
+            ready.set()
+
+    reader = asyncio.create_task(read())
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+            if closed:
+                break
+            text, dropped, latest, coalesced = latest, coalesced, None, 0
+            if isinstance(text, bytes):
+                reply = {"type": "error", "id": None, "message": "Expected a text frame."}
+            else:
+                try:
+                    message = orjson.loads(text)
+                    reply = evaluate_message(models, message) if isinstance(message, dict) else \
+                        {"type": "error", "id": None, "message": "Expected a JSON object."}
+                except orjson.JSONDecodeError:
+                    reply = {"type": "error", "id": None, "message": "Invalid JSON."}
+            reply["coalesced"] = dropped
+            await websocket.send_text(orjson.dumps(reply).decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
@@ -23,6 +23,7 @@ def seed():
         curve_set = CurveSet(
             name="1750 RPM, Max Impeller",
             pump_id=pump.id,
+            org_id=pump.org_id,
             units={"flow": "gpm", "head": "ft", "efficiency": "%", "power": "hp"},
             meta_data={"test_date": "2023-10-27"}
         )
@@ -32,7 +33,7 @@ def seed():
 
         # Create Series
         # Head vs Flow
-        head_series = CurveSeries(curve_set_id=curve_set.id, type=SeriesType.head)
+        head_series = CurveSeries(curve_set_id=curve_set.id, org_id=curve_set.org_id, type=SeriesType.head)
         session.add(head_series)
         session.commit()
         session.refresh(head_series)
@@ -44,7 +45,7 @@ def seed():
             session.add(CurvePoint(series_id=head_series.id, flow=f, value=v, sequence=seq))
 
         # Efficiency vs Flow
-        eff_series = CurveSeries(curve_set_id=curve_set.id, type=SeriesType.efficiency)
+        eff_series = CurveSeries(curve_set_id=curve_set.id, org_id=curve_set.org_id, type=SeriesType.efficiency)
         session.add(eff_series)
         session.commit()
         session.refresh(eff_series)
@@ -56,7 +57,7 @@ def seed():
             session.add(CurvePoint(series_id=eff_series.id, flow=f, value=v, sequence=seq))
 
         # Power vs Flow
-        pwr_series = CurveSeries(curve_set_id=curve_set.id, type=SeriesType.power)
+        pwr_series = CurveSeries(curve_set_id=curve_set.id, org_id=curve_set.org_id, type=SeriesType.power)
         session.add(pwr_series)
         session.commit()
         session.refresh(pwr_series)
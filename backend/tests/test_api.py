@@ -1,8 +1,8 @@
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine, StaticPool
 from backend.main import app, get_session
-from backend.dependencies import get_current_user, get_active_org, RequireRole, get_current_role
-from backend.models import User, Organization, Membership, UserRole
+from backend.dependencies import get_current_user, get_active_org, RequireRole, get_current_role, get_websocket_org
+from backend.models import User, Organization, Membership, UserRole, CurveSetReadWithColumnarSeries
 import pytest
 
 # Setup in-memory DB for tests
@@ -13,8 +13,6 @@ def override_get_session():
     with Session(engine) as session:
         yield session
 
-app.dependency_overrides[get_session] = override_get_session
-
 # Auth overrides
 def override_get_current_user():
     return User(id=1, email="test@example.com", is_active=True, hashed_password="pw")
@@ -35,12 +33,20 @@ def override_require_role(role):
     # We can override the `get_current_role` dependency used by `RequireRole`.
     return UserRole.admin
 
-app.dependency_overrides[get_current_user] = override_get_current_user
-app.dependency_overrides[get_active_org] = override_get_active_org
-app.dependency_overrides[get_current_role] = override_get_current_role
+OVERRIDES = {
+    get_session: override_get_session,
+    get_current_user: override_get_current_user,
+    get_active_org: override_get_active_org,
+    get_websocket_org: override_get_active_org,
+    get_current_role: override_get_current_role,
+}
 
 @pytest.fixture(name="client")
 def client_fixture():
+    # Installed per test: other test modules share the app and set their own
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(OVERRIDES)
+
     # Reset DB
     SQLModel.metadata.drop_all(engine)
     SQLModel.metadata.create_all(engine)
@@ -129,3 +135,631 @@ def test_add_series(client: TestClient):
     assert series_res.status_code == 200
     assert series_res.json()["type"] == "head"
     assert len(series_res.json()["points"]) == 2
+
+def test_conditional_get_curve_set(client: TestClient):
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"name": "Test Set", "pump_id": pump_id}).json()["id"]
+
+    first = client.get(f"/curve-sets/{cs_id}")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert "last-modified" in first.headers
+
+    # Unchanged -> 304 with no body
+    cached = client.get(f"/curve-sets/{cs_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    # Adding a series must invalidate the curve set and the pump
+    pump_etag = client.get(f"/pumps/{pump_id}").headers["etag"]
+    client.post(
+        f"/curve-sets/{cs_id}/series",
+        json={"curve_set_id": cs_id, "type": "head", "points": [{"flow": 0, "value": 100}, {"flow": 100, "value": 80}]}
+    )
+    changed = client.get(f"/curve-sets/{cs_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert client.get(f"/pumps/{pump_id}", headers={"If-None-Match": pump_etag}).status_code == 200
+
+    # Renaming bumps it again
+    etag = changed.headers["etag"]
+    client.patch(f"/curve-sets/{cs_id}", json={"name": "Renamed"})
+    assert client.get(f"/curve-sets/{cs_id}", headers={"If-None-Match": etag}).status_code == 200
+
+def test_large_curve_set_is_compressed(client: TestClient):
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"name": "Test Set", "pump_id": pump_id}).json()["id"]
+    points = [{"flow": float(i), "value": 100.0 - 0.001 * i * i} for i in range(200)]
+    client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": points})
+
+    response = client.get(f"/curve-sets/{cs_id}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["series"][0]["points"]) == 200
+
+    # Small responses stay uncompressed
+    response = client.get(f"/pumps/{pump_id}", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    response = client.get(f"/curve-sets/{cs_id}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+def test_read_curve_set_columnar(client: TestClient):
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"name": "Test Set", "pump_id": pump_id}).json()["id"]
+    client.post(
+        f"/curve-sets/{cs_id}/series",
+        json={"curve_set_id": cs_id, "type": "head", "points": [{"flow": 100, "value": 80}, {"flow": 0, "value": 100}]}
+    )
+
+    response = client.get(f"/curve-sets/{cs_id}?points=columnar")
+    assert response.status_code == 200
+    data = CurveSetReadWithColumnarSeries.model_validate(response.json())
+    assert data.series[0].points.flow == [0, 100]
+    assert data.series[0].points.value == [100, 80]
+    assert data.series[0].fit_model_type == "polynomial_2"
+
+    # Default shape is unchanged and has its own ETag
+    default = client.get(f"/curve-sets/{cs_id}")
+    assert default.json()["series"][0]["points"][0]["flow"] == 0
+    assert default.headers["etag"] != response.headers["etag"]
+
+def test_read_curve_set_decimated(client: TestClient):
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"name": "Test Set", "pump_id": pump_id}).json()["id"]
+    points = [{"flow": float(i), "value": 100.0 - 0.001 * i * i} for i in range(300)]
+    series_id = client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": points}).json()["id"]
+
+    response = client.get(f"/curve-sets/{cs_id}?max_points=20")
+    assert response.status_code == 200
+    series = response.json()["series"][0]
+    assert len(series["points"]) <= 20 and series["point_count"] == 300
+    assert series["points"][0]["flow"] == 0 and series["points"][-1]["flow"] == 299
+    assert response.headers["etag"] != client.get(f"/curve-sets/{cs_id}").headers["etag"]
+
+    columnar = client.get(f"/curve-sets/{cs_id}?max_points=20&points=columnar").json()["series"][0]["points"]
+    assert columnar["flow"] == [p["flow"] for p in series["points"]]
+
+    # Edits replace the series' fit_token, so the cached decimation is not reused
+    client.patch(f"/curve-sets/series/{series_id}/points", json={"append": [{"flow": 400, "value": 1}]})
+    series = client.get(f"/curve-sets/{cs_id}?max_points=20").json()["series"][0]
+    assert series["point_count"] == 301 and series["points"][-1]["flow"] == 400
+
+    # Nor is it after a replacement that gets the same id back
+    replaced = client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": points[:250]}).json()["id"]
+    assert replaced == series_id
+    series = client.get(f"/curve-sets/{cs_id}?max_points=20").json()["series"][0]
+    assert series["point_count"] == 250 and series["points"][-1]["flow"] == 249
+
+    assert client.get(f"/curve-sets/{cs_id}?max_points=2").status_code == 422
+
+def test_delete_pump_tombstones_then_purges(client: TestClient, monkeypatch):
+    from sqlalchemy import func, select
+    from backend import purge
+    from backend.models import Pump, CurveSet, CurveSeries, CurvePoint
+    purged = []
+    monkeypatch.setattr(purge, "PURGE_BATCH_SIZE", 7) # Several batches
+    monkeypatch.setattr("backend.routers.pumps.purge_deleted", lambda bind: purged.append(purge.purge_deleted(bind, batch_size=7)))
+
+    points = [{"flow": float(i), "value": 100.0 - i} for i in range(20)]
+    keep_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Keep"}).json()["id"]
+    keep_cs = client.post("/curve-sets/", json={"name": "Keep", "pump_id": keep_id}).json()["id"]
+    client.post(f"/curve-sets/{keep_cs}/series", json={"curve_set_id": keep_cs, "type": "head", "points": points})
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Gone"}).json()["id"]
+    cs_ids = [client.post("/curve-sets/", json={"name": f"Set {i}", "pump_id": pump_id}).json()["id"] for i in range(2)]
+    series_id = client.post(f"/curve-sets/{cs_ids[0]}/series", json={"curve_set_id": cs_ids[0], "type": "head", "points": points}).json()["id"]
+    client.post(f"/curve-sets/{cs_ids[1]}/series", json={"curve_set_id": cs_ids[1], "type": "head", "points": points})
+
+    assert client.delete(f"/pumps/{pump_id}").json() == {"ok": True}
+    assert client.get(f"/pumps/{pump_id}").status_code == 404
+    assert client.get(f"/curve-sets/{cs_ids[0]}").status_code == 404
+    assert client.post(f"/curve-sets/series/{series_id}/evaluate", json={"flow": 5}).status_code == 404
+    assert [p["id"] for p in client.get("/pumps/").json()] == [keep_id]
+
+    assert purged == [2 * 20 + 2 + 2 + 1]
+    with Session(engine) as session:
+        assert session.scalar(select(func.count()).select_from(Pump)) == 1
+        assert session.scalar(select(func.count()).select_from(CurveSet)) == 1
+        assert session.scalar(select(func.count()).select_from(CurveSeries)) == 1
+        assert session.scalar(select(func.count()).select_from(CurvePoint)) == 20
+
+    # Deleting a curve set hides it from its pump at once
+    client.delete(f"/curve-sets/{keep_cs}")
+    assert client.get(f"/pumps/{keep_id}").json()["curve_sets"] == []
+
+def test_maintenance_jobs_run_once_per_interval(client: TestClient, monkeypatch):
+    from datetime import datetime, timedelta
+    from backend import maintenance, metrics
+    from backend.models import Invite
+    with Session(engine) as session:
+        for token, days in (("old", -1), ("new", 1)):
+            session.add(Invite(org_id=1, email=f"{token}@example.com", role=UserRole.viewer, token=token,
+                               expires_at=datetime.utcnow() + timedelta(days=days)))
+        session.commit()
+
+    assert maintenance.run_due(engine, "worker-a") == [job.name for job in maintenance.JOBS]
+    assert maintenance.run_due(engine, "worker-b") == [] # Not due again yet
+
+    # Once due, the first claim wins; the lease keeps other workers out
+    job = maintenance.JOBS[0]
+    later = datetime.utcnow() + timedelta(seconds=2 * job.interval)
+    assert maintenance.claim(engine, job, "worker-b", now=later)
+    assert not maintenance.claim(engine, job, "worker-a", now=later)
+
+    jobs = {entry["name"]: entry for entry in client.get("/maintenance/jobs").json()}
+    assert jobs["expire_invites"]["last_result"] == {"deleted": 1}
+    assert jobs["expire_invites"]["leased"] is True and "lease_holder" not in jobs["expire_invites"]
+    assert {entry["name"]: entry for entry in maintenance.status(engine)}["expire_invites"]["lease_holder"] == "worker-b"
+    assert jobs["sqlite_optimize"]["last_status"] == "ok"
+    assert jobs["sqlite_optimize"]["last_result"] == {"analyzed": True, "journal_mode": "memory"} # No WAL to checkpoint
+    assert jobs["purge_deleted"]["last_duration_ms"] >= 0
+
+    # Failures record the exception type, not its message
+    def fail(bind, deadline):
+        raise RuntimeError("/srv/secret/path.db is locked")
+    failing = maintenance.Job("expire_idempotency_keys", fail, 60, 5)
+    assert maintenance.claim(engine, failing, "worker-a", now=later)
+    maintenance.run_job(engine, failing, "worker-a")
+    jobs = {entry["name"]: entry for entry in client.get("/maintenance/jobs").json()}
+    assert jobs["expire_idempotency_keys"]["last_status"] == "error"
+    assert jobs["expire_idempotency_keys"]["last_result"] == {"error": "RuntimeError"}
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape")
+    assert 'maintenance_runs_total{job="expire_invites",status="ok"}' in client.get("/metrics", headers={"Authorization": "Bearer scrape"}).text
+
+def test_export_points_arrow(client: TestClient):
+    pa = pytest.importorskip("pyarrow")
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"name": "Test Set", "pump_id": pump_id}).json()["id"]
+    points = [{"flow": float(i), "value": 100.0 - i} for i in range(5)]
+    client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": points})
+
+    response = client.get("/export/points?format=arrow")
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 5
+    assert table.column("flow").to_pylist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert set(table.column("type").to_pylist()) == {"head"}
+
+    assert client.get("/export/nope").status_code == 404
+
+def test_create_pump_composite(client: TestClient):
+    head = [{"flow": 0, "value": 100}, {"flow": 100, "value": 90}, {"flow": 200, "value": 70}]
+    document = {"manufacturer": "Acme", "model": "C1", "curve_sets": [
+        {"name": "1750 RPM", "series": [{"type": "head", "points": head}]},
+        {"name": "1450 RPM", "series": [{"type": "head", "points": head}]},
+    ]}
+    headers = {"Idempotency-Key": "create-c1"}
+
+    response = client.post("/pumps/composite", json=document, headers=headers)
+    assert response.status_code == 201
+    created = response.json()
+    assert [cs["name"] for cs in created["curve_sets"]] == ["1750 RPM", "1450 RPM"]
+    assert created["curve_sets"][0]["characteristics"]["shutoff_head"] is not None
+    series = client.get(f"/curve-sets/{created['curve_sets'][0]['id']}").json()["series"]
+    assert series[0]["fit_model_type"] == "polynomial_2" and len(series[0]["points"]) == 3
+
+    # Retry replays the first response instead of creating a second pump
+    retry = client.post("/pumps/composite", json=document, headers=headers)
+    assert retry.status_code == 201 and retry.headers["idempotent-replayed"] == "true"
+    assert retry.json()["id"] == created["id"]
+    assert client.post("/pumps/composite", json={**document, "model": "C2"}, headers=headers).status_code == 422
+
+    # A bad series rejects the whole document
+    bad = {"manufacturer": "Acme", "model": "C3", "curve_sets": [
+        {"name": "ok", "series": [{"type": "head", "points": head}]},
+        {"name": "bad", "series": [{"type": "head", "points": [{"flow": -1, "value": 1}, {"flow": 1, "value": 1}]}]},
+    ]}
+    response = client.post("/pumps/composite", json=bad)
+    assert response.status_code == 400
+    assert response.json()["detail"]["errors"][0]["curve_set"] == 1
+    assert [p["model"] for p in client.get("/pumps/").json()] == ["C1"]
+
+def test_import_catalog_ndjson(client: TestClient, monkeypatch):
+    import json
+    from backend import catalog_import
+    monkeypatch.setattr(catalog_import, "IMPORT_WORKERS", 1)
+
+    head = [{"flow": 0, "value": 100}, {"flow": 100, "value": 90}, {"flow": 200, "value": 70}]
+    lines = [
+        {"manufacturer": "Acme", "model": "A1", "curve_sets": [
+            {"name": "1750 RPM", "units": {"flow": "gpm"}, "series": [{"type": "head", "points": head}]}
+        ]},
+        {"manufacturer": "Acme", "model": "Bad", "curve_sets": [
+            {"name": "1750 RPM", "series": [{"type": "head", "points": [{"flow": -1, "value": 1}, {"flow": 1, "value": 1}]}]}
+        ]},
+        {"manufacturer": "Acme"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n"
+
+    response = client.post("/pumps/import", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert results[0]["ok"] and len(results[0]["curve_set_ids"]) == 1
+    assert not results[1]["ok"] and results[1]["error"]["errors"][0]["code"] == "NEGATIVE_FLOW"
+    assert not results[2]["ok"]
+    assert results[-1] == {"summary": {"imported": 1, "failed": 2}}
+
+    curve_set = client.get(f"/curve-sets/{results[0]['curve_set_ids'][0]}").json()
+    assert curve_set["series"][0]["fit_model_type"] == "polynomial_2"
+    assert [p["flow"] for p in curve_set["series"][0]["points"]] == [0, 100, 200]
+
+    # A database failure fails the batch without echoing driver details
+    from sqlalchemy.exc import OperationalError
+    def fail(*args):
+        raise OperationalError("INSERT INTO pump ...", {}, Exception("secret detail"))
+    monkeypatch.setattr(catalog_import, "insert_prepared", fail)
+    results = [json.loads(line) for line in client.post("/pumps/import", content=json.dumps(lines[0]) + "\n").text.splitlines()]
+    assert not results[0]["ok"] and "secret" not in results[0]["error"]["message"]
+
+def test_import_catalog_worker_failures(client: TestClient, monkeypatch):
+    import json
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    from backend import catalog_import
+
+    head = [{"flow": 0, "value": 100}, {"flow": 100, "value": 90}, {"flow": 200, "value": 70}]
+    body = "".join(json.dumps({"manufacturer": "Acme", "model": f"W{i}", "curve_sets": [
+        {"name": "1750 RPM", "series": [{"type": "head", "points": head}]}
+    ]}) + "\n" for i in range(4))
+
+    # Two workers, one of which fails its chunk: those lines fail, the rest import
+    monkeypatch.setattr(catalog_import, "IMPORT_WORKERS", 2)
+    monkeypatch.setattr(catalog_import, "_pool", ThreadPoolExecutor(max_workers=2))
+    prepare_lines = catalog_import.prepare_lines
+    def flaky(lines):
+        if lines[0][0] == 1:
+            raise ValueError("fit blew up")
+        return prepare_lines(lines)
+    monkeypatch.setattr(catalog_import, "prepare_lines", flaky)
+    results = [json.loads(line) for line in client.post("/pumps/import", content=body).text.splitlines()]
+    assert [r["ok"] for r in results[:-1]] == [False, False, True, True]
+    assert results[0]["error"] == {"message": "Processing failed; the record was not imported."}
+    assert results[-1] == {"summary": {"imported": 2, "failed": 2}}
+    catalog_import.shutdown_pool()
+
+    # A crashed worker process breaks the pool; the next import replaces it
+    monkeypatch.setattr(catalog_import, "prepare_lines", prepare_lines)
+    catalog_import.get_pool().submit(os._exit, 1).exception()
+    results = [json.loads(line) for line in client.post("/pumps/import", content=body).text.splitlines()]
+    assert results[-1] == {"summary": {"imported": 4, "failed": 0}}
+    catalog_import.shutdown_pool()
+
+def test_patch_points_incremental_refit(client: TestClient):
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"name": "Test Set", "pump_id": pump_id}).json()["id"]
+    points = [{"flow": q, "value": 100 - 0.0001 * q * q} for q in (0, 100, 200, 300, 400)]
+    series = client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": points}).json()
+    ids = [p["id"] for p in series["points"]]
+
+    response = client.patch(f"/curve-sets/series/{series['id']}/points", json={
+        "append": [{"flow": 150, "value": 97.75}, {"flow": 500, "value": 75}],
+        "update": [{"id": ids[1], "value": 99}],
+        "remove": [ids[4]],
+    })
+    assert response.status_code == 200
+    patched = response.json()
+    assert "points" not in patched
+    assert patched["data_range"] == {"min_q": 0, "max_q": 500}
+
+    curve_set = client.get(f"/curve-sets/{cs_id}").json()
+    stored = curve_set["series"][0]["points"]
+    assert [p["flow"] for p in stored] == [0, 100, 150, 200, 300, 500]
+    assert [p["sequence"] for p in stored] == list(range(6))
+
+    # Matches a full refit of the same points
+    refit = client.post(f"/curve-sets/series/{series['id']}/fit").json()
+    for a, b in zip(refit["fit_params"]["coeffs"], patched["fit_params"]["coeffs"]):
+        assert abs(a - b) <= 1e-6 * max(1.0, abs(a))
+
+    # Duplicate flow and unknown ids are rejected without changing anything
+    dup = client.patch(f"/curve-sets/series/{series['id']}/points", json={"append": [{"flow": 200, "value": 1}]})
+    assert dup.status_code == 400
+    assert dup.json()["detail"]["errors"][0]["code"] == "DUPLICATE_FLOW"
+    assert client.patch(f"/curve-sets/series/{series['id']}/points", json={"remove": [999999]}).status_code == 404
+    assert len(client.get(f"/curve-sets/{cs_id}").json()["series"][0]["points"]) == 6
+
+def test_patch_points_warnings_and_short_cubic(client: TestClient):
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"name": "Test Set", "pump_id": pump_id}).json()["id"]
+    head = [{"flow": q, "value": 100 - 0.0001 * q * q} for q in (0, 100, 200, 300, 400)]
+    series = client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": head}).json()
+    url, point_id = f"/curve-sets/series/{series['id']}/points", series["points"][2]["id"]
+
+    # Re-checking the same point replaces its warnings rather than repeating them
+    for value in (-1, -2):
+        patched = client.patch(url, json={"update": [{"id": point_id, "value": value}]}).json()
+    assert [w["code"] for w in patched["validation_warnings"]] == ["NEGATIVE_HEAD"]
+    assert client.patch(url, json={"update": [{"id": point_id, "value": 96}]}).json()["validation_warnings"] == []
+
+    # Warnings stored at creation are cleared once their point is corrected
+    efficiency = [{"flow": q, "value": v} for q, v in ((0, 0), (100, 60), (200, 105), (300, 70), (400, 40))]
+    eff = client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "efficiency", "points": efficiency}).json()
+    assert eff["validation_warnings"] == [{
+        "code": "EFF_GT_100", "message": "Efficiency values > 100% detected.", "severity": "warning", "indices": [2], "flows": [200.0]
+    }]
+    corrected = client.patch(f"/curve-sets/series/{eff['id']}/points", json={"update": [{"id": eff["points"][2]["id"], "value": 60}]})
+    assert corrected.json()["validation_warnings"] == []
+
+    # Too few points for a cubic: failed, as a full refit reports
+    efficiency = [{"flow": q, "value": v} for q, v in ((0, 0), (100, 50), (200, 70), (300, 60))]
+    series = client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "efficiency", "points": efficiency}).json()
+    patched = client.patch(f"/curve-sets/series/{series['id']}/points", json={"remove": [series["points"][3]["id"]]}).json()
+    assert patched["fit_model_type"] == "failed"
+    assert client.post(f"/curve-sets/series/{series['id']}/fit").json()["fit_model_type"] == "failed"
+
+def test_metrics_endpoint(client: TestClient, monkeypatch):
+    from backend import metrics
+    client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"})
+    client.get("/pumps/")
+
+    # Disabled until a token is configured
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+    assert client.get("/metrics").status_code == 404
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape")
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert response.status_code == 200
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/pumps/",status="200"}' in text
+    assert 'sql_statements_total{method="POST",route="/pumps/"}' in text
+    assert "threadpool_queue_depth" in text
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape"}).status_code == 200
+
+def test_debug_trace_server_timing(client: TestClient, monkeypatch):
+    from backend import tracing_middleware
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"pump_id": pump_id, "name": "Traced"}).json()["id"]
+    points = [{"flow": 0, "value": 100}, {"flow": 50, "value": 90}, {"flow": 50, "value": 92}, {"flow": 100, "value": 70}]
+    def post(headers=None):
+        return client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": points}, headers=headers)
+
+    # Off by default, and header mode needs the shared token
+    assert "server-timing" not in post({"X-Debug-Trace": "1"}).headers
+    monkeypatch.setattr(tracing_middleware, "TRACE_REQUESTS", "header")
+    assert "server-timing" not in post({"X-Debug-Trace": "1"}).headers
+    monkeypatch.setattr(tracing_middleware, "TRACE_TOKEN", "trace-secret")
+    assert "server-timing" not in post().headers
+    assert "server-timing" not in post({"X-Debug-Trace": "wrong"}).headers
+
+    traced = post({"X-Debug-Trace": "trace-secret"})
+    assert traced.status_code == 200
+    stages = {part.split(";")[0] for part in traced.headers["server-timing"].split(", ")}
+    assert {"parse", "validate", "dedupe", "fit", "fit.polynomial_2", "persist", "total"} <= stages
+
+def test_characteristics_in_pump_detail_and_sort(client: TestClient):
+    def pump_with_bep(model, bep_flow, units=None):
+        pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": model}).json()["id"]
+        cs_id = client.post("/curve-sets/", json={"pump_id": pump_id, "name": "Test", "units": units or {}, "meta_data": {"rpm": 1750}}).json()["id"]
+        flows = [bep_flow * f for f in (0.0, 0.5, 0.8, 1.0, 1.2, 1.5, 2.0)]
+        efficiency = [80 - 80 * (q / bep_flow - 1) ** 2 for q in flows]
+        head = [100 - 0.5 * (q / bep_flow) ** 2 * 25 for q in flows]
+        for series_type, values in (("efficiency", efficiency), ("head", head)):
+            client.post(f"/curve-sets/{cs_id}/series", json={
+                "curve_set_id": cs_id, "type": series_type,
+                "points": [{"flow": q, "value": v} for q, v in zip(flows, values)]
+            })
+        return pump_id
+
+    small = pump_with_bep("Small", 100.0)
+    large = pump_with_bep("Large", 400.0)
+    metric = pump_with_bep("Metric", 100.0, {"flow": "m3/h", "head": "m"}) # ~440 gpm
+    bare = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "No curves"}).json()["id"]
+
+    detail = client.get(f"/pumps/{large}").json()
+    characteristics = detail["curve_sets"][0]["characteristics"]
+    assert characteristics["bep_flow"] == pytest.approx(400.0, rel=1e-3)
+    assert characteristics["bep_efficiency"] == pytest.approx(80.0, rel=1e-3)
+    assert characteristics["shutoff_head"] == pytest.approx(100.0, rel=1e-3)
+    assert characteristics["specific_speed"] > 0
+
+    ascending = [p["id"] for p in client.get("/pumps/?sort=bep_flow").json()]
+    descending = [p["id"] for p in client.get("/pumps/?sort=-bep_flow").json()]
+    assert ascending == [small, large, metric, bare]
+    assert descending == [metric, large, small, bare]
+
+    # The list carries each curve set's characteristics, convertible like the detail
+    listed = {p["id"]: p for p in client.get("/pumps/?units=US").json()}
+    listed_set = listed[metric]["curve_sets"][0]
+    assert listed_set["units"]["flow"] == "gpm"
+    assert listed_set["characteristics"]["bep_flow"] == pytest.approx(100.0 / 0.2271247, rel=1e-3)
+    assert "points" not in listed_set and "meta_data" not in listed_set
+    assert client.get("/pumps/?sort=flow").status_code == 422
+
+def test_derived_power_series(client: TestClient):
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={
+        "pump_id": pump_id, "name": "SI", "units": {"flow": "m3/h", "head": "m", "efficiency": "%", "power": "kW"}
+    }).json()["id"]
+    flows = [0, 20, 40, 60, 80, 100, 120]
+    head = [{"flow": q, "value": 50 - 0.002 * q ** 2} for q in flows]
+    efficiency = [{"flow": q, "value": 80 - 80 * (q / 80 - 1) ** 2} for q in flows]
+    client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": head})
+    client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "efficiency", "points": efficiency})
+
+    response = client.post(f"/curve-sets/{cs_id}/series/derived-power")
+    assert response.status_code == 200
+    derived = response.json()
+    assert derived["is_derived"] is True
+    assert derived["type"] == "power"
+    assert derived["points"] == []
+
+    # At Q = 80 m3/h, H = 37.2 m, eta = 80%: P = rho*g*Q*H/eta ~ 10.1 kW
+    evaluation = client.post(f"/curve-sets/series/{derived['id']}/evaluate", json={"flow": 80}).json()
+    assert evaluation["predictions"]["power"] == pytest.approx(998.2 * 9.80665 * (80 / 3600) * 37.2 / 0.8 / 1000, rel=0.02)
+
+    # Refitting head recomputes the derived power
+    client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head",
+                                                      "points": [{"flow": p["flow"], "value": p["value"] * 2} for p in head]})
+    power = next(s for s in client.get(f"/curve-sets/{cs_id}").json()["series"] if s["type"] == "power")
+    assert power["id"] == derived["id"]
+    assert power["fit_params"]["coeffs"][-1] == pytest.approx(2 * derived["fit_params"]["coeffs"][-1], rel=1e-6)
+
+    # A second replacement gets the same series id back at revision 1; power must still follow
+    for scale in (3, 4):
+        client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head",
+                                                          "points": [{"flow": p["flow"], "value": p["value"] * scale} for p in head]})
+        power = next(s for s in client.get(f"/curve-sets/{cs_id}").json()["series"] if s["type"] == "power")
+        assert power["fit_params"]["coeffs"][-1] == pytest.approx(scale * derived["fit_params"]["coeffs"][-1], rel=1e-6)
+
+    assert client.patch(f"/curve-sets/series/{derived['id']}/points", json={"remove": []}).status_code == 400
+
+    # Removing a source removes the derived series
+    head_id = next(s["id"] for s in client.get(f"/curve-sets/{cs_id}").json()["series"] if s["type"] == "head")
+    client.delete(f"/curve-sets/series/{head_id}")
+    assert [s["type"] for s in client.get(f"/curve-sets/{cs_id}").json()["series"]] == ["efficiency"]
+    assert client.post(f"/curve-sets/{cs_id}/series/derived-power").status_code == 400
+
+def test_units_conversion_on_read_evaluate_and_sample(client: TestClient):
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"pump_id": pump_id, "name": "US", "units": {"flow": "gpm", "head": "ft"}}).json()["id"]
+    points = [{"flow": q, "value": 100 - 0.0001 * q ** 2} for q in (0, 200, 400, 600, 800)]
+    series_id = client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": points}).json()["id"]
+
+    si = client.get(f"/curve-sets/{cs_id}?units=SI").json()
+    assert si["units"]["flow"] == "m3/h"
+    assert si["series"][0]["points"][1]["flow"] == pytest.approx(200 * 0.2271247, rel=1e-6)
+    assert si["series"][0]["points"][0]["value"] == pytest.approx(100 * 0.3048)
+    columnar = client.get(f"/curve-sets/{cs_id}?units=SI&points=columnar").json()
+    assert columnar["series"][0]["points"]["flow"][1] == pytest.approx(200 * 0.2271247, rel=1e-6)
+    assert client.get(f"/curve-sets/{cs_id}?units=metric").status_code == 400
+
+    # Evaluate at 400 gpm, asked in m3/h and answered in m
+    evaluation = client.post(f"/curve-sets/series/{series_id}/evaluate?units=SI", json={"flow": 400 * 0.2271247}).json()
+    assert evaluation["predictions"]["head"] == pytest.approx(84 * 0.3048, rel=1e-4)
+
+    sample = client.get(f"/curve-sets/series/{series_id}/sample?n=5&units=flow:l/s").json()
+    assert sample["fitted"] is True
+    assert sample["units"]["flow"] == "l/s" and sample["units"]["head"] == "ft"
+    assert sample["flow"][-1] == pytest.approx(800 * 0.0630902, rel=1e-5)
+    assert sample["value"][-1] == pytest.approx(36.0, rel=1e-4)
+
+def test_prediction_intervals_on_evaluate_and_sample(client: TestClient):
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"pump_id": pump_id, "name": "Bands"}).json()["id"]
+    noise = [0.8, -1.1, 0.4, -0.3, 1.2, -0.9, 0.1, -0.6, 0.9, -0.5]
+    points = [{"flow": 100 * i, "value": 100 - 0.0001 * (100 * i) ** 2 + e} for i, e in enumerate(noise)]
+    series_id = client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": points}).json()["id"]
+
+    plain = client.post(f"/curve-sets/series/{series_id}/evaluate", json={"flow": 450}).json()
+    assert "intervals" not in plain
+    evaluation = client.post(f"/curve-sets/series/{series_id}/evaluate?intervals=true", json={"flow": 450}).json()
+    band = evaluation["intervals"]["head"]
+    assert band["level"] == 0.95
+    assert band["lower"] < evaluation["predictions"]["head"] < band["upper"]
+
+    sample = client.get(f"/curve-sets/series/{series_id}/sample?n=7&intervals=true&units=head:m").json()
+    assert len(sample["lower"]) == len(sample["upper"]) == 7
+    assert all(lo < v < hi for lo, v, hi in zip(sample["lower"], sample["value"], sample["upper"]))
+    assert sample["upper"][3] - sample["lower"][3] == pytest.approx((band["upper"] - band["lower"]) * 0.3048, rel=0.3)
+
+    # Bands are cached per fit and recomputed after the points change
+    assert client.patch(f"/curve-sets/series/{series_id}/points", json={"append": [{"flow": 950, "value": 30.0}]}).status_code == 200
+    widened = client.post(f"/curve-sets/series/{series_id}/evaluate?intervals=true", json={"flow": 450}).json()["intervals"]["head"]
+    assert widened["upper"] - widened["lower"] > band["upper"] - band["lower"]
+
+    # ...and after the series is replaced, even when the replacement gets the same id back
+    noisy = [{"flow": 100 * i, "value": 100 - 0.0001 * (100 * i) ** 2 + 10 * e} for i, e in enumerate(noise)]
+    replaced = client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": noisy}).json()["id"]
+    assert replaced == series_id
+    noisy_band = client.post(f"/curve-sets/series/{series_id}/evaluate?intervals=true", json={"flow": 450}).json()["intervals"]["head"]
+    assert noisy_band["upper"] - noisy_band["lower"] == pytest.approx(10 * (band["upper"] - band["lower"]), rel=0.1)
+
+def test_curve_store_snapshot_serves_reads_and_selection(client: TestClient, tmp_path, monkeypatch):
+    import os
+    from backend import curve_store
+
+    monkeypatch.setattr(curve_store, "CURVE_STORE_DIR", str(tmp_path))
+    rebuilds = []
+    monkeypatch.setattr(curve_store, "_submit", rebuilds.append) # Run background rebuilds on demand
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    us = client.post("/curve-sets/", json={"pump_id": pump_id, "name": "US", "units": {"flow": "gpm", "head": "ft"}}).json()["id"]
+    si = client.post("/curve-sets/", json={"pump_id": pump_id, "name": "SI", "units": {"flow": "m3/h", "head": "m"}}).json()["id"]
+    head = [{"flow": q, "value": 100 - 0.0001 * q ** 2} for q in (0, 200, 400, 600, 800)]
+    us_series = client.post(f"/curve-sets/{us}/series", json={"curve_set_id": us, "type": "head", "points": head}).json()["id"]
+    # The same curve in m3/h and m
+    head_si = [{"flow": p["flow"] * 0.2271247, "value": p["value"] * 0.3048} for p in head]
+    si_series = client.post(f"/curve-sets/{si}/series", json={"curve_set_id": si, "type": "head", "points": head_si}).json()["id"]
+
+    evaluation = client.post(f"/curve-sets/series/{us_series}/evaluate", json={"flow": 400}).json()
+    assert evaluation["predictions"]["head"] == pytest.approx(84.0) # Stale: served by the ORM
+    org_dir = tmp_path / "org_1"
+    assert not (org_dir / "CURRENT").exists() and len(rebuilds) == 1 # Requests coalesced into one
+    rebuilds.pop()()
+    generation = (org_dir / "CURRENT").read_text()
+    assert (org_dir / generation / "flow.npy").exists()
+    stored = curve_store.find_series(None, 1, us_series) # Current: served without the database
+    assert stored.flow.tolist() == [0, 200, 400, 600, 800] and stored.units["flow"] == "gpm"
+
+    sample = client.get(f"/curve-sets/series/{si_series}/sample?n=3&units=US").json()
+    assert sample["value"][-1] == pytest.approx(36.0, rel=1e-4)
+
+    # A write invalidates on commit and schedules a rebuild; reads use the ORM until it is published
+    client.patch(f"/curve-sets/series/{us_series}/points", json={"append": [{"flow": 1000, "value": 0.0}]})
+    evaluation = client.post(f"/curve-sets/series/{us_series}/evaluate", json={"flow": 1000}).json()
+    assert evaluation["extrapolation"] is False
+    with Session(engine) as session:
+        assert curve_store.find_series(session, 1, us_series) is None
+    assert (org_dir / "CURRENT").read_text() == generation
+    rebuilds.pop()()
+    assert (org_dir / "CURRENT").read_text() != generation
+    assert curve_store.find_series(None, 1, us_series).flow.tolist()[-1] == 1000
+
+    selection = client.get("/curve-sets/select?flow=400&head=84").json()
+    assert selection["units"] == {"flow": "gpm", "head": "ft"}
+    assert {r["series_id"] for r in selection["results"]} == {us_series, si_series}
+    assert all(r["head"] == pytest.approx(84.0, rel=1e-4) for r in selection["results"])
+    selection = client.get("/curve-sets/select?flow=90.85&head=25.6&tolerance=0.02&units=SI").json()
+    assert len(selection["results"]) == 2 and selection["results"][0]["deviation"] <= 0.02
+    assert client.get("/curve-sets/select?flow=400&head=300").json()["results"] == []
+
+    # Replacing a series can hand its id back (revision 1 again); the store must not reuse the old fit
+    lower = [{"flow": p["flow"], "value": p["value"] - 15} for p in head_si]
+    replaced = client.post(f"/curve-sets/{si}/series", json={"curve_set_id": si, "type": "head", "points": lower}).json()
+    assert replaced["id"] == si_series
+    rebuilds.pop()()
+    stored = curve_store.find_series(None, 1, si_series)
+    assert stored.value.tolist() == pytest.approx([p["value"] for p in lower])
+    evaluation = client.post(f"/curve-sets/series/{si_series}/evaluate", json={"flow": head_si[2]["flow"]}).json()
+    assert evaluation["predictions"]["head"] == pytest.approx(head_si[2]["value"] - 15)
+
+def test_sweep_websocket_streams_and_coalesces(client: TestClient):
+    from starlette.websockets import WebSocketDisconnect
+
+    pump_id = client.post("/pumps/", json={"manufacturer": "Test Mfg", "model": "Test Model"}).json()["id"]
+    cs_id = client.post("/curve-sets/", json={"pump_id": pump_id, "name": "Sweep", "units": {"flow": "gpm", "head": "ft"}}).json()["id"]
+    head = [{"flow": q, "value": 100 - 0.0001 * q ** 2} for q in (0, 200, 400, 600, 800)]
+    client.post(f"/curve-sets/{cs_id}/series", json={"curve_set_id": cs_id, "type": "head", "points": head})
+
+    with client.websocket_connect(f"/curve-sets/{cs_id}/sweep?units=head:m") as ws:
+        ready = ws.receive_json()
+        assert ready["type"] == "ready" and ready["series"] == ["head"] and ready["units"]["head"] == "m"
+
+        ws.send_json({"flow": 400, "head": 20.0, "id": 1})
+        result = ws.receive_json()
+        assert result["id"] == 1 and result["coalesced"] == 0
+        assert result["predictions"]["head"] == pytest.approx(84 * 0.3048)
+        assert result["residuals"]["pass"] is False and result["extrapolation"] is False
+
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_bytes(b"\x00\x01")
+        assert ws.receive_json()["message"] == "Expected a text frame."
+
+        # A burst: every input is either answered or counted as coalesced, and the last always wins
+        for i in range(50):
+            ws.send_json({"flow": 10 * i, "id": i})
+        answered, dropped = 0, 0
+        while True:
+            reply = ws.receive_json()
+            answered, dropped = answered + 1, dropped + reply["coalesced"]
+            if reply["id"] == 49:
+                break
+        assert answered + dropped == 50
+
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect("/curve-sets/9999/sweep") as ws:
+            ws.receive_json()
+    assert closed.value.code == 1008
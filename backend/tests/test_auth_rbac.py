@@ -15,12 +15,13 @@ def override_get_session():
     with Session(engine) as session:
         yield session
 
-app.dependency_overrides[get_session] = override_get_session
-
 client = TestClient(app)
 
 @pytest.fixture(name="session")
 def session_fixture():
+    # Installed per test: other test modules share the app and set their own
+    app.dependency_overrides.clear()
+    app.dependency_overrides[get_session] = override_get_session
     # Re-create tables to ensure fresh state
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
@@ -186,3 +187,29 @@ def test_invite_flow(setup_data, session):
     # Verify invite is gone
     invite = session.exec(select(Invite).where(Invite.token == invite_token)).first()
     assert invite is None
+
+def test_role_claims_and_revocation(setup_data, session):
+    def login(email):
+        response = client.post("/auth/login", json={"email": email, "password": "password"})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    admin_headers, viewer_headers = login("admin@org1.com"), login("viewer@org1.com")
+    org1, viewer = setup_data["org1"], setup_data["viewer_user"]
+
+    # Authorized from the token's claims
+    assert client.get("/pumps/", headers=viewer_headers).status_code == 200
+    assert client.post("/pumps/", json={"manufacturer": "A", "model": "B"}, headers=viewer_headers).status_code == 403
+    assert client.get("/pumps/", headers={**viewer_headers, "X-Org-ID": str(setup_data["org2"].id)}).status_code == 403
+    assert client.get("/auth/me", headers=viewer_headers).json()["active_org"]["name"] == "Org 1"
+
+    # A role change revokes the member's tokens right away
+    response = client.patch(f"/orgs/{org1.id}/members/{viewer.id}", json={"role_update": "editor"}, headers=admin_headers)
+    assert response.status_code == 200
+    assert client.get("/pumps/", headers=viewer_headers).status_code == 401
+    editor_headers = login("viewer@org1.com")
+    assert client.post("/pumps/", json={"manufacturer": "A", "model": "B"}, headers=editor_headers).status_code == 200
+
+    assert client.delete(f"/orgs/{org1.id}/members/{viewer.id}", headers=admin_headers).status_code == 200
+    assert client.get("/pumps/", headers=editor_headers).status_code == 401
+    # The admin's own token was not affected
+    assert client.get("/pumps/", headers=admin_headers).status_code == 200
@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 from backend.curves.validation import validate_points
 from backend.curves.fitting import fit_curve
 from backend.curves.evaluation import evaluate_curve_at_point
@@ -80,3 +81,142 @@ def test_evaluation():
     params = {"coeffs": [1, 0, 0]} # x^2
     res = evaluate_curve_at_point("polynomial_2", params, {"min_q": 0, "max_q": 10}, 3.0, points)
     assert abs(res["predicted_value"] - 9.0) < 1e-5
+
+def test_moment_fit_matches_polyfit_and_updates_incrementally():
+    from backend.curves.fitting import moment_stats, update_moment_stats, fit_from_moments
+    points = [{"flow": q, "value": 120 - 0.0002 * q * q + 0.01 * q} for q in range(0, 1200, 100)]
+
+    _, params, quality, _ = fit_curve(SeriesType.head, points)
+    stats = moment_stats(SeriesType.head, points)
+    model, moment_params, moment_quality = fit_from_moments(stats)
+    assert model == "polynomial_2"
+    for a, b in zip(params["coeffs"], moment_params["coeffs"]):
+        assert abs(a - b) <= 1e-6 * max(1.0, abs(a))
+    assert abs(quality["r2"] - moment_quality["r2"]) < 1e-9
+
+    # Replace one sample: incremental stats must equal a full recomputation
+    edited = points[:3] + [{"flow": 300, "value": 50}] + points[4:]
+    stats = update_moment_stats(stats, added=[(300, 50)], removed=[(300, points[3]["value"])])
+    _, params, quality, _ = fit_curve(SeriesType.head, edited)
+    _, moment_params, moment_quality = fit_from_moments(stats)
+    for a, b in zip(params["coeffs"], moment_params["coeffs"]):
+        assert abs(a - b) <= 1e-6 * max(1.0, abs(a))
+    assert abs(quality["rmse"] - moment_quality["rmse"]) < 1e-6
+
+def test_compute_characteristics():
+    from backend.curves.characteristics import compute_characteristics
+
+    # Head 100 - 0.0001 Q^2; efficiency peaks at 80% at Q = 500; power rises to Q = 800
+    fits = {
+        SeriesType.head: {"fit_model_type": "polynomial_2", "fit_params": {"coeffs": [-0.0001, 0.0, 100.0]}, "data_range": {"min_q": 0, "max_q": 900}},
+        SeriesType.efficiency: {"fit_model_type": "polynomial_3", "fit_params": {"coeffs": [0.0, -0.00032, 0.32, 0.0]}, "data_range": {"min_q": 0, "max_q": 900}},
+        SeriesType.power: {"fit_model_type": "polynomial_2", "fit_params": {"coeffs": [-0.00005, 0.08, 5.0]}, "data_range": {"min_q": 0, "max_q": 900}},
+    }
+    result = compute_characteristics(fits, {"flow": "gpm", "head": "ft"}, rpm=1750)
+
+    assert result["bep_flow"] == pytest.approx(500.0)
+    assert result["bep_efficiency"] == pytest.approx(80.0)
+    assert result["bep_head"] == pytest.approx(75.0)
+    assert result["shutoff_head"] == pytest.approx(100.0)
+    assert result["runout_flow"] == 900
+    assert result["max_power"] == pytest.approx(37.0)
+    assert result["specific_speed"] == pytest.approx(1750 * 500 ** 0.5 / 75 ** 0.75)
+    assert result["bep_flow_si"] == pytest.approx(500 * 6.30901964e-5)
+
+    # No efficiency fit: no BEP, no specific speed, head values still present
+    partial = compute_characteristics({SeriesType.head: fits[SeriesType.head]})
+    assert partial["bep_flow"] is None and partial["specific_speed"] is None
+    assert partial["shutoff_head"] == pytest.approx(100.0)
+
+def test_unit_conversion_rescales_fit_without_refit():
+    from backend.curves.units import parse_units, convert_curve_set
+
+    coeffs = [-0.0001, 0.01, 100.0] # ft vs gpm
+    curve_set = {
+        "units": {"flow": "gpm", "head": "ft"},
+        "series": [{
+            "type": "head",
+            "points": [{"flow": 0.0, "value": 100.0}, {"flow": 500.0, "value": 80.0}],
+            "fit_params": {"coeffs": coeffs},
+            "fit_quality": {"rmse": 1.0, "r2": 0.99},
+            "data_range": {"min_q": 0.0, "max_q": 500.0},
+        }],
+        "characteristics": {"bep_flow": 500.0, "bep_head": 80.0, "specific_speed": 1500.0},
+    }
+    convert_curve_set(curve_set, parse_units("SI"))
+    series = curve_set["series"][0]
+
+    gpm_to_m3h, ft_to_m = 0.2271247, 0.3048
+    assert curve_set["units"]["flow"] == "m3/h" and curve_set["units"]["head"] == "m"
+    assert series["points"][1]["flow"] == pytest.approx(500 * gpm_to_m3h, rel=1e-6)
+    assert series["data_range"]["max_q"] == pytest.approx(500 * gpm_to_m3h, rel=1e-6)
+    assert series["fit_quality"]["rmse"] == pytest.approx(ft_to_m)
+    # The rescaled polynomial gives the converted value at the converted flow
+    q_si = 300 * gpm_to_m3h
+    expected = (coeffs[0] * 300 ** 2 + coeffs[1] * 300 + coeffs[2]) * ft_to_m
+    assert np.polyval(series["fit_params"]["coeffs"], q_si) == pytest.approx(expected, rel=1e-6)
+    assert curve_set["characteristics"]["bep_head"] == pytest.approx(80 * ft_to_m)
+    assert curve_set["characteristics"]["specific_speed"] == 1500.0
+
+    assert parse_units("flow:l/s") == {"flow": "l/s"}
+    with pytest.raises(ValueError):
+        parse_units("flow:furlongs")
+
+def test_bootstrap_bands_cover_residual_noise():
+    from backend.curves.uncertainty import bootstrap_bands, band_offsets
+
+    rng = np.random.default_rng(3)
+    flows = np.linspace(0, 1000, 60)
+    values = 100 - 0.00005 * flows ** 2 + rng.normal(0, 1.0, flows.size)
+    bands = bootstrap_bands(flows, values, 2)
+
+    assert bands["min_q"] == 0.0 and bands["max_q"] == 1000.0
+    lower, upper = band_offsets(bands, [500.0])
+    # About the spread of the residuals, slightly wider for fit uncertainty
+    residuals = values - np.polyval(np.polyfit(flows, values, 2), flows)
+    spread = np.diff(np.quantile(residuals, [0.025, 0.975]))[0]
+    assert spread < upper[0] - lower[0] < 1.25 * spread
+    assert lower[0] < 0 < upper[0]
+    # Deterministic for a given seed
+    assert bootstrap_bands(flows, values, 2) == bands
+    # No residual degrees of freedom, no bands
+    assert bootstrap_bands([0, 1, 2], [3, 2, 1], 2) is None
+
+def test_fit_curves_batch_matches_single_fits():
+    from backend.curves.fitting import fit_curves, moment_stats
+
+    rng = np.random.default_rng(5)
+    items = []
+    for i in range(30):
+        flows = np.sort(rng.uniform(0, 800, 6 + i % 4))
+        series_type = [SeriesType.head, SeriesType.efficiency, SeriesType.power][i % 3]
+        items.append((series_type, flows.tolist(), (90 - 0.0001 * flows ** 2 + rng.normal(0, 0.5, flows.size)).tolist()))
+    # Fallbacks: underdetermined, too short for a cubic, repeated flows, a single point
+    items += [(SeriesType.head, [0.0, 10.0], [5.0, 4.0]), (SeriesType.power, [1.0, 2.0, 3.0], [1.0, 2.0, 3.0]),
+              (SeriesType.efficiency, [1.0, 1.0, 1.0, 2.0, 2.0], [1.0, 2.0, 3.0, 4.0, 5.0]), (SeriesType.head, [1.0], [1.0])]
+
+    for (series_type, flows, values), batched in zip(items, fit_curves(items)):
+        points = [{"flow": q, "value": v} for q, v in zip(flows, values)]
+        expected = fit_curve(series_type, points)
+        assert batched[0] == expected[0]
+        assert batched[3] == expected[3]
+        if expected[0] and expected[0].startswith("polynomial"):
+            assert batched[1]["coeffs"] == pytest.approx(expected[1]["coeffs"], rel=1e-6, abs=1e-9)
+            assert batched[2]["rmse"] == pytest.approx(expected[2]["rmse"], rel=1e-6)
+            assert batched[2]["r2"] == pytest.approx(expected[2]["r2"], abs=1e-9)
+            stats = moment_stats(series_type, points)
+            assert batched[4]["sx"] == pytest.approx(stats["sx"]) and batched[4]["scale"] == stats["scale"]
+
+def test_minmax_decimation_keeps_extremes():
+    from backend.curves.decimation import minmax_indices
+    values = np.sin(np.linspace(0, 20, 10001))
+    values[1234] = 5.0 # Single-point spike
+    values[7777] = -5.0
+
+    keep = minmax_indices(values, 200)
+    assert len(keep) <= 200
+    assert keep[0] == 0 and keep[-1] == len(values) - 1
+    assert np.all(np.diff(keep) > 0)
+    assert 1234 in keep and 7777 in keep
+
+    assert minmax_indices(values[:50], 200).tolist() == list(range(50))
@@ -0,0 +1,143 @@
+import sqlite3
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+from backend.models import Organization
+from backend import migrate_v1_to_v2
+
+V1_SCHEMA = """
+CREATE TABLE pump (id INTEGER PRIMARY KEY, manufacturer TEXT, model TEXT, meta_data TEXT, created_at TEXT, updated_at TEXT);
+CREATE TABLE curveset (id INTEGER PRIMARY KEY, name TEXT, pump_id INTEGER, units TEXT, meta_data TEXT, created_at TEXT, updated_at TEXT);
+CREATE TABLE curveseries (id INTEGER PRIMARY KEY, curve_set_id INTEGER, type TEXT);
+CREATE TABLE curvepoint (id INTEGER PRIMARY KEY, series_id INTEGER, flow REAL, value REAL, sequence INTEGER);
+"""
+
+@pytest.fixture(name="dbs")
+def dbs_fixture(tmp_path):
+    old_db, new_db = str(tmp_path / "v1.db"), str(tmp_path / "v2.db")
+    conn = sqlite3.connect(old_db)
+    conn.executescript(V1_SCHEMA)
+    conn.executemany("INSERT INTO pump VALUES (?, 'Mfg', ?, '{}', '2024-01-01 00:00:00', '2024-01-01 00:00:00')",
+                     [(i, f"P{i}") for i in range(1, 6)])
+    conn.executemany("INSERT INTO curveset VALUES (?, 'Set', ?, '{}', '{}', '2024-01-01 00:00:00', '2024-01-01 00:00:00')",
+                     [(i, i) for i in range(1, 6)])
+    conn.executemany("INSERT INTO curveseries VALUES (?, ?, 'HEAD')", [(i, i) for i in range(1, 6)])
+    # Sparse ids, as left behind by deletes
+    conn.executemany("INSERT INTO curvepoint VALUES (?, ?, ?, ?, ?)",
+                     [(i * 3, 1 + i % 5, float(i), 100.0 - i, i) for i in range(1, 41)])
+    conn.commit()
+    conn.close()
+
+    engine = create_engine(f"sqlite:///{new_db}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Organization(id=7, name="Default"))
+        session.commit()
+    engine.dispose()
+    return old_db, new_db
+
+def test_migrate_copies_and_verifies(dbs):
+    old_db, new_db = dbs
+    report = migrate_v1_to_v2.migrate(old_db, new_db, batch_size=7, progress=lambda msg: None)
+
+    assert report["curvepoint"] == {"old": 40, "new": 40, "skipped": 0, "missing": 0}
+    assert all(counts["missing"] == 0 for counts in report.values())
+    conn = sqlite3.connect(new_db)
+    assert {row[0] for row in conn.execute("SELECT org_id FROM pump")} == {7}
+    assert conn.execute("SELECT validation_warnings FROM curveseries WHERE id = 1").fetchone()[0] == "[]"
+    # Verified runs leave no checkpoint behind
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = '_migration_v1_checkpoint'").fetchone() is None
+
+def test_migrate_skips_duplicate_series_and_their_points(dbs):
+    old_db, new_db = dbs
+    conn = sqlite3.connect(old_db)
+    # A second HEAD series in curve set 1, left by a v1 replace
+    conn.execute("INSERT INTO curveseries VALUES (6, 1, 'HEAD')")
+    conn.executemany("INSERT INTO curvepoint VALUES (?, 6, ?, 50.0, ?)", [(200 + i, float(i), i) for i in range(3)])
+    conn.commit()
+    conn.close()
+
+    messages = []
+    report = migrate_v1_to_v2.migrate(old_db, new_db, batch_size=7, progress=messages.append)
+    assert report["curveseries"] == {"old": 6, "new": 5, "skipped": 1, "missing": 0}
+    assert report["curvepoint"] == {"old": 43, "new": 35, "skipped": 8, "missing": 0}
+    assert any(m.startswith("Skipped duplicate series 1 (HEAD in curve set 1)") for m in messages)
+    conn = sqlite3.connect(new_db)
+    assert conn.execute("SELECT id FROM curveseries WHERE curve_set_id = 1").fetchall() == [(6,)]
+    # No orphaned points
+    assert conn.execute("SELECT COUNT(*) FROM curvepoint WHERE series_id NOT IN (SELECT id FROM curveseries)").fetchone()[0] == 0
+
+def test_migrate_resumes_after_interruption(dbs):
+    old_db, new_db = dbs
+
+    def interrupt(msg):
+        if msg.startswith("curvepoint: 14/"):
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        migrate_v1_to_v2.migrate(old_db, new_db, batch_size=7, progress=interrupt)
+
+    conn = sqlite3.connect(new_db)
+    assert conn.execute("SELECT COUNT(*) FROM curvepoint").fetchone()[0] == 14
+    assert conn.execute("SELECT last_id FROM _migration_v1_checkpoint WHERE name = 'curvepoint'").fetchone()[0] == 42
+    conn.close()
+
+    messages = []
+    report = migrate_v1_to_v2.migrate(old_db, new_db, batch_size=7, progress=messages.append)
+    assert report["curvepoint"] == {"old": 40, "new": 40, "skipped": 0, "missing": 0}
+    # Completed tables and batches are not repeated
+    assert not any(m.startswith("pump: ") and "inserted" in m for m in messages)
+    assert any(m.startswith("curvepoint: 21/40") for m in messages)
+
+def test_create_db_and_tables_skips_current_schema(tmp_path):
+    from sqlalchemy import text
+    from backend.database import create_db_and_tables
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    assert create_db_and_tables(engine) is True
+    assert create_db_and_tables(engine) is False
+
+    # A model change alters the fingerprint and re-applies the schema
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE schema_version SET fingerprint = 'stale'"))
+    assert create_db_and_tables(engine) is True
+    engine.dispose()
+
+def test_schema_upgrade_backfills_org_ids_and_adds_indexes(tmp_path):
+    from sqlalchemy import inspect
+    from backend.database import create_db_and_tables
+    from backend.dedupe import remove_duplicates
+
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    # Tables from before curve sets and series carried org_id
+    conn.executescript(V1_SCHEMA + """
+        CREATE TABLE organization (id INTEGER PRIMARY KEY, name TEXT, created_at TEXT);
+        ALTER TABLE pump ADD COLUMN org_id INTEGER;
+        INSERT INTO organization VALUES (3, 'Org', '2024-01-01 00:00:00');
+        INSERT INTO pump VALUES (1, 'Mfg', 'P1', '{}', '2024-01-01 00:00:00', '2024-01-01 00:00:00', 3);
+        INSERT INTO curveset VALUES (1, 'Set', 1, '{}', '{}', '2024-01-01 00:00:00', '2024-01-01 00:00:00');
+        INSERT INTO curveseries VALUES (1, 1, 'head');
+        -- A duplicate left by a concurrent replace: the newer series wins
+        INSERT INTO curveseries VALUES (2, 1, 'head');
+        INSERT INTO curvepoint VALUES (1, 1, 0.0, 100.0, 0), (2, 2, 0.0, 90.0, 0);
+    """)
+    conn.commit()
+    conn.close()
+
+    engine = create_engine(f"sqlite:///{path}")
+    # Startup never deletes the duplicate; the explicit command backs it up first
+    with pytest.raises(RuntimeError, match="python -m backend.dedupe"):
+        create_db_and_tables(engine)
+    assert remove_duplicates(engine) == {"curvepoint": 1, "curveseries": 1}
+    assert create_db_and_tables(engine)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT org_id FROM curveset").fetchone() == (3,)
+    assert conn.execute("SELECT id, org_id FROM curveseries").fetchall() == [(2, 3)]
+    assert conn.execute("SELECT series_id FROM curvepoint").fetchall() == [(2,)]
+    assert conn.execute("SELECT id FROM _dedupe_backup_curveseries").fetchall() == [(1,)]
+    assert conn.execute("SELECT id, value FROM _dedupe_backup_curvepoint").fetchall() == [(1, 100.0)]
+    conn.close()
+    inspector = inspect(engine)
+    assert "ix_curvepoint_series_id_sequence" in {i["name"] for i in inspector.get_indexes("curvepoint")}
+    assert any(i["unique"] and i["column_names"] == ["curve_set_id", "type"] for i in inspector.get_indexes("curveseries"))
+    engine.dispose()
@@ -0,0 +1,164 @@
+"""
+Opt-in stage timing for slow requests.
+
+Code marks its stages with `with stage("fit"):`. Outside a traced request
+this is a contextvar lookup returning a shared null stage, so the hooks can
+stay in hot paths. Which requests are traced is decided by the HTTP
+middleware (backend.tracing_middleware); this module has no web framework
+imports, so backend.curves can use it.
+"""
+import cProfile
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    start = __enter__
+
+    def stop(self) -> None:
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class Trace:
+    __slots__ = ("start", "stages", "depth", "profiler")
+
+    def __init__(self, profile: bool = False):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {} # name -> [seconds, count]
+        self.depth = 0
+        self.profiler = cProfile.Profile() if profile else None
+
+    def add(self, name: str, seconds: float) -> None:
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        parts = [f"{_token(name)};dur={seconds * 1000:.3f}" for name, (seconds, _) in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.3f}")
+        return ", ".join(parts)
+
+class _Stage:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        trace = self.trace
+        # Profile only the outermost stages, in whichever thread runs them
+        if trace.profiler is not None and trace.depth == 0:
+            try:
+                trace.profiler.enable()
+            except ValueError: # Another profiler is active in this thread
+                trace.profiler = None
+        trace.depth += 1
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        trace = self.trace
+        trace.add(self.name, time.perf_counter() - self.started)
+        trace.depth -= 1
+        if trace.profiler is not None and trace.depth == 0:
+            trace.profiler.disable()
+        return False
+
+    # Statement form, for blocks that should not be re-indented:
+    # s = stage("x").start() ... s.stop(). Unlike `with`, an exception in
+    # between leaves the stage open for the rest of the request.
+    start = __enter__
+
+    def stop(self) -> None:
+        self.__exit__(None, None, None)
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+def stage(name: str):
+    """
+    Times the enclosed block as `name` when the current request is traced.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_STAGE
+    return _Stage(trace, name)
+
+def mark(name: str) -> None:
+    """
+    Records the time from the start of the request to now as `name`; used
+    for work done by the framework before the endpoint runs (body parsing).
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, trace.elapsed())
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def begin(profile: bool = False):
+    """
+    Starts tracing the current context; returns the Trace and a token for end().
+    """
+    trace = Trace(profile=profile)
+    return trace, _current_trace.set(trace)
+
+def end(token) -> None:
+    _current_trace.reset(token)
+
+class StageStats:
+    """
+    In-process totals per stage across all traced requests.
+    """
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = {} # name -> [seconds, count, max]
+        self.requests = 0
+
+    def record(self, trace: Trace) -> None:
+        self.requests += 1
+        for name, (seconds, count) in trace.stages.items():
+            entry = self.stages.get(name)
+            if entry is None:
+                self.stages[name] = [seconds, count, seconds]
+            else:
+                entry[0] += seconds
+                entry[1] += count
+                entry[2] = max(entry[2], seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {"total_s": total, "count": count, "mean_s": total / count if count else 0.0, "max_s": worst}
+            for name, (total, count, worst) in self.stages.items()
+        }
+
+    def render(self) -> str:
+        lines = [
+            "# HELP trace_stage_seconds_total Time spent in each traced stage.",
+            "# TYPE trace_stage_seconds_total counter",
+        ]
+        lines += [f'trace_stage_seconds_total{{stage="{name}"}} {total}' for name, (total, _, _) in sorted(self.stages.items())]
+        lines += ["# TYPE trace_stage_calls_total counter"]
+        lines += [f'trace_stage_calls_total{{stage="{name}"}} {count}' for name, (_, count, _) in sorted(self.stages.items())]
+        lines += ["# TYPE traced_requests_total counter", f"traced_requests_total {self.requests}"]
+        return "\n".join(lines) + "\n"
+
+stats = StageStats()
+
+def _token(name: str) -> str:
+    # Server-Timing metric names are HTTP tokens
+    return "".join(c if c.isalnum() or c in "-_.!#$%&'*+^`|~" else "_" for c in name)
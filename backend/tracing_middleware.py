@@ -0,0 +1,73 @@
+"""
+HTTP side of backend.tracing: decides which requests are traced and reports
+their stage timings.
+
+Tracing is off by default (TRACE_REQUESTS=off). With TRACE_REQUESTS=header
+a request is traced when its `X-Debug-Trace` header matches TRACE_TOKEN;
+without a token, header mode traces nothing. TRACE_REQUESTS=all traces every
+request. Traced responses carry a Server-Timing header, stage totals are
+aggregated in-process (exposed on /metrics), and with TRACE_PROFILE_DIR set,
+requests slower than TRACE_PROFILE_THRESHOLD_MS also get a cProfile dump of
+their staged code.
+"""
+import hmac
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend import tracing
+from backend.tracing import Trace
+
+TRACE_REQUESTS = os.getenv("TRACE_REQUESTS", "off") # off | header | all
+TRACE_TOKEN = os.getenv("TRACE_TOKEN")
+TRACE_HEADER = "x-debug-trace"
+TRACE_PROFILE_DIR = os.getenv("TRACE_PROFILE_DIR")
+TRACE_PROFILE_THRESHOLD_MS = float(os.getenv("TRACE_PROFILE_THRESHOLD_MS", "500"))
+
+logger = logging.getLogger(__name__)
+
+def _dump_profile(trace: Trace, scope: Scope) -> Optional[str]:
+    os.makedirs(TRACE_PROFILE_DIR, exist_ok=True)
+    slug = scope["path"].strip("/").replace("/", "_") or "root"
+    path = os.path.join(TRACE_PROFILE_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{scope['method']}-{slug}.prof")
+    trace.profiler.dump_stats(path)
+    return path
+
+def _traced(scope: Scope, mode: str) -> bool:
+    if scope["type"] != "http" or mode == "off":
+        return False
+    if mode == "all":
+        return True
+    # Timings and profiles describe the server's internals: only for holders of the token
+    return bool(TRACE_TOKEN) and hmac.compare_digest(Headers(scope=scope).get(TRACE_HEADER, ""), TRACE_TOKEN)
+
+class TracingMiddleware:
+    def __init__(self, app: ASGIApp, mode: Optional[str] = None):
+        self.app = app
+        self.mode = mode # None: TRACE_REQUESTS
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not _traced(scope, self.mode or TRACE_REQUESTS):
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = tracing.begin(profile=TRACE_PROFILE_DIR is not None)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            tracing.end(token)
+            tracing.stats.record(trace)
+            elapsed_ms = trace.elapsed() * 1000
+            if trace.profiler is not None and elapsed_ms >= TRACE_PROFILE_THRESHOLD_MS:
+                path = _dump_profile(trace, scope)
+                logger.info("Slow request %s %s (%.1f ms), profile written to %s", scope["method"], scope["path"], elapsed_ms, path)
@@ -77,8 +77,11 @@ export const createCurveSet = async (data: any) => {
   return response.data;
 };
 
-export const getCurveSet = async (id: number) => {
-  const response = await api.get(`/curve-sets/${id}`);
+export const PLOT_MAX_POINTS = 2000;
+
+// maxPoints decimates each series server-side for plotting
+export const getCurveSet = async (id: number, maxPoints?: number) => {
+  const response = await api.get(`/curve-sets/${id}`, { params: maxPoints ? { max_points: maxPoints } : {} });
   return response.data;
 };
 
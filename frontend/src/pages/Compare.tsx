@@ -1,6 +1,6 @@
 import React, { useState } from 'react';
 import { useQuery } from '@tanstack/react-query';
-import { getPumps, getPump, getCurveSet } from '../api/client';
+import { getPumps, getPump, getCurveSet, PLOT_MAX_POINTS } from '../api/client';
 import Plot from 'react-plotly.js';
 
 const Compare: React.FC = () => {
@@ -29,7 +29,7 @@ const Compare: React.FC = () => {
           setSelectedCurveSetIds([...selectedCurveSetIds, id]);
           try {
               // Use the authenticated client function
-              const data = await getCurveSet(id);
+              const data = await getCurveSet(id, PLOT_MAX_POINTS);
               setCurveSetsData([...curveSetsData, data]);
           } catch (e) {
               console.error("Failed to fetch curve set", e);
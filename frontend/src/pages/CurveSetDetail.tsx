@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { useParams, Link } from 'react-router-dom';
-import { getCurveSet, addCurveSeries, validateCurvePoints, evaluateSeries } from '../api/client';
+import { getCurveSet, PLOT_MAX_POINTS, addCurveSeries, validateCurvePoints, evaluateSeries } from '../api/client';
 import Plot from 'react-plotly.js';
 
 const CurveSetDetail: React.FC = () => {
@@ -11,7 +11,7 @@ const CurveSetDetail: React.FC = () => {
 
   const { data: curveSet, isLoading } = useQuery({
     queryKey: ['curveSet', csId],
-    queryFn: () => getCurveSet(csId),
+    queryFn: () => getCurveSet(csId, PLOT_MAX_POINTS),
     enabled: !!csId
   });
 
@@ -376,7 +376,7 @@ const CurveSetDetail: React.FC = () => {
                                <div className="flex justify-between items-center">
                                    <span className="capitalize font-semibold">{s.type}</span>
                                    <span className="text-xs text-gray-500">
-                                       {s.points.length} pts
+                                       {s.point_count ?? s.points.length} pts
                                    </span>
                                </div>
                                {s.fit_model_type && (
@@ -21,7 +21,9 @@ const InviteRedeem: React.FC = () => {
             }
 
             try {
-                await redeemInvite(token);
+                const data = await redeemInvite(token);
+                // Membership changes revoke the old token; the reply carries a new one
+                if (data.access_token) localStorage.setItem('token', data.access_token);
                 alert('Invite redeemed successfully! You are now a member.');
                 // Refresh auth state? Ideally yes. For MVP, reload page or redirect home.
                 window.location.href = '/';